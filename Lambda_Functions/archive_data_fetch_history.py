@@ -0,0 +1,222 @@
+import os
+import json
+import time
+from datetime import datetime, timedelta, timezone
+import bootstrap
+from cache_utils import bump_table_version
+from fetch_summary import WINDOWS, prune_daily
+from history_archive import archive_name, archive_output_error, write_archive
+from ids import to_bin
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+
+logger = get_logger(__name__)
+
+# Whole months older than this many days are moved out of data_fetch_history
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', 365))
+# Rows per archive object, and per delete transaction
+ARCHIVE_BATCH_ROWS = int(os.environ.get('ARCHIVE_BATCH_ROWS', 50000))
+# Time left before the function's timeout at which no further batch is started
+ARCHIVE_MARGIN_SECONDS = 30
+
+# Ids per DELETE statement, keeping the statement well under max_allowed_packet
+DELETE_CHUNK = 1000
+
+
+def archive_cutoff(retention_days, today=None):
+    """First day of the month retention_days ago; everything before it is archived."""
+    today = today or datetime.now(timezone.utc).date()
+    return (today - timedelta(days=retention_days)).replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def archive_batch(cursor, conn, cutoff):
+    """
+    Moves the oldest batch of rows before cutoff to one archive object and
+    returns its manifest entry, or None when nothing is left to archive.
+    A batch never spans two months.
+
+    The object is written before anything is deleted, and the manifest row
+    commits together with the deletes, so an interrupted run either left the
+    rows in place or fully archived them. Re-running rewrites the same object.
+    """
+    with span('db_query'):
+        cursor.execute("SELECT MIN(fetch_time) AS oldest FROM data_fetch_history WHERE fetch_time < %s", (cutoff,))
+        oldest = cursor.fetchone()['oldest']
+    if oldest is None:
+        return None
+
+    period_start = oldest.date().replace(day=1)
+    period_end = min(next_month(period_start), cutoff)
+
+    # Walks idx_data_fetch_history_time, so no month is read or sorted in full
+    with span('db_query'):
+        cursor.execute("""
+            SELECT * FROM data_fetch_history
+            WHERE fetch_time >= %s AND fetch_time < %s
+            ORDER BY fetch_time, fetch_id
+            LIMIT %s
+        """, (period_start, period_end, ARCHIVE_BATCH_ROWS))
+        rows = cursor.fetchall()
+
+    location, size = write_archive(archive_name(period_start, rows[0]['fetch_id']), rows)
+
+    fetch_ids = [to_bin(row['fetch_id']) for row in rows]
+    with span('db_query'):
+        for start in range(0, len(fetch_ids), DELETE_CHUNK):
+            chunk = fetch_ids[start:start + DELETE_CHUNK]
+            cursor.execute(
+                "DELETE FROM data_fetch_history WHERE fetch_id IN ({})".format(','.join(['%s'] * len(chunk))),
+                chunk
+            )
+        cursor.execute("""
+            INSERT INTO data_fetch_history_archives (
+                first_fetch_id, period_start, location, row_count, bytes, first_fetch_time, last_fetch_time
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                location = VALUES(location),
+                row_count = VALUES(row_count),
+                bytes = VALUES(bytes),
+                last_fetch_time = VALUES(last_fetch_time),
+                archived_at = CURRENT_TIMESTAMP
+        """, (fetch_ids[0], period_start, location, len(rows), size, rows[0]['fetch_time'], rows[-1]['fetch_time']))
+        bump_table_version(cursor, 'data_fetch_history')
+        conn.commit()
+
+    add_metric('rows', len(rows))
+    logger.info("History archived", period=f'{period_start:%Y-%m}', rows=len(rows), location=location)
+    return {
+        'period': f'{period_start:%Y-%m}',
+        'location': location,
+        'rows': len(rows),
+        'bytes': size
+    }
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that moves data_fetch_history rows older than the
+    retention window to gzipped NDJSON objects in ARCHIVE_OUTPUT, one folder
+    per month, and records every object in data_fetch_history_archives so
+    get_data_fetch_history can still return them (?include_archived=true).
+    The all-time provider fetch statistics are kept; per-day counts are
+    pruned once they fall out of both the archive cutoff and the longest
+    statistics window. Run it on a schedule;
+    a run that nears its timeout stops after the current batch and the next
+    run carries on.
+
+    Input (all optional):
+        retention_days: overrides HISTORY_RETENTION_DAYS
+        dry_run: true to only report how many rows would be archived
+    """
+    event = event if isinstance(event, dict) else {}
+    try:
+        retention_days = int(event.get('retention_days', HISTORY_RETENTION_DAYS))
+        if retention_days < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'retention_days must be a positive number of days'})
+        }
+    dry_run = str(event.get('dry_run', '')).lower() == 'true'
+    cutoff = archive_cutoff(retention_days)
+
+    # Rows are deleted once written, so refuse to start without durable storage
+    output_error = None if dry_run else archive_output_error()
+    if output_error:
+        logger.error("Archive output not usable", error=output_error)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Archiving is not configured, nothing was archived', 'details': output_error})
+        }
+
+    try:
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        if dry_run:
+            with span('db_query'):
+                cursor.execute("""
+                    SELECT DATE_FORMAT(fetch_time, '%%Y-%%m') AS period, COUNT(*) AS row_count
+                    FROM data_fetch_history WHERE fetch_time < %s
+                    GROUP BY period ORDER BY period
+                """, (cutoff,))
+                periods = {row['period']: row['row_count'] for row in cursor.fetchall()}
+            cursor.close()
+            conn.close()
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Dry run, nothing was archived',
+                    'cutoff': str(cutoff),
+                    'rows_by_month': periods
+                })
+            }
+
+        # Leave time to finish the batch in flight before the function times out
+        deadline = None
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - ARCHIVE_MARGIN_SECONDS
+
+        archives = []
+        complete = False
+        while deadline is None or time.monotonic() < deadline:
+            archive = archive_batch(cursor, conn, cutoff)
+            if archive is None:
+                complete = True
+                break
+            archives.append(archive)
+
+        # Daily rollups outlive their rows only as long as a stats window reads them
+        daily_pruned = 0
+        if deadline is None or time.monotonic() < deadline:
+            prune_before = min(cutoff, datetime.now(timezone.utc).date() - timedelta(days=max(WINDOWS)))
+            with span('db_query'):
+                daily_pruned = prune_daily(cursor, conn, prune_before)
+            logger.info("Daily fetch counts pruned", before=str(prune_before), rows=daily_pruned)
+
+        cursor.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'History archived' if complete else 'Stopped before the timeout, run again to continue',
+                'cutoff': str(cutoff),
+                'complete': complete,
+                'rows_archived': sum(archive['rows'] for archive in archives),
+                'daily_rows_pruned': daily_pruned,
+                'archives': archives
+            })
+        }
+
+    except bootstrap.MySQLError as e:
+        error_code = e.args[0]
+        error_message = e.args[1]
+
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Archiving failed, run it again to resume',
+                'details': error_message
+            })
+        }
+    except Exception as e:
+        logger.exception("Archiving failed")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Archiving failed, run it again to resume',
+                'details': str(e)
+            })
+        }
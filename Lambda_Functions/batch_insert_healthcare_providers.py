@@ -0,0 +1,315 @@
+import io
+import os
+import csv
+import json
+import uuid
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import bootstrap
+from cache_utils import bump_table_version
+from http_utils import get_header
+from ids import new_id, to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+
+logger = get_logger(__name__)
+
+# Largest batch accepted in one request
+BATCH_MAX_PROVIDERS = int(os.environ.get('BATCH_MAX_PROVIDERS', 1000))
+# Secrets Manager calls in flight at once (CreateSecret is rate limited per account)
+SECRET_CONCURRENCY = int(os.environ.get('SECRET_CONCURRENCY', 8))
+
+REQUIRED_FIELDS = ['provider_name', 'provider_type', 'contact_email', 'contact_phone']
+PROVIDER_TYPES = {'Hospital', 'Clinic', 'Private Practice', 'Specialist Center', 'Other'}
+PROVIDER_STATUSES = {'Active', 'Inactive', 'Pending', 'Error'}
+
+# Column order of the multi-row INSERT
+INSERT_COLUMNS = [
+    'provider_id', 'provider_name', 'provider_type', 'contact_email', 'contact_phone',
+    'address', 'ehr_id', 'bulk_fhir_url', 'tenant_id', 'secret_name', 'status', 'notes'
+]
+
+
+def parse_providers(event):
+    """
+    Reads the batch from the request. Accepts a JSON list, {"providers": [...]},
+    or CSV / NDJSON text, either as the raw body (Content-Type text/csv or
+    application/x-ndjson) or as {"format": "csv" | "ndjson", "data": "..."}.
+    """
+    if isinstance(event, dict) and 'body' in event:
+        body = event['body']
+        if isinstance(body, str) and event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        content_type = (get_header(event, 'Content-Type') or '').split(';')[0].strip().lower()
+    else:
+        body = event
+        content_type = ''
+
+    if isinstance(body, str):
+        if content_type in ('text/csv', 'application/csv'):
+            return _parse_csv(body)
+        if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            return _parse_ndjson(body)
+        body = json.loads(body)
+
+    if isinstance(body, dict):
+        if 'data' in body and body.get('format') in ('csv', 'ndjson'):
+            return _parse_csv(body['data']) if body['format'] == 'csv' else _parse_ndjson(body['data'])
+        body = body.get('providers')
+
+    if not isinstance(body, list):
+        raise ValueError('Expected a list of providers')
+    return body
+
+
+def _parse_csv(text):
+    # Empty cells become None so optional columns behave like missing JSON keys
+    return [{key.strip(): (value.strip() or None) if isinstance(value, str) else value
+             for key, value in row.items() if key}
+            for row in csv.DictReader(io.StringIO(text))]
+
+
+def _parse_ndjson(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def validate_provider(provider, known_ehr_ids):
+    """Returns a list of problems with one provider row; empty when it can be inserted."""
+    if not isinstance(provider, dict):
+        return ['Provider must be an object']
+
+    errors = [f'Missing required field: {field}' for field in REQUIRED_FIELDS if not provider.get(field)]
+    if provider.get('provider_type') and provider['provider_type'] not in PROVIDER_TYPES:
+        errors.append(f"Invalid provider_type: {provider['provider_type']}")
+    if provider.get('status') and provider['status'] not in PROVIDER_STATUSES:
+        errors.append(f"Invalid status: {provider['status']}")
+    if provider.get('ehr_id') and to_bin(provider['ehr_id']) not in known_ehr_ids:
+        errors.append(f"Unknown ehr_id: {provider['ehr_id']}")
+    if bool(provider.get('client_id')) != bool(provider.get('client_secret')):
+        errors.append('client_id and client_secret must be provided together')
+    return errors
+
+
+def store_credentials(provider):
+    """
+    Creates the provider's Secrets Manager secret under the same naming scheme
+    as save_client_id_and_secret and returns (secret_name, error).
+    """
+    provider_name = provider.get('provider_name', 'Unknown')
+    safe_name = provider_name.replace(' ', '-').lower()
+    secret_name = f"healthcare-provider/{safe_name}-{str(uuid.uuid4())[:8]}"
+    try:
+        bootstrap.get_client('secretsmanager', region_name='us-west-1').create_secret(
+            Name=secret_name,
+            Description=f"API credentials for healthcare provider: {provider_name}",
+            SecretString=json.dumps({
+                'client_id': provider['client_id'],
+                'client_secret': provider['client_secret']
+            })
+        )
+        return secret_name, None
+    except Exception as e:
+        logger.warning("Failed to store credentials", provider_name=provider_name, error=str(e))
+        return None, str(e)
+
+
+def delete_secrets(secret_names):
+    """Best-effort removal of secrets created for rows that were rolled back."""
+    client = bootstrap.get_client('secretsmanager', region_name='us-west-1')
+    for secret_name in secret_names:
+        try:
+            client.delete_secret(SecretId=secret_name, ForceDeleteWithoutRecovery=True)
+        except Exception as e:
+            logger.warning("Failed to delete orphaned secret", secret_name=secret_name, error=str(e))
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that onboards many healthcare providers in one request.
+    Every row is validated before anything is written, credentials are stored
+    in Secrets Manager concurrently, and all valid rows are inserted into
+    healthcare_providers with multi-row INSERTs in a single transaction.
+    Returns a result for every submitted row, in submission order.
+    """
+    try:
+        try:
+            providers = parse_providers(event)
+        except (ValueError, csv.Error) as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Could not parse providers', 'details': str(e)})
+            }
+
+        all_or_nothing = isinstance(event, dict) and str(
+            (event.get('queryStringParameters') or {}).get('all_or_nothing', '')).lower() == 'true'
+
+        if not providers:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'No providers supplied'})
+            }
+        if len(providers) > BATCH_MAX_PROVIDERS:
+            return {
+                'statusCode': 413,
+                'body': json.dumps({
+                    'error': f'At most {BATCH_MAX_PROVIDERS} providers can be onboarded per request',
+                    'received': len(providers)
+                })
+            }
+        logger.info("Batch received", providers=len(providers))
+
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        # Resolve every referenced EHR system with one query
+        ehr_ids = sorted({p['ehr_id'] for p in providers if isinstance(p, dict) and p.get('ehr_id')})
+        known_ehr_ids = set()
+        if ehr_ids:
+            with span('db_query'):
+                cursor.execute(
+                    "SELECT ehr_id FROM ehr_systems WHERE ehr_id IN ({})".format(','.join(['%s'] * len(ehr_ids))),
+                    [to_bin(ehr_id) for ehr_id in ehr_ids]
+                )
+                known_ehr_ids = {to_bin(row['ehr_id']) for row in cursor.fetchall()}
+
+        # Validate everything before any secret or row is written
+        results = []
+        valid = []
+        for index, provider in enumerate(providers):
+            errors = validate_provider(provider, known_ehr_ids)
+            if errors:
+                results.append({'index': index, 'status': 'invalid', 'errors': errors})
+            else:
+                result = {'index': index, 'status': 'pending', 'provider_name': provider['provider_name']}
+                results.append(result)
+                valid.append((provider, result))
+
+        invalid_count = len(providers) - len(valid)
+        if not valid or (all_or_nothing and invalid_count):
+            cursor.close()
+            conn.close()
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': to_json({
+                    'error': 'No providers were onboarded',
+                    'invalid': invalid_count,
+                    'results': results
+                })
+            }
+
+        # Store credentials concurrently; a failed secret does not block the
+        # provider row, matching save_secret_and_insert_healthcare_provider
+        with_credentials = [(provider, result) for provider, result in valid if provider.get('client_id')]
+        secret_names = {}
+        if with_credentials:
+            with span('secrets_put'):
+                with ThreadPoolExecutor(max_workers=max(1, min(SECRET_CONCURRENCY, len(with_credentials)))) as pool:
+                    outcomes = list(pool.map(store_credentials, [provider for provider, _ in with_credentials]))
+            for (provider, result), (secret_name, error) in zip(with_credentials, outcomes):
+                if secret_name:
+                    secret_names[result['index']] = secret_name
+                else:
+                    result['warnings'] = [f'Credentials were not stored: {error}']
+            add_metric('secrets_created', len(secret_names))
+
+        # IDs are generated here so no row has to be read back after the INSERT
+        rows = []
+        for provider, result in valid:
+            result['provider_id'] = new_id()
+            result['secret_name'] = secret_names.get(result['index'], provider.get('secret_name'))
+            result['provider_status'] = provider.get('status') or 'Pending'
+            rows.append((
+                to_bin(result['provider_id']),
+                provider['provider_name'],
+                provider['provider_type'],
+                provider['contact_email'],
+                provider['contact_phone'],
+                provider.get('address'),
+                to_bin(provider.get('ehr_id')),
+                provider.get('bulk_fhir_url'),
+                provider.get('tenant_id'),
+                result['secret_name'],
+                result['provider_status'],
+                provider.get('note') or provider.get('notes')
+            ))
+
+        insert_query = "INSERT INTO healthcare_providers ({}) VALUES ({})".format(
+            ', '.join(INSERT_COLUMNS), ', '.join(['%s'] * len(INSERT_COLUMNS))
+        )
+        try:
+            with span('db_query'):
+                # pymysql rewrites executemany on INSERT ... VALUES into
+                # multi-row statements sized to the server's packet limit
+                cursor.executemany(insert_query, rows)
+                # Invalidate cached listings (ETags) in every container
+                bump_table_version(cursor, 'healthcare_providers')
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            # Nothing was inserted, so the secrets created above are orphans
+            delete_secrets(secret_names.values())
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        for result in results:
+            if result['status'] == 'pending':
+                result['status'] = 'created'
+        add_metric('rows', len(rows))
+        logger.info("Batch onboarded", created=len(rows), invalid=invalid_count)
+
+        with span('serialize'):
+            response_body = to_json({
+                'message': f'{len(rows)} healthcare providers added successfully',
+                'created': len(rows),
+                'invalid': invalid_count,
+                'results': results
+            })
+
+        return {
+            # 207 tells the caller to inspect the per-item results
+            'statusCode': 207 if invalid_count else 201,
+            'headers': {'Content-Type': 'application/json'},
+            'body': response_body
+        }
+
+    except bootstrap.MySQLError as e:
+        error_code = e.args[0]
+        error_message = e.args[1]
+
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
+
+        if error_code == 1452:  # Foreign key constraint failure
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'error': 'Invalid reference to EHR system',
+                    'details': error_message
+                })
+            }
+        else:
+            return {
+                'statusCode': 500,
+                'body': json.dumps({
+                    'error': 'Database error occurred, no providers were added',
+                    'details': error_message
+                })
+            }
+    except Exception as e:
+        logger.exception("Failed to onboard healthcare providers")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Failed to onboard healthcare providers',
+                'details': str(e)
+            })
+        }
@@ -0,0 +1,234 @@
+"""
+Deferred imports and lazily created clients shared by the handlers.
+
+boto3/botocore and pymysql make up most of a handler's import time, yet many
+code paths never touch them: get_bulk_fhir_export_status uses neither, the
+database handlers never need boto3, and a provider cache hit never opens a
+connection. Nothing heavy is imported here until it is first used, and AWS
+clients are created once per container and then reused by warm invocations.
+
+Exception classes are resolved on attribute access, so handlers can write
+
+    import bootstrap
+    ...
+    except bootstrap.MySQLError as e:
+
+without importing pymysql at module load; the except clause is only evaluated
+when an exception actually reaches it.
+"""
+import os
+import time
+import threading
+from ids import from_bin
+
+# Clients created so far in this container, keyed by (service, region)
+_clients = {}
+_clients_lock = threading.Lock()
+
+# When enabled (by router.py), connect_db hands out one connection per host and container
+_reuse_connection = os.environ.get('REUSE_DB_CONNECTION', 'false').lower() == 'true'
+_shared_connections = {}
+_last_used = {}
+# Idle time after which a reused connection is pinged before handing it out
+DB_PING_AFTER_SECONDS = float(os.environ.get('DB_PING_AFTER_SECONDS', 30))
+
+# Optional reader endpoint for read-only handlers, used while its replication
+# lag stays within READ_MAX_LAG_SECONDS; the lag is re-checked at most every
+# READ_LAG_CHECK_SECONDS per container
+READ_HOST = os.environ.get('READ_HOST')
+READ_MAX_LAG_SECONDS = float(os.environ.get('READ_MAX_LAG_SECONDS', 5))
+READ_LAG_CHECK_SECONDS = float(os.environ.get('READ_LAG_CHECK_SECONDS', 10))
+_reader_checked_at = None
+_reader_healthy = False
+
+# Lazily resolved names -> (module, attribute)
+_LAZY_ATTRIBUTES = {
+    'ClientError': ('botocore.exceptions', 'ClientError'),
+    'MySQLError': ('pymysql', 'MySQLError'),
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+        module = __import__(module_name, fromlist=[attribute])
+        value = getattr(module, attribute)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_client(service_name, region_name=None):
+    """
+    Returns a boto3 client for service_name, creating it (and importing boto3)
+    on first use. Clients are thread safe and kept for the life of the container.
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                client = boto3.session.Session().client(service_name=service_name, region_name=region_name)
+                _clients[key] = client
+    return client
+
+
+def _end_transaction(conn):
+    """Rolls back a transaction left open on conn; free when none is."""
+    from pymysql.constants import SERVER_STATUS
+
+    if conn.open and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+        conn.rollback()
+
+
+class _SharedConnection:
+    """
+    Wraps the container's reused pymysql connection. Handlers use it exactly
+    like a fresh connection, but close() only ends any transaction the handler
+    left open and keeps the socket for the next invocation.
+    """
+
+    def __init__(self, conn, host):
+        self._conn = conn
+        self._host = host
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        _end_transaction(self._conn)
+        _last_used[self._host] = time.monotonic()
+
+
+def enable_connection_reuse():
+    """Makes connect_db return one shared connection per container from now on."""
+    global _reuse_connection
+    _reuse_connection = True
+
+
+def _checkout_shared_connection(host):
+    conn = _shared_connections.get(host)
+    if conn is not None and conn.open:
+        # Only pay for a round trip when the connection may have timed out
+        if time.monotonic() - _last_used.get(host, 0.0) > DB_PING_AFTER_SECONDS:
+            conn.ping(reconnect=True)
+        # A handler that returned without close() may have left its
+        # transaction, and with it an old REPEATABLE READ snapshot, open
+        _end_transaction(conn)
+        return _SharedConnection(conn, host)
+
+    _shared_connections[host] = _open_connection(True, host)
+    return _SharedConnection(_shared_connections[host], host)
+
+
+def _connect(host, with_database):
+    if _reuse_connection and with_database:
+        return _checkout_shared_connection(host)
+    return _open_connection(with_database, host)
+
+
+def _replica_lag(conn):
+    """
+    Seconds the reader is behind the writer; None when replication is
+    stopped. Readers without binlog replication (Aurora replicas, which share
+    the writer's storage) report no replica status and count as current.
+    """
+    import pymysql
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except pymysql.err.ProgrammingError:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    if not status:
+        return 0
+    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+
+def _connect_reader():
+    """
+    Returns a connection to READ_HOST, or None when the reader is unreachable
+    or lagging. A bad result is remembered for READ_LAG_CHECK_SECONDS, so
+    reads go straight to the writer meanwhile.
+    """
+    global _reader_checked_at, _reader_healthy
+
+    now = time.monotonic()
+    checked = _reader_checked_at is not None and now - _reader_checked_at < READ_LAG_CHECK_SECONDS
+    if checked and not _reader_healthy:
+        return None
+
+    conn = None
+    try:
+        conn = _connect(READ_HOST, True)
+        if checked:
+            return conn
+        lag = _replica_lag(conn)
+    except Exception:
+        # Unreachable reader, or a user without the REPLICATION CLIENT privilege
+        lag = None
+
+    _reader_checked_at = now
+    _reader_healthy = lag is not None and lag <= READ_MAX_LAG_SECONDS
+    if _reader_healthy:
+        return conn
+    if conn is not None:
+        conn.close()
+    return None
+
+
+def connect_db(with_database=True, read_only=False):
+    """
+    Opens a pymysql connection with a DictCursor using the HOST, USER_NAME,
+    PASSWORD and DB_NAME environment variables. Pass with_database=False to
+    connect to the server without selecting a database (e.g. to create it).
+
+    read_only=True connects to the reader endpoint in READ_HOST instead, as
+    long as it is reachable and its replication lag is at most
+    READ_MAX_LAG_SECONDS; otherwise, or without READ_HOST, to HOST. Only
+    pass it from handlers that never write and do not need to see a write
+    that just happened.
+
+    With connection reuse enabled the same connection per host is returned
+    to every invocation of the container; calling close() on it is still
+    required.
+    """
+    if read_only and READ_HOST and with_database:
+        conn = _connect_reader()
+        if conn is not None:
+            return conn
+    return _connect(os.environ['HOST'], with_database)
+
+
+def _conversions():
+    """
+    pymysql's default type conversions, plus decoding of BINARY(16) id columns
+    to UUID strings so handlers and API responses never see raw key bytes.
+    """
+    from pymysql.converters import conversions
+    from pymysql.constants import FIELD_TYPE
+
+    conv = dict(conversions)
+    # CHAR / BINARY columns; every BINARY(16) column in this schema is an id
+    conv[FIELD_TYPE.STRING] = from_bin
+    return conv
+
+
+def _open_connection(with_database, host):
+    import pymysql
+
+    db_config = {
+        'host': host,
+        'user': os.environ['USER_NAME'],
+        'password': os.environ['PASSWORD'],
+        'port': int(3306),
+        'cursorclass': pymysql.cursors.DictCursor,
+        'conv': _conversions()
+    }
+    if with_database:
+        db_config['database'] = os.environ['DB_NAME']
+    return pymysql.connect(**db_config)
@@ -0,0 +1,90 @@
+import os
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Small in-process LRU cache with a per-entry TTL.
+
+    Instances are created at module level so entries survive across warm
+    invocations of the same Lambda container. Every entry carries the table
+    version it was read at, so an expired entry can be revalidated with a
+    cheap version lookup instead of re-running the original query.
+    """
+
+    def __init__(self, max_size=256, ttl_seconds=60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the cached entry as (value, version, is_fresh), or None on a miss.
+        Expired entries are still returned (is_fresh=False) so the caller can
+        revalidate them against the current table version.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, version, expires_at = entry
+        self._entries.move_to_end(key)
+        return value, version, time.monotonic() < expires_at
+
+    def put(self, key, value, version=None):
+        """Stores value under key and evicts the least recently used entry if full."""
+        self._entries[key] = (value, version, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def refresh(self, key):
+        """Restarts the TTL of an entry that was revalidated as still current."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, version, _ = entry
+            self._entries[key] = (value, version, time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Provider + EHR join results keyed by provider_id, shared by every handler
+# running in this container
+provider_cache = LRUCache(
+    max_size=int(os.environ.get('PROVIDER_CACHE_MAX_SIZE', 512)),
+    ttl_seconds=float(os.environ.get('PROVIDER_CACHE_TTL_SECONDS', 60))
+)
+
+
+def get_table_versions(cursor, table_names):
+    """
+    Returns the current version counters for the given tables as a tuple,
+    in the same order as table_names. Tables without a counter row report 0.
+    """
+    query = "SELECT table_name, version FROM table_versions WHERE table_name IN ({})".format(
+        ','.join(['%s'] * len(table_names))
+    )
+    cursor.execute(query, list(table_names))
+    versions = {row['table_name']: row['version'] for row in cursor.fetchall()}
+    return tuple(versions.get(name, 0) for name in table_names)
+
+
+def bump_table_version(cursor, *table_names):
+    """
+    Increments the version counters of one or more tables with a single
+    statement. Call inside the same transaction as the write so readers never
+    see new data with an old version.
+    """
+    cursor.execute(
+        "INSERT INTO table_versions (table_name, version) VALUES {} "
+        "ON DUPLICATE KEY UPDATE version = version + 1".format(', '.join(['(%s, 1)'] * len(table_names))),
+        table_names
+    )
@@ -0,0 +1,191 @@
+import json
+from datetime import datetime, timezone
+import bootstrap
+from cache_utils import provider_cache, bump_table_version
+from fetch_summary import record_fetches
+from history_archive import parse_fetch_time
+from ids import new_id, to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
+
+logger = get_logger(__name__)
+
+FETCH_STATUSES = {'Success', 'Partial', 'Failed'}
+PROVIDER_STATUSES = {'Active', 'Inactive', 'Pending', 'Error'}
+
+# Provider status recorded for each fetch outcome unless the caller names one
+DEFAULT_PROVIDER_STATUS = {
+    'Success': 'Active',
+    'Partial': 'Active',
+    'Failed': 'Error'
+}
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that closes out a bulk data fetch for a healthcare
+    provider. In one transaction it inserts the data_fetch_history row and
+    updates the provider's last_data_fetch and status, so the two can never
+    disagree.
+
+    Input:
+        provider_id: ID of the provider the data was fetched for (required)
+        status: Success, Partial or Failed (default Success)
+        group_id, s3_location, error_details, fetch_time (optional)
+        fetch_id (optional): id for the history row, so a retried call is
+        answered with 409 instead of recording the fetch twice
+        provider_status (optional): status to give the provider; defaults to
+        Active after a successful or partial fetch and Error after a failure
+    """
+    try:
+        # Parse the incoming JSON payload, handling different event structures
+        if isinstance(event, dict) and 'body' in event:
+            # API Gateway integration pattern
+            if isinstance(event['body'], str):
+                body = json.loads(event['body'])
+            else:
+                body = event['body']  # Body might already be parsed
+        else:
+            # Direct Lambda invocation pattern
+            body = event
+
+        logger.debug("Event payload parsed", body=body)
+
+        # Validate before connecting
+        provider_id = body.get('provider_id')
+        fetch_status = body.get('status') or 'Success'
+        provider_status = body.get('provider_status') or DEFAULT_PROVIDER_STATUS.get(fetch_status)
+        errors = []
+        if not provider_id:
+            errors.append('Missing required field: provider_id')
+        if fetch_status not in FETCH_STATUSES:
+            errors.append(f'Invalid status: {fetch_status}')
+        elif provider_status not in PROVIDER_STATUSES:
+            errors.append(f'Invalid provider_status: {provider_status}')
+        # Parsed so MySQL compares it with last_data_fetch as a time, not as text
+        fetch_time = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        if body.get('fetch_time'):
+            try:
+                fetch_time = parse_fetch_time(body['fetch_time'])
+            except ValueError:
+                errors.append(f"Invalid fetch_time: {body['fetch_time']}")
+        if errors:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'error': 'Invalid fetch completion',
+                    'details': errors
+                })
+            }
+
+        # The row is built here, fetch_id included, so nothing is read back
+        fetch_record = {
+            'fetch_id': body.get('fetch_id') or new_id(),
+            'provider_id': provider_id,
+            'group_id': body.get('group_id'),
+            'fetch_time': fetch_time,
+            'status': fetch_status,
+            's3_location': body.get('s3_location'),
+            'error_details': body.get('error_details')
+        }
+
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        try:
+            with span('db_query'):
+                # The provider update runs first: it locks the provider row and
+                # its affected-row count doubles as the existence check.
+                # last_data_fetch only moves forward, and only when data arrived
+                cursor.execute("""
+                    UPDATE healthcare_providers
+                    SET status = %s,
+                        last_data_fetch = IF(%s = 'Failed', last_data_fetch,
+                                             GREATEST(COALESCE(last_data_fetch, %s), %s)),
+                        version = version + 1
+                    WHERE provider_id = %s
+                """, (provider_status, fetch_status, fetch_record['fetch_time'], fetch_record['fetch_time'],
+                      to_bin(provider_id)))
+
+                if not cursor.rowcount:
+                    conn.rollback()
+                    return {
+                        'statusCode': 404,
+                        'body': json.dumps({
+                            'error': 'Provider not found',
+                            'provider_id': provider_id
+                        })
+                    }
+
+                cursor.execute("""
+                    INSERT INTO data_fetch_history (
+                        fetch_id, provider_id, group_id, fetch_time, status, s3_location, error_details
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s);
+                """, (to_bin(fetch_record['fetch_id']), to_bin(provider_id), fetch_record['group_id'],
+                      fetch_record['fetch_time'], fetch_status, fetch_record['s3_location'],
+                      fetch_record['error_details']))
+                record_fetches(cursor, [fetch_record])
+
+                # Invalidate cached listings and provider lookups in every container
+                bump_table_version(cursor, 'healthcare_providers', 'data_fetch_history')
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        provider_cache.invalidate(provider_id)
+        logger.info("Data fetch completed", provider_id=provider_id, fetch_id=fetch_record['fetch_id'],
+                    status=fetch_status, provider_status=provider_status)
+
+        return {
+            'statusCode': 201,  # Created
+            'headers': {'Content-Type': 'application/json'},
+            'body': to_json({
+                'message': 'Data fetch completed successfully',
+                'data_fetch': fetch_record,
+                'provider': {
+                    'provider_id': provider_id,
+                    'status': provider_status
+                }
+            })
+        }
+
+    except bootstrap.MySQLError as e:
+        error_code = e.args[0]
+        error_message = e.args[1]
+
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
+
+        if error_code == 1062:  # Duplicate fetch_id, nothing was changed
+            return {
+                'statusCode': 409,
+                'body': json.dumps({
+                    'error': 'This fetch has already been recorded',
+                    'fetch_id': fetch_record['fetch_id']
+                })
+            }
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Database error occurred, the fetch was not recorded',
+                'details': error_message
+            })
+        }
+    except Exception as e:
+        logger.exception("Failed to complete data fetch")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Failed to complete data fetch',
+                'details': str(e)
+            })
+        }
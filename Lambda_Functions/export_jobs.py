@@ -0,0 +1,223 @@
+import os
+import bootstrap
+from ids import new_id, to_bin
+
+# Job states in the order export_orchestrator moves through them
+JOB_STATES = ('kickoff', 'polling', 'downloading', 'completing', 'complete', 'failed')
+FINISHED_STATES = ('complete', 'failed')
+
+# How long a job keeps its provider's export lease without making progress
+EXPORT_LEASE_SECONDS = int(os.environ.get('EXPORT_LEASE_SECONDS', 900))
+
+# Columns of export_jobs a step may change
+UPDATABLE_FIELDS = {
+    'state', 'export_url', 's3_prefix', 'files_total', 'attempts', 'last_error', 'fetch_id'
+}
+
+
+class LeaseLostError(Exception):
+    """The job finished, or another job took over its export lease; its worker must stop."""
+
+    def __init__(self, job_id):
+        super().__init__(f'Export job {job_id} no longer holds its export lease')
+        self.job_id = job_id
+
+
+# Matches a job that is still running and still holds its provider's lease
+LIVE_JOB = (
+    "job_id = %s AND state NOT IN ('complete', 'failed') "
+    "AND EXISTS (SELECT 1 FROM export_leases WHERE export_leases.job_id = export_jobs.job_id)"
+)
+
+
+class ExportJobStore:
+    """
+    Persists Bulk FHIR export jobs and their output files in the export_jobs
+    and export_job_files tables. Every method commits before returning, so a
+    crash at any point loses at most the step that was in flight.
+
+    Each running job also holds the export lease for its provider and
+    resource types (export_leases), which every change to the job renews and
+    finishing the job releases.
+
+    Every write first checks that the job is still running and still holds
+    its lease, and raises LeaseLostError otherwise: a worker that outlived
+    its lease must not move a job that create_job already marked failed.
+
+    export_orchestrator only uses the methods below, so the offline runner in
+    benchmarks can swap in a store that keeps the same records in a file.
+    """
+
+    def _renew_lease(self, job_id):
+        return (
+            "UPDATE export_leases SET expires_at = NOW() + INTERVAL %s SECOND WHERE job_id = %s",
+            (EXPORT_LEASE_SECONDS, to_bin(job_id))
+        )
+
+    def _lock_live_job(self, cursor, job_id):
+        """
+        Locks the job's lease and row, in the order create_job takes them, and
+        raises LeaseLostError unless the job is still running under its lease.
+        A locking read rather than an UPDATE's rowcount, which counts only
+        rows whose values changed.
+        """
+        cursor.execute("SELECT job_id FROM export_leases WHERE job_id = %s FOR UPDATE", (to_bin(job_id),))
+        held = cursor.fetchone()
+        cursor.execute(f"SELECT state FROM export_jobs WHERE {LIVE_JOB} FOR UPDATE", (to_bin(job_id),))
+        if not held or not cursor.fetchone():
+            raise LeaseLostError(job_id)
+
+    def _run(self, job_id, statements):
+        """Runs (query, args) pairs in one transaction, if the job still holds its lease."""
+        conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        try:
+            self._lock_live_job(cursor, job_id)
+            for query, args in statements:
+                cursor.execute(query, args)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def create_job(self, provider_id, resource_types):
+        """
+        Creates a job in the kickoff state unless another job holds an
+        unexpired lease for the same provider and resource types. Returns
+        (job_id, created); when created is False, job_id is the running job.
+        """
+        job_id = new_id()
+        conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        try:
+            # Takes the lease when it is free or expired; otherwise leaves the
+            # holder in place. The row lock serializes concurrent requests.
+            # job_id is assigned before expires_at so both IFs see the old expiry
+            cursor.execute("""
+                INSERT INTO export_leases (provider_id, resource_types, job_id, expires_at)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+                ON DUPLICATE KEY UPDATE
+                    job_id = IF(expires_at < NOW(), VALUES(job_id), job_id),
+                    expires_at = IF(expires_at < NOW(), VALUES(expires_at), expires_at)
+            """, (to_bin(provider_id), resource_types, to_bin(job_id), EXPORT_LEASE_SECONDS))
+            cursor.execute(
+                "SELECT job_id FROM export_leases WHERE provider_id = %s AND resource_types = %s",
+                (to_bin(provider_id), resource_types)
+            )
+            holder = cursor.fetchone()['job_id']
+            if holder != job_id:
+                conn.commit()
+                return holder, False
+
+            # A job whose lease expired has stopped; close it so it is not resumed
+            cursor.execute(
+                "UPDATE export_jobs SET state = 'failed', last_error = 'Export lease expired' "
+                "WHERE provider_id = %s AND resource_types = %s AND state NOT IN ('complete', 'failed')",
+                (to_bin(provider_id), resource_types)
+            )
+            cursor.execute(
+                "INSERT INTO export_jobs (job_id, provider_id, resource_types, s3_prefix) VALUES (%s, %s, %s, %s)",
+                (to_bin(job_id), to_bin(provider_id), resource_types, f'HealthLakeOutput/{provider_id}/{job_id}/')
+            )
+            conn.commit()
+            return job_id, True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_job(self, job_id):
+        """Returns the job with its files (ordered by file_index), or None."""
+        conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM export_jobs WHERE job_id = %s", (to_bin(job_id),))
+            job = cursor.fetchone()
+            if job:
+                cursor.execute(
+                    "SELECT file_index, resource_type, url, state, s3_key, bytes FROM export_job_files "
+                    "WHERE job_id = %s ORDER BY file_index",
+                    (to_bin(job_id),)
+                )
+                job['files'] = list(cursor.fetchall())
+            return job
+        finally:
+            cursor.close()
+            conn.close()
+
+    def update_job(self, job_id, **fields):
+        """
+        Sets the given export_jobs columns; a finished job gives up its lease.
+        Raises LeaseLostError when the job is no longer running under its lease.
+        """
+        unknown = set(fields) - UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Cannot update export job fields: {', '.join(sorted(unknown))}")
+        assignments = ', '.join(f'{field} = %s' for field in fields)
+        values = [to_bin(value) if field == 'fetch_id' else value for field, value in fields.items()]
+        if fields.get('state') in FINISHED_STATES:
+            lease = ("DELETE FROM export_leases WHERE job_id = %s", (to_bin(job_id),))
+        else:
+            lease = self._renew_lease(job_id)
+        self._run(job_id, [
+            (f"UPDATE export_jobs SET {assignments} WHERE {LIVE_JOB}", values + [to_bin(job_id)]),
+            lease
+        ])
+
+    def renew_lease(self, job_id):
+        """Keeps the lease of a job that is waiting on the EHR or downloading a large file."""
+        self._run(job_id, [self._renew_lease(job_id)])
+
+    def add_files(self, job_id, files):
+        """
+        Records the output files of a finished export ([{"type", "url"}, ...])
+        and moves the job to downloading in the same transaction. Re-adding
+        the same list is harmless.
+        """
+        statements = [(
+            "INSERT IGNORE INTO export_job_files (job_id, file_index, resource_type, url) VALUES (%s, %s, %s, %s)",
+            (to_bin(job_id), index, item.get('type'), item['url'])
+        ) for index, item in enumerate(files)]
+        statements.append((
+            "UPDATE export_jobs SET files_total = %s, state = 'downloading', attempts = 0, last_error = NULL "
+            f"WHERE {LIVE_JOB}",
+            (len(files), to_bin(job_id))
+        ))
+        statements.append(self._renew_lease(job_id))
+        self._run(job_id, statements)
+
+    def complete_file(self, job_id, file_index, s3_key, size):
+        """
+        Marks one file as stored in S3 and adds it to the job's progress
+        counters. Raises LeaseLostError when the job is no longer running
+        under its lease.
+        """
+        conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        try:
+            self._lock_live_job(cursor, job_id)
+            cursor.execute(
+                "UPDATE export_job_files SET state = 'done', s3_key = %s, bytes = %s, completed_at = NOW() "
+                "WHERE job_id = %s AND file_index = %s AND state = 'pending'",
+                (s3_key, size, to_bin(job_id), file_index)
+            )
+            # A file finished twice (a retried step) is only counted once
+            if cursor.rowcount:
+                cursor.execute(
+                    "UPDATE export_jobs SET files_done = files_done + 1, bytes_downloaded = bytes_downloaded + %s, "
+                    f"attempts = 0, last_error = NULL WHERE {LIVE_JOB}",
+                    (size, to_bin(job_id))
+                )
+            cursor.execute(*self._renew_lease(job_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+import bootstrap
+from export_jobs import EXPORT_LEASE_SECONDS, ExportJobStore, FINISHED_STATES, LeaseLostError
+from get_patient_data import S3_BUCKET, process_fhir_export
+from ids import new_id
+from log_utils import LOG_SAMPLE_EVERY, get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+from token_provider import get_token_provider
+
+logger = get_logger(__name__)
+
+# Consecutive failures of one step before the job is marked failed
+EXPORT_MAX_ATTEMPTS = int(os.environ.get('EXPORT_MAX_ATTEMPTS', 3))
+# Time left in the invocation at which no new step is started
+EXPORT_STEP_MARGIN_SECONDS = float(os.environ.get('EXPORT_STEP_MARGIN_SECONDS', 60))
+# Resource types exported when the request does not name any, matching initiate_bulk_fhir_export
+DEFAULT_RESOURCE_TYPES = 'Location'
+
+
+def invoke(function_name, payload):
+    """Invokes another function of the pipeline and returns its decoded response."""
+    client = bootstrap.get_client('lambda')
+    with span('lambda_invoke'):
+        response = client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(payload)
+        )
+        return json.loads(response['Payload'].read())
+
+
+def kick_off(store, job):
+    """Starts the EHR-side export and records its status URL."""
+    export_url = invoke('initiate_bulk_fhir_export', {
+        'provider_id': job['provider_id'],
+        'types': job['resource_types']
+    })
+    # The kick-off function returns the status URL, or an error response
+    if not isinstance(export_url, str) or not export_url:
+        raise Exception(f'Export kick-off failed: {export_url}')
+
+    store.update_job(job['job_id'], export_url=export_url, state='polling', attempts=0, last_error=None)
+    logger.info("Export started", job_id=job['job_id'], export_url=export_url)
+    return 0
+
+
+def poll(store, job):
+    """Checks the export once; returns the seconds to wait while it is still running."""
+    # Tokens live only in this container, never in export_jobs; a resumed job
+    # simply requests a new one
+    tokens = get_token_provider(job['provider_id'])
+    access_token = tokens.get()
+    status = invoke('get_bulk_fhir_export_status', {'export_url': job['export_url'], 'access_token': access_token})
+    if status.get('statusCode') == 401:
+        status = invoke('get_bulk_fhir_export_status', {
+            'export_url': job['export_url'],
+            'access_token': tokens.refresh(access_token)
+        })
+    if status.get('status') == 'pending':
+        store.renew_lease(job['job_id'])
+        logger.info("Export still running", job_id=job['job_id'], retry_after=status.get('retry_after'),
+                    sample_every=LOG_SAMPLE_EVERY)
+        return float(status.get('retry_after') or 10)
+    if status.get('status') != 'complete':
+        raise Exception(status.get('message') or 'Export status check failed')
+
+    files = status['output'].get('output', [])
+    store.add_files(job['job_id'], files)
+    logger.info("Export ready", job_id=job['job_id'], files=len(files))
+    return 0
+
+
+@contextmanager
+def lease_renewed(store, job_id):
+    """
+    Renews the job's lease every third of EXPORT_LEASE_SECONDS while a single
+    long step (a large file download) runs, so no other request takes the
+    export over in the meantime. A lost lease stops the renewals; the step's
+    own write then fails with LeaseLostError.
+    """
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(EXPORT_LEASE_SECONDS / 3):
+            try:
+                store.renew_lease(job_id)
+            except LeaseLostError:
+                logger.warning("Export lease lost during a step", job_id=job_id)
+                return
+            except Exception:
+                logger.exception("Could not renew the export lease", job_id=job_id)
+
+    renewer = threading.Thread(target=renew, name=f'lease-{job_id}', daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewer.join()
+
+
+def download_next(store, job):
+    """Stores the next file that is not yet in S3, or moves on once all are."""
+    pending = [item for item in job['files'] if item['state'] == 'pending']
+    if not pending:
+        # fetch_id is fixed before the completion call so a retried call
+        # cannot record the fetch twice
+        store.update_job(job['job_id'], state='completing', fetch_id=new_id(), attempts=0, last_error=None)
+        return 0
+
+    item = pending[0]
+    key = f"{job['s3_prefix']}{item['file_index']:05d}_{item['resource_type']}.ndjson"
+    with lease_renewed(store, job['job_id']):
+        result = process_fhir_export(item['url'], item['resource_type'], get_token_provider(job['provider_id']),
+                                     key=key)
+    if not result or 'key' not in result:
+        raise Exception(f"Download of file {item['file_index']} failed: {(result or {}).get('body')}")
+
+    store.complete_file(job['job_id'], item['file_index'], key, result['bytes'])
+    add_metric('bytes_downloaded', result['bytes'], 'Bytes')
+    logger.info("File stored", job_id=job['job_id'], file_index=item['file_index'], key=key,
+                sample_every=LOG_SAMPLE_EVERY)
+    return 0
+
+
+def complete(store, job):
+    """Records the finished fetch for the provider and closes the job."""
+    response = invoke('complete_data_fetch', {
+        'provider_id': job['provider_id'],
+        'fetch_id': job['fetch_id'],
+        'status': 'Success',
+        's3_location': f"s3://{S3_BUCKET}/{job['s3_prefix']}"
+    })
+    # 409 means an earlier attempt of this step already recorded the fetch
+    if response.get('statusCode') not in (201, 409):
+        raise Exception(f"Recording the fetch failed: {response.get('body')}")
+
+    store.update_job(job['job_id'], state='complete', attempts=0, last_error=None)
+    logger.info("Export job complete", job_id=job['job_id'], files=job['files_total'])
+    return 0
+
+
+STEPS = {
+    'kickoff': kick_off,
+    'polling': poll,
+    'downloading': download_next,
+    'completing': complete
+}
+
+
+def advance(store, job):
+    """
+    Runs one step of the job and returns the seconds to wait before the next.
+    A failed step is retried with backoff; after EXPORT_MAX_ATTEMPTS failures
+    in a row the job is marked failed and the failure recorded for the provider.
+    LeaseLostError is not a step failure and is passed on to run_job.
+    """
+    try:
+        with span(f"step_{job['state']}"):
+            return STEPS[job['state']](store, job)
+    except LeaseLostError:
+        raise
+    except Exception as e:
+        attempts = job['attempts'] + 1
+        logger.warning("Export step failed", job_id=job['job_id'], state=job['state'], attempts=attempts,
+                       error=str(e))
+        if attempts < EXPORT_MAX_ATTEMPTS:
+            store.update_job(job['job_id'], attempts=attempts, last_error=str(e))
+            # Never retry before a failing EHR host's circuit lets requests through again
+            return max(min(60, 2 ** attempts), getattr(e, 'retry_in', 0))
+
+        store.update_job(job['job_id'], state='failed', attempts=attempts, last_error=str(e))
+        try:
+            invoke('complete_data_fetch', {
+                'provider_id': job['provider_id'],
+                'fetch_id': job.get('fetch_id') or new_id(),
+                'status': 'Failed',
+                'error_details': f"Export job {job['job_id']} failed while {job['state']}: {e}"
+            })
+        except Exception:
+            logger.exception("Could not record the failed fetch", job_id=job['job_id'])
+        return 0
+
+
+def normalize_resource_types(resource_types):
+    """Sorted, de-duplicated type list, so "Patient,Location" and "Location, Patient" are the same export."""
+    return ','.join(sorted({item.strip() for item in (resource_types or DEFAULT_RESOURCE_TYPES).split(',')
+                            if item.strip()}))
+
+
+def start_job(provider_id, resource_types=None, store=None):
+    """
+    Creates a job for the provider and returns (job_id, created). When the
+    same export is already running, nothing is kicked off: the running job's
+    id is returned with created False, so the caller follows that job.
+    """
+    store = store or ExportJobStore()
+    job_id, created = store.create_job(provider_id, normalize_resource_types(resource_types))
+    if created:
+        logger.info("Export job created", job_id=job_id, provider_id=provider_id)
+    else:
+        add_metric('exports_deduplicated', 1)
+        logger.info("Export already running, attaching to it", job_id=job_id, provider_id=provider_id)
+    return job_id, created
+
+
+def run_job(job_id, store=None, deadline=None, sleep=True):
+    """
+    Advances a job until it finishes, until deadline (a time.monotonic()
+    value) passes, or, with sleep=False, until it has to wait for the EHR.
+    Returns (job, seconds_to_wait). Every step's result is committed before
+    the next starts, so calling this again after a crash carries on from the
+    last finished step: the export is never kicked off twice and stored files
+    are not downloaded again.
+    """
+    store = store or ExportJobStore()
+    job = store.get_job(job_id)
+    if job is None:
+        raise ValueError(f'Unknown export job: {job_id}')
+
+    # The provider's token is renewed in the background only while this job runs
+    with get_token_provider(job['provider_id']).hold():
+        while True:
+            job = store.get_job(job_id)
+            if job['state'] in FINISHED_STATES or (deadline is not None and time.monotonic() >= deadline):
+                return job, 0
+
+            try:
+                wait = advance(store, job)
+            except LeaseLostError:
+                add_metric('export_leases_lost', 1)
+                logger.warning("Export lease lost, stopping", job_id=job_id, state=job['state'])
+                return store.get_job(job_id), 0
+            if wait:
+                if not sleep or (deadline is not None and time.monotonic() + wait >= deadline):
+                    return store.get_job(job_id), wait
+                time.sleep(wait)
+
+
+def job_response(job, wait_seconds, attached=False):
+    return {
+        'statusCode': 200 if job['state'] in FINISHED_STATES else 202,
+        'job_id': job['job_id'],
+        'attached': attached,
+        'provider_id': job['provider_id'],
+        'state': job['state'],
+        'export_url': job['export_url'],
+        'files_total': job['files_total'],
+        'files_done': job['files_done'],
+        'last_error': job['last_error'],
+        'wait_seconds': wait_seconds
+    }
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that drives a Bulk FHIR export through kick-off, status
+    polling, download and completion, keeping its progress in export_jobs.
+
+    Input:
+        provider_id (and optional types): start a new export job. If the
+        same export is already running, the response describes that job
+        instead (attached: true); nothing is kicked off and the caller
+        should not drive the job itself.
+        job_id: continue an existing job
+
+    Output:
+        The job's state, progress and wait_seconds. Until the state is
+        complete or failed, invoke again with the job_id after wait_seconds
+        (a Step Functions Wait / Choice loop).
+    """
+    try:
+        store = ExportJobStore()
+        job_id = event.get('job_id')
+        if not job_id:
+            if not event.get('provider_id'):
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Missing required parameter: provider_id or job_id'})
+                }
+            job_id, created = start_job(event['provider_id'], event.get('types'), store)
+            if not created:
+                # The request that started this export keeps driving it, so
+                # this one only reports it
+                return job_response(store.get_job(job_id), 0, attached=True)
+
+        # Leave time to commit the step in flight before the function times out
+        deadline = None
+        if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+            deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - EXPORT_STEP_MARGIN_SECONDS
+
+        job, wait = run_job(job_id, store, deadline=deadline, sleep=False)
+        return job_response(job, wait)
+
+    except ValueError as e:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'error': str(e)})
+        }
+    except Exception as e:
+        logger.exception("Export orchestration failed")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
@@ -0,0 +1,111 @@
+from datetime import datetime
+from ids import to_bin
+
+# provider_fetch_summary and provider_fetch_daily are maintained from every
+# data_fetch_history insert, in the same transaction, so fetch statistics are
+# read from one row per provider (and one per provider and day) instead of
+# aggregating the whole history.
+
+# Rolling windows get_data_fetch_stats reports, in days; daily rows older than
+# the longest one are no longer read and are pruned (see prune_daily)
+WINDOWS = (7, 30)
+# Daily rows deleted per statement
+PRUNE_BATCH_SIZE = 10000
+
+# Summary columns are assigned left to right and later ones see the updated
+# values, so last_status is set before last_fetch_time moves
+UPSERT_SUMMARY = """
+    INSERT INTO provider_fetch_summary (
+        provider_id, fetch_count, success_count, partial_count, failed_count,
+        last_fetch_time, last_status, last_success_time, last_failure_time
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        fetch_count = fetch_count + VALUES(fetch_count),
+        success_count = success_count + VALUES(success_count),
+        partial_count = partial_count + VALUES(partial_count),
+        failed_count = failed_count + VALUES(failed_count),
+        last_status = IF(last_fetch_time IS NULL OR VALUES(last_fetch_time) >= last_fetch_time,
+                         VALUES(last_status), last_status),
+        last_fetch_time = GREATEST(COALESCE(last_fetch_time, VALUES(last_fetch_time)), VALUES(last_fetch_time)),
+        last_success_time = GREATEST(COALESCE(last_success_time, VALUES(last_success_time)),
+                                     COALESCE(VALUES(last_success_time), last_success_time)),
+        last_failure_time = GREATEST(COALESCE(last_failure_time, VALUES(last_failure_time)),
+                                     COALESCE(VALUES(last_failure_time), last_failure_time))
+"""
+
+UPSERT_DAILY = """
+    INSERT INTO provider_fetch_daily (
+        provider_id, fetch_date, success_count, partial_count, failed_count
+    ) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        success_count = success_count + VALUES(success_count),
+        partial_count = partial_count + VALUES(partial_count),
+        failed_count = failed_count + VALUES(failed_count)
+"""
+
+# Rebuild both tables from data_fetch_history, for databases that had
+# history before the summary tables existed (see migrate_schema_lambda)
+BACKFILL_STATEMENTS = {
+    'provider_fetch_summary': """
+        INSERT INTO provider_fetch_summary (
+            provider_id, fetch_count, success_count, partial_count, failed_count,
+            last_fetch_time, last_status, last_success_time, last_failure_time
+        )
+        SELECT provider_id, COUNT(*), SUM(status = 'Success'), SUM(status = 'Partial'), SUM(status = 'Failed'),
+               MAX(fetch_time),
+               SUBSTRING_INDEX(GROUP_CONCAT(status ORDER BY fetch_time DESC), ',', 1),
+               MAX(IF(status = 'Success', fetch_time, NULL)),
+               MAX(IF(status = 'Failed', fetch_time, NULL))
+        FROM data_fetch_history
+        GROUP BY provider_id
+    """,
+    'provider_fetch_daily': """
+        INSERT INTO provider_fetch_daily (provider_id, fetch_date, success_count, partial_count, failed_count)
+        SELECT provider_id, DATE(fetch_time), SUM(status = 'Success'), SUM(status = 'Partial'), SUM(status = 'Failed')
+        FROM data_fetch_history
+        GROUP BY provider_id, DATE(fetch_time)
+    """
+}
+
+
+def _fetch_date(fetch_time):
+    """The calendar day of a fetch_time given as a datetime or a 'YYYY-MM-DD...' string."""
+    if isinstance(fetch_time, datetime):
+        return fetch_time.date()
+    return str(fetch_time)[:10]
+
+
+def prune_daily(cursor, conn, before):
+    """
+    Deletes provider_fetch_daily rows for days before the given date, in
+    batches that each commit, and returns how many were deleted. The all-time
+    totals in provider_fetch_summary are unaffected.
+    """
+    pruned = 0
+    while True:
+        cursor.execute("DELETE FROM provider_fetch_daily WHERE fetch_date < %s LIMIT %s", (before, PRUNE_BATCH_SIZE))
+        conn.commit()
+        pruned += cursor.rowcount
+        if cursor.rowcount < PRUNE_BATCH_SIZE:
+            return pruned
+
+
+def record_fetches(cursor, rows):
+    """
+    Adds data_fetch_history rows (dicts with provider_id, fetch_time and
+    status) to the summary tables. Call it in the transaction that inserts
+    the rows; executemany sends each table's upserts as one multi-row INSERT.
+    """
+    summary = []
+    daily = []
+    for row in rows:
+        status = row['status']
+        counts = (int(status == 'Success'), int(status == 'Partial'), int(status == 'Failed'))
+        provider_id = to_bin(row['provider_id'])
+        summary.append((provider_id, 1, *counts, row['fetch_time'], status,
+                        row['fetch_time'] if status == 'Success' else None,
+                        row['fetch_time'] if status == 'Failed' else None))
+        daily.append((provider_id, _fetch_date(row['fetch_time']), *counts))
+
+    cursor.executemany(UPSERT_SUMMARY, summary)
+    cursor.executemany(UPSERT_DAILY, daily)
@@ -1,9 +1,15 @@
 import json
-import boto3
-import http.client
 import base64
-from botocore.exceptions import ClientError
+import bootstrap
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
+from outbound_http import request
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     try:
         # Extract secretName and tenantID from event
@@ -12,17 +18,16 @@ def lambda_handler(event, context):
         secret_name = event['secret_name']
         
         # Retrieve secrets from AWS Secrets Manager
-        session = boto3.session.Session()
-        client = session.client(service_name='secretsmanager', region_name='us-west-1')
+        client = bootstrap.get_client('secretsmanager', region_name='us-west-1')
         
-        get_secret_value_response = client.get_secret_value(SecretId=secret_name)
+        with span('secrets_get'):
+            get_secret_value_response = client.get_secret_value(SecretId=secret_name)
         secrets = json.loads(get_secret_value_response['SecretString'])
         
         client_id = secrets['client_id']
         client_secret = secrets['client_secret']
 
         # Authenticate with Cerner's FHIR API and retrieve access token
-        conn = http.client.HTTPSConnection(connection_url)
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         payload = 'grant_type=client_credentials&scope= system/Observation.read system/Practitioner.read system/Location.read system/Encounter.read'
         
@@ -30,13 +35,12 @@ def lambda_handler(event, context):
         auth_header = f'Basic {base64.b64encode(credentials.encode("utf-8")).decode("utf-8")}'
         headers['Authorization'] = auth_header
 
-        conn.request('POST', authorization_url, payload, headers)
-        response = conn.getresponse()
+        response = request('POST', connection_url, authorization_url, payload, headers)
 
         # Log HTTP status code and response data for debugging
-        print(f"HTTP Status Code: {response.status}")
+        logger.info("Token endpoint responded", status=response.status)
         data = response.read()
-        print(f"Raw response data: {data}")
+        logger.debug("Token endpoint response received", response_bytes=len(data))
 
         # Handle potential empty response
         if not data:
@@ -49,12 +53,13 @@ def lambda_handler(event, context):
 
         access_token = token_data['access_token']
 
+        # expires_in lets callers renew the token before the EHR rejects it
         return {
             'statusCode': 200,
-            'body': json.dumps({'access_token': access_token})
+            'body': json.dumps({'access_token': access_token, 'expires_in': token_data.get('expires_in')})
         }
 
-    except ClientError as e:
+    except bootstrap.ClientError as e:
         return {
             'statusCode': 500,
             'body': json.dumps({'error': f"Error retrieving secret: {e}"})
@@ -1,7 +1,14 @@
-import http.client
 import json
 from urllib.parse import urlparse
+from log_utils import LOG_SAMPLE_EVERY, get_logger
+from metrics import instrument
+from profiling import profiled
+from outbound_http import request
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that checks the status of a FHIR bulk export by polling 
@@ -35,9 +42,8 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing required parameter: access_token'})
             }
         
-        # Parse the URL to get the host and path
+        # Parse the URL to get the path
         parsed_url = urlparse(export_url)
-        host = parsed_url.netloc
         path = parsed_url.path
         
         # Set up headers for polling request
@@ -46,20 +52,18 @@ def lambda_handler(event, context):
             'Accept': 'application/json'
         }
         
-        print(f"Checking export status: {export_url}")
+        logger.info("Checking export status", export_url=export_url, sample_every=LOG_SAMPLE_EVERY)
         
-        # Create connection and make request
-        conn = http.client.HTTPSConnection(host)
-        conn.request('GET', path, headers=headers)
-        response = conn.getresponse()
+        # Make the request through the EHR host's circuit breaker
+        response = request('GET', export_url, path, headers=headers)
         status = response.status
         
-        print(f"Response status: {status}")
+        logger.debug("Export status response", status=status)
         
         if status == 200:
             # Export is complete, return the output files
             response_data = json.loads(response.read().decode('utf-8'))
-            print("Export complete!")
+            logger.info("Export complete", files=lambda: len(response_data.get('output', [])))
             return {
                 'status': 'complete',
                 'statusCode': 200,
@@ -68,7 +72,7 @@ def lambda_handler(event, context):
             }
         elif status == 202:
             # Export is still in progress
-            print("Export still in progress")
+            logger.info("Export still in progress", sample_every=LOG_SAMPLE_EVERY)
             
             # Get retry-after header if available
             retry_after = response.getheader('Retry-After')
@@ -83,7 +87,7 @@ def lambda_handler(event, context):
         else:
             # Unexpected status code
             error_data = response.read().decode('utf-8')
-            print(f"Unexpected status code: {status}, Response: {error_data}")
+            logger.warning("Unexpected export status code", status=status, response=error_data[:1000])
             return {
                 'status': 'error',
                 'statusCode': status,
@@ -93,7 +97,7 @@ def lambda_handler(event, context):
             }
             
     except Exception as e:
-        print(f"Error checking export status: {str(e)}")
+        logger.exception("Error checking export status")
         return {
             'status': 'error',
             'statusCode': 500,
@@ -1,36 +1,75 @@
-import os
 import json
-import pymysql
+import bootstrap
+from history_archive import parse_fetch_time, read_archived_history
+from http_utils import wants_consistent_read
+from ids import to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+from table_export import EXPORT_FORMATS, get_export_format, export_output_error, export_query
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that retrieves data fetch history records
     from the data_fetch_history table.
+
+    Rows moved out by archive_data_fetch_history are included with
+    ?include_archived=true; since / until (fetch_time bounds) limit which
+    archives have to be read.
     """
     try:
-        # Database connection settings from environment variables
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
+        query_params = (event.get('queryStringParameters') if isinstance(event, dict) else None) or {}
+        try:
+            since = parse_fetch_time(query_params['since']) if query_params.get('since') else None
+            until = parse_fetch_time(query_params['until']) if query_params.get('until') else None
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'since and until must be dates or date-times, e.g. 2024-01-31T12:00:00'})
+            }
+
+        # ?export=ndjson|csv streams the full result to EXPORT_OUTPUT instead
+        export_format = get_export_format(event)
+        if export_format and export_format not in EXPORT_FORMATS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({
+                    'error': f'Unsupported export format: {export_format}',
+                    'supported_formats': sorted(EXPORT_FORMATS)
+                })
+            }
+        # An export written anywhere but S3 could never be downloaded
+        output_error = export_output_error() if export_format else None
+        if output_error:
+            logger.error("Export output not usable", error=output_error)
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Table exports are not configured', 'details': output_error})
+            }
 
         # Connect to the database
-        print("Connecting to the database...")
-        conn = pymysql.connect(**db_config)
+        logger.debug("Connecting to the database")
+        # Served by the read replica unless the caller needs its own writes
+        with span('db_connect'):
+            conn = bootstrap.connect_db(read_only=not wants_consistent_read(event))
         cursor = conn.cursor()
-        print("Database connection established.")
+        logger.debug("Database connection established")
 
         # Parse query parameters
-        query_params = event.get('queryStringParameters', {}) or {}
         fetch_id = query_params.get('fetch_id')
         provider_id = query_params.get('provider_id')
         group_id = query_params.get('group_id')
         status = query_params.get('status')
         include_provider_details = query_params.get('include_provider_details') == 'true'
+        include_archived = query_params.get('include_archived') == 'true'
         
         # Build the query based on parameters
         base_query = "SELECT * FROM data_fetch_history"
@@ -39,11 +78,11 @@ def lambda_handler(event, context):
         
         if fetch_id:
             where_clauses.append("fetch_id = %s")
-            params.append(fetch_id)
+            params.append(to_bin(fetch_id))
             
         if provider_id:
             where_clauses.append("provider_id = %s")
-            params.append(provider_id)
+            params.append(to_bin(provider_id))
             
         if group_id:
             where_clauses.append("group_id = %s")
@@ -52,21 +91,63 @@ def lambda_handler(event, context):
         if status:
             where_clauses.append("status = %s")
             params.append(status)
+
+        if since:
+            where_clauses.append("fetch_time >= %s")
+            params.append(since)
+
+        if until:
+            where_clauses.append("fetch_time < %s")
+            params.append(until)
             
         # Add WHERE clause if any filters were applied
         if where_clauses:
             base_query += " WHERE " + " AND ".join(where_clauses)
             
+        # Exports stream in primary key order (fetch_ids are time-ordered), so
+        # the server never has to sort the whole table first
+        if export_format:
+            cursor.close()
+            try:
+                export = export_query(conn, base_query + " ORDER BY fetch_id", params, export_format,
+                                      'data_fetch_history')
+            finally:
+                conn.close()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json'},
+                'body': to_json({'export': export})
+            }
+
         # Add order by most recent first
         base_query += " ORDER BY fetch_time DESC"
         
         # Execute the query
-        print(f"Executing query: {base_query} with params: {params}")
-        cursor.execute(base_query, params)
-        fetch_records = cursor.fetchall()
+        logger.debug("Executing query", query=base_query, params=params)
+        with span('db_query'):
+            cursor.execute(base_query, params)
+            fetch_records = cursor.fetchall()
+
+        # Archived rows are merged in most recent first; a fetch_id found in
+        # the live table needs no archive lookup
+        if include_archived and not (fetch_id and fetch_records):
+            filters = {column: value for column, value in
+                       (('fetch_id', fetch_id), ('provider_id', provider_id), ('group_id', group_id), ('status', status))
+                       if value}
+            # A batch re-archived after an interrupted run can appear twice
+            seen = {record['fetch_id'] for record in fetch_records}
+            archived = []
+            for record in read_archived_history(cursor, filters, since, until):
+                if record['fetch_id'] not in seen:
+                    seen.add(record['fetch_id'])
+                    archived.append(record)
+            if archived:
+                fetch_records = list(fetch_records) + archived
+                fetch_records.sort(key=lambda record: str(record['fetch_time']), reverse=True)
         
         # Print number of records found
-        print(f"Found {len(fetch_records)} data fetch history records")
+        logger.info("Data fetch history records retrieved", count=len(fetch_records))
+        add_metric('rows', len(fetch_records))
         
         # If requested, include provider details for each record
         if include_provider_details and fetch_records:
@@ -77,8 +158,9 @@ def lambda_handler(event, context):
             provider_query = "SELECT provider_id, provider_name, provider_type FROM healthcare_providers WHERE provider_id IN ({})".format(
                 ','.join(['%s'] * len(provider_ids))
             )
-            cursor.execute(provider_query, provider_ids)
-            providers = {p['provider_id']: p for p in cursor.fetchall()}
+            with span('db_query'):
+                cursor.execute(provider_query, [to_bin(provider_id) for provider_id in provider_ids])
+                providers = {p['provider_id']: p for p in cursor.fetchall()}
             
             # Attach provider details to each fetch record
             for record in fetch_records:
@@ -90,27 +172,30 @@ def lambda_handler(event, context):
         if fetch_id and fetch_records:
             # Single record response
             response = {
-                'data_fetch': json.loads(json.dumps(fetch_records[0], default=str))
+                'data_fetch': fetch_records[0]
             }
         else:
             # Multiple records response
             response = {
                 'count': len(fetch_records),
-                'data_fetch_history': json.loads(json.dumps(fetch_records, default=str))
+                'data_fetch_history': fetch_records
             }
 
         cursor.close()
         conn.close()
-        print("Database connection closed.")
+        logger.debug("Database connection closed")
+
+        with span('serialize'):
+            response_body = to_json(response)
 
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(response)
+            'body': response_body
         }
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to retrieve data fetch history")
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
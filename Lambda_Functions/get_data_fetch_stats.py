@@ -0,0 +1,185 @@
+import json
+from datetime import datetime, timedelta, timezone
+import bootstrap
+from fetch_summary import WINDOWS
+from http_utils import wants_consistent_read
+from ids import to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+
+logger = get_logger(__name__)
+
+COUNT_FIELDS = ('fetch_count', 'success_count', 'partial_count', 'failed_count')
+
+
+def failure_rate(failed, total):
+    return round(failed / total, 4) if total else None
+
+
+def build_provider_stats(row, windows):
+    """Shapes one provider's summary row and window counts for the response."""
+    stats = {
+        'provider_id': row['provider_id'],
+        'provider_name': row['provider_name'],
+        'status': row['status'],
+        'last_fetch_time': row['last_fetch_time'],
+        'last_status': row['last_status'],
+        'last_success_time': row['last_success_time'],
+        'last_failure_time': row['last_failure_time']
+    }
+    for field in COUNT_FIELDS:
+        stats[field] = int(row[field] or 0)
+    stats['failure_rate'] = failure_rate(stats['failed_count'], stats['fetch_count'])
+
+    for days in WINDOWS:
+        counts = windows.get((row['provider_id'], days), {})
+        total = counts.get('fetch_count', 0)
+        stats[f'last_{days}_days'] = {
+            'fetch_count': total,
+            'failed_count': counts.get('failed_count', 0),
+            'failure_rate': failure_rate(counts.get('failed_count', 0), total)
+        }
+    return stats
+
+
+def build_fleet_stats(providers):
+    """Adds up the per-provider statistics for the whole fleet."""
+    fleet = {
+        'provider_count': len(providers),
+        'providers_with_fetches': sum(1 for stats in providers if stats['fetch_count']),
+        'providers_failing': sum(1 for stats in providers if stats['last_status'] == 'Failed')
+    }
+    for field in COUNT_FIELDS:
+        fleet[field] = sum(stats[field] for stats in providers)
+    fleet['failure_rate'] = failure_rate(fleet['failed_count'], fleet['fetch_count'])
+    fleet['last_fetch_time'] = max((stats['last_fetch_time'] for stats in providers if stats['last_fetch_time']),
+                                   default=None)
+
+    for days in WINDOWS:
+        key = f'last_{days}_days'
+        total = sum(stats[key]['fetch_count'] for stats in providers)
+        failed = sum(stats[key]['failed_count'] for stats in providers)
+        fleet[key] = {'fetch_count': total, 'failed_count': failed, 'failure_rate': failure_rate(failed, total)}
+    return fleet
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that returns data fetch statistics per provider and for
+    the whole fleet: fetch counts, failure rates, the last (successful and
+    failed) fetch, and counts over the last 7 and 30 days.
+
+    Everything is read from provider_fetch_summary and provider_fetch_daily,
+    which every history insert keeps current, so the cost grows with the
+    number of providers rather than with the size of data_fetch_history.
+
+    Input:
+        provider_id (optional query parameter): statistics for one provider only
+    """
+    try:
+        query_params = (event.get('queryStringParameters') if isinstance(event, dict) else None) or {}
+        provider_id = query_params.get('provider_id') or (event.get('provider_id') if isinstance(event, dict) else None)
+
+        # Served by the read replica unless the caller needs its own writes
+        with span('db_connect'):
+            conn = bootstrap.connect_db(read_only=not wants_consistent_read(event))
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        provider_filter = " WHERE p.provider_id = %s" if provider_id else ""
+        provider_params = [to_bin(provider_id)] if provider_id else []
+
+        # Windows are whole UTC days, today included
+        today = datetime.now(timezone.utc).date()
+        window_starts = {days: today - timedelta(days=days - 1) for days in WINDOWS}
+
+        with span('db_query'):
+            cursor.execute(f"""
+                SELECT p.provider_id, p.provider_name, p.status,
+                       s.fetch_count, s.success_count, s.partial_count, s.failed_count,
+                       s.last_fetch_time, s.last_status, s.last_success_time, s.last_failure_time
+                FROM healthcare_providers p
+                LEFT JOIN provider_fetch_summary s ON s.provider_id = p.provider_id
+                {provider_filter}
+                ORDER BY p.provider_name
+            """, provider_params)
+            summary_rows = cursor.fetchall()
+
+            # One pass over at most the longest window's days per provider
+            window_columns = ', '.join(
+                f"SUM(IF(d.fetch_date >= %s, d.success_count + d.partial_count + d.failed_count, 0)) AS fetch_count_{days}, "
+                f"SUM(IF(d.fetch_date >= %s, d.failed_count, 0)) AS failed_count_{days}"
+                for days in WINDOWS
+            )
+            window_params = [window_starts[days] for days in WINDOWS for _ in range(2)]
+            cursor.execute(f"""
+                SELECT d.provider_id, {window_columns}
+                FROM provider_fetch_daily d
+                WHERE d.fetch_date >= %s{" AND d.provider_id = %s" if provider_id else ""}
+                GROUP BY d.provider_id
+            """, window_params + [min(window_starts.values())] + provider_params)
+            window_rows = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        if provider_id and not summary_rows:
+            return {
+                'statusCode': 404,
+                'body': json.dumps({
+                    'error': 'Provider not found',
+                    'provider_id': provider_id
+                })
+            }
+
+        windows = {}
+        for row in window_rows:
+            for days in WINDOWS:
+                windows[(row['provider_id'], days)] = {
+                    'fetch_count': int(row[f'fetch_count_{days}'] or 0),
+                    'failed_count': int(row[f'failed_count_{days}'] or 0)
+                }
+
+        with span('serialize'):
+            providers = [build_provider_stats(row, windows) for row in summary_rows]
+            if provider_id:
+                response = {'provider': providers[0]}
+            else:
+                response = {'fleet': build_fleet_stats(providers), 'providers': providers}
+            response_body = to_json(response)
+
+        add_metric('rows', len(summary_rows))
+        logger.info("Data fetch statistics retrieved", providers=len(summary_rows))
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': response_body
+        }
+
+    except bootstrap.MySQLError as e:
+        error_code = e.args[0]
+        error_message = e.args[1]
+
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Database error occurred',
+                'details': error_message
+            })
+        }
+    except Exception as e:
+        logger.exception("Failed to retrieve data fetch statistics")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'error': 'Failed to retrieve data fetch statistics',
+                'details': str(e)
+            })
+        }
@@ -1,40 +1,60 @@
-import os
 import json
-import pymysql
+import bootstrap
+from cache_utils import get_table_versions
+from http_utils import get_header, make_etag, etag_matches, not_modified_response, wants_consistent_read
+from ids import to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that retrieves and returns EHR systems 
     from the ehr_systems table.
     """
     try:
-        # Database connection settings from environment variables
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
         # Connect to the database
-        print("Connecting to the database...")
-        conn = pymysql.connect(**db_config)
+        logger.debug("Connecting to the database")
+        # Served by the read replica unless the caller needs its own writes
+        with span('db_connect'):
+            conn = bootstrap.connect_db(read_only=not wants_consistent_read(event))
         cursor = conn.cursor()
-        print("Database connection established.")
+        logger.debug("Database connection established")
 
         # Check if a specific ehr_id was provided in the query parameters
         ehr_id = None
         if 'queryStringParameters' in event and event['queryStringParameters']:
             ehr_id = event['queryStringParameters'].get('ehr_id')
 
+        # Provider counts make the response depend on healthcare_providers as well
+        query_params = event.get('queryStringParameters') or {}
+        include_provider_count = query_params.get('include_provider_count') == 'true'
+        version_tables = ['ehr_systems']
+        if include_provider_count:
+            version_tables.append('healthcare_providers')
+
+        # Answer conditional requests from the version counters alone
+        with span('db_query'):
+            versions = get_table_versions(cursor, version_tables)
+        etag = make_etag('ehr_systems', versions, ehr_id, include_provider_count)
+        if etag_matches(get_header(event, 'If-None-Match'), etag):
+            cursor.close()
+            conn.close()
+            logger.info("EHR systems unchanged, returning 304")
+            return not_modified_response(etag)
+
         if ehr_id:
             # Retrieve a specific EHR system
-            print(f"Retrieving EHR system with ID: {ehr_id}")
+            logger.info("Retrieving EHR system", ehr_id=ehr_id)
             query = "SELECT * FROM ehr_systems WHERE ehr_id = %s"
-            cursor.execute(query, (ehr_id,))
-            ehr_system = cursor.fetchone()
+            with span('db_query'):
+                cursor.execute(query, (to_bin(ehr_id),))
+                ehr_system = cursor.fetchone()
             
             if not ehr_system:
                 return {
@@ -47,60 +67,70 @@ def lambda_handler(event, context):
                 }
                 
             # Print EHR system details for logging
-            print(f"EHR system details: {json.dumps(ehr_system, default=str)}")
+            logger.debug("EHR system details", ehr_system=ehr_system)
             
             # Format the response
             response = {
-                'ehr_system': json.loads(json.dumps(ehr_system, default=str))
+                'ehr_system': ehr_system
             }
         else:
             # Retrieve all EHR systems
-            print("Retrieving all EHR systems")
+            logger.info("Retrieving all EHR systems")
             query = "SELECT * FROM ehr_systems"
-            cursor.execute(query)
-            ehr_systems = cursor.fetchall()
+            with span('db_query'):
+                cursor.execute(query)
+                ehr_systems = cursor.fetchall()
             
             # Print number of EHR systems found
-            print(f"Found {len(ehr_systems)} EHR systems")
+            logger.info("EHR systems retrieved", count=len(ehr_systems))
+            add_metric('rows', len(ehr_systems))
             
-            # Print each EHR system for logging
-            for system in ehr_systems:
-                print(f"EHR system: {json.dumps(system, default=str)}")
+            # Log a bounded sample of rows rather than every row
+            logger.debug("EHR system rows", sample=lambda: ehr_systems[:5])
             
             # Format the response
             response = {
                 'count': len(ehr_systems),
-                'ehr_systems': json.loads(json.dumps(ehr_systems, default=str))
+                'ehr_systems': ehr_systems
             }
 
         # Optional: Get provider count for each EHR system
-        if 'include_provider_count' in event.get('queryStringParameters', {}) and event['queryStringParameters']['include_provider_count'] == 'true':
+        if include_provider_count:
             if ehr_id:
                 # For a specific EHR system
                 count_query = "SELECT COUNT(*) as provider_count FROM healthcare_providers WHERE ehr_id = %s"
-                cursor.execute(count_query, (ehr_id,))
-                count_result = cursor.fetchone()
+                with span('db_query'):
+                    cursor.execute(count_query, (to_bin(ehr_id),))
+                    count_result = cursor.fetchone()
                 response['ehr_system']['provider_count'] = count_result['provider_count']
             else:
                 # For all EHR systems
                 for system in response['ehr_systems']:
                     count_query = "SELECT COUNT(*) as provider_count FROM healthcare_providers WHERE ehr_id = %s"
-                    cursor.execute(count_query, (system['ehr_id'],))
-                    count_result = cursor.fetchone()
+                    with span('db_query'):
+                        cursor.execute(count_query, (to_bin(system['ehr_id']),))
+                        count_result = cursor.fetchone()
                     system['provider_count'] = count_result['provider_count']
 
         cursor.close()
         conn.close()
-        print("Database connection closed.")
+        logger.debug("Database connection closed")
+
+        with span('serialize'):
+            response_body = to_json(response)
 
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(response)
+            'headers': {
+                'Content-Type': 'application/json',
+                'ETag': etag,
+                'Cache-Control': 'no-cache'
+            },
+            'body': response_body
         }
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to retrieve EHR systems")
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
@@ -1,8 +1,40 @@
-import os
 import json
-import pymysql
 from datetime import datetime
+import bootstrap
+from cache_utils import provider_cache, get_table_versions
+from http_utils import version_etag, wants_consistent_read
+from ids import to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+# Tables whose changes invalidate a cached provider + EHR join result
+CACHE_DEPENDENCIES = ('healthcare_providers', 'ehr_systems')
+
+def build_provider_response(provider_data):
+    """
+    Builds the 200 response for a provider, whether cached or freshly read.
+    The ETag is the row version, which update_healthcare_provider accepts as If-Match.
+    """
+    with span('serialize'):
+        response_body = to_json({
+            'provider': provider_data
+        })
+
+    headers = {'Content-Type': 'application/json'}
+    if provider_data.get('version') is not None:
+        headers['ETag'] = version_etag(provider_data['version'])
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': response_body
+    }
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that retrieves a healthcare provider by ID,
@@ -20,25 +52,11 @@ def lambda_handler(event, context):
             # Direct Lambda invocation pattern
             body = event
         
-        print("Event payload parsed, processing provider data...")
+        logger.debug("Event payload parsed, processing provider data")
 
         # Extract the fields from the body
         provider_id = body.get('provider_id')
 
-        # Connect to the database
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
-        conn = pymysql.connect(**db_config)
-        cursor = conn.cursor()
-        print("Database connection established.")
-
         # Validate required fields
         if not provider_id:
             return {
@@ -49,6 +67,32 @@ def lambda_handler(event, context):
                 })
             }
 
+        # Serve hot lookups from the container cache without touching RDS.
+        # A consistent read always checks the writer's table versions
+        consistent = wants_consistent_read(event)
+        cached = provider_cache.get(provider_id)
+        if cached and cached[2] and not consistent:
+            add_metric('cache_hits', 1)
+            logger.info("Provider data served from cache", provider_id=provider_id)
+            return build_provider_response(cached[0])
+
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db(read_only=not consistent)
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        # An expired entry is still good if neither table has changed since it was read
+        with span('db_query'):
+            versions = get_table_versions(cursor, CACHE_DEPENDENCIES)
+        if cached and cached[1] == versions:
+            add_metric('cache_revalidations', 1)
+            provider_cache.refresh(provider_id)
+            cursor.close()
+            conn.close()
+            logger.info("Cached provider data revalidated", provider_id=provider_id)
+            return build_provider_response(cached[0])
+
         # Join healthcare_providers with ehr_systems to get all data in one query
         # Rename EHR fields to avoid column name collisions
         join_query = """
@@ -68,11 +112,14 @@ def lambda_handler(event, context):
             WHERE 
                 p.provider_id = %s
         """
-        cursor.execute(join_query, (provider_id,))
-        combined_data = cursor.fetchone()
+        with span('db_query'):
+            cursor.execute(join_query, (to_bin(provider_id),))
+            combined_data = cursor.fetchone()
         
         # Handle case where provider doesn't exist
         if not combined_data:
+            cursor.close()
+            conn.close()
             return {
                 'statusCode': 404,
                 'body': json.dumps({
@@ -83,24 +130,17 @@ def lambda_handler(event, context):
         
         cursor.close()
         conn.close()
-        print(f"Provider data retrieved successfully for ID: {provider_id}")
+        logger.info("Provider data retrieved", provider_id=provider_id)
 
-        # Convert data to JSON-compatible format
-        response_data = json.loads(json.dumps(combined_data, default=str))
+        provider_cache.put(provider_id, combined_data, versions)
 
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
-                'provider': response_data
-            })
-        }
+        return build_provider_response(combined_data)
 
-    except pymysql.MySQLError as e:
+    except bootstrap.MySQLError as e:
         error_code = e.args[0]
         error_message = e.args[1]
         
-        print(f"MySQL Error {error_code}: {error_message}")
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -109,7 +149,7 @@ def lambda_handler(event, context):
             })
         }
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to retrieve provider data")
         return {
             'statusCode': 500,
             'body': json.dumps({
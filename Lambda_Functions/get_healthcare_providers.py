@@ -1,40 +1,88 @@
-import os
 import json
-import pymysql
+import bootstrap
+from cache_utils import get_table_versions
+from http_utils import get_header, make_etag, etag_matches, not_modified_response, wants_consistent_read
+from ids import to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+from table_export import EXPORT_FORMATS, get_export_format, export_output_error, export_query
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that retrieves and returns all healthcare providers 
     from the healthcare_providers table.
     """
     try:
-        # Database connection settings from environment variables
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
+        # ?export=ndjson|csv streams the full result to EXPORT_OUTPUT instead
+        export_format = get_export_format(event)
+        if export_format and export_format not in EXPORT_FORMATS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({
+                    'error': f'Unsupported export format: {export_format}',
+                    'supported_formats': sorted(EXPORT_FORMATS)
+                })
+            }
+        # An export written anywhere but S3 could never be downloaded
+        output_error = export_output_error() if export_format else None
+        if output_error:
+            logger.error("Export output not usable", error=output_error)
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Table exports are not configured', 'details': output_error})
+            }
 
         # Connect to the database
-        print("Connecting to the database...")
-        conn = pymysql.connect(**db_config)
+        logger.debug("Connecting to the database")
+        # Served by the read replica unless the caller needs its own writes
+        with span('db_connect'):
+            conn = bootstrap.connect_db(read_only=not wants_consistent_read(event))
         cursor = conn.cursor()
-        print("Database connection established.")
+        logger.debug("Database connection established")
 
         # Check if a specific provider_id was provided in the query parameters
         provider_id = None
         if 'queryStringParameters' in event and event['queryStringParameters']:
             provider_id = event['queryStringParameters'].get('provider_id')
 
+        if export_format:
+            cursor.close()
+            try:
+                export = export_query(conn, "SELECT * FROM healthcare_providers ORDER BY provider_id", (),
+                                      export_format, 'healthcare_providers')
+            finally:
+                conn.close()
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json'},
+                'body': to_json({'export': export})
+            }
+
+        # Answer conditional requests from the version counter alone
+        with span('db_query'):
+            versions = get_table_versions(cursor, ('healthcare_providers',))
+        etag = make_etag('healthcare_providers', versions, provider_id)
+        if etag_matches(get_header(event, 'If-None-Match'), etag):
+            cursor.close()
+            conn.close()
+            logger.info("Providers unchanged, returning 304")
+            return not_modified_response(etag)
+
         if provider_id:
             # Retrieve a specific provider
-            print(f"Retrieving provider with ID: {provider_id}")
+            logger.info("Retrieving provider", provider_id=provider_id)
             query = "SELECT * FROM healthcare_providers WHERE provider_id = %s"
-            cursor.execute(query, (provider_id,))
-            providers = cursor.fetchone()
+            with span('db_query'):
+                cursor.execute(query, (to_bin(provider_id),))
+                providers = cursor.fetchone()
             
             if not providers:
                 return {
@@ -47,44 +95,52 @@ def lambda_handler(event, context):
                 }
                 
             # Print provider details for logging
-            print(f"Provider details: {json.dumps(providers, default=str)}")
+            logger.debug("Provider details", provider=providers)
             
             # Format the response
             response = {
-                'provider': json.loads(json.dumps(providers, default=str))
+                'provider': providers
             }
         else:
             # Retrieve all providers
-            print("Retrieving all providers")
+            logger.info("Retrieving all providers")
             query = "SELECT * FROM healthcare_providers"
-            cursor.execute(query)
-            providers = cursor.fetchall()
+            with span('db_query'):
+                cursor.execute(query)
+                providers = cursor.fetchall()
             
             # Print number of providers found
-            print(f"Found {len(providers)} providers")
+            logger.info("Providers retrieved", count=len(providers))
+            add_metric('rows', len(providers))
             
-            # Print each provider for logging
-            for provider in providers:
-                print(f"Provider: {json.dumps(provider, default=str)}")
+            # Log a bounded sample of rows rather than every row
+            logger.debug("Provider rows", sample=lambda: providers[:5])
             
             # Format the response
             response = {
                 'count': len(providers),
-                'providers': json.loads(json.dumps(providers, default=str))
+                'providers': providers
             }
 
         cursor.close()
         conn.close()
-        print("Database connection closed.")
+        logger.debug("Database connection closed")
+
+        with span('serialize'):
+            response_body = to_json(response)
 
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(response)
+            'headers': {
+                'Content-Type': 'application/json',
+                'ETag': etag,
+                'Cache-Control': 'no-cache'
+            },
+            'body': response_body
         }
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to retrieve providers")
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
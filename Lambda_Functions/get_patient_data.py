@@ -1,95 +1,125 @@
-import http.client
 import json
 import gzip
-import boto3
 from urllib.parse import urlparse
 from datetime import datetime
-from botocore.exceptions import ClientError
-
-def invoke_authorization_lambda():
-    # Create a Lambda client
-    client = boto3.client('lambda')
-
-    # Invoke the authorization Lambda function
-    response = client.invoke(
-        FunctionName='authorization',  
-        InvocationType='RequestResponse'
-    )
-    
-    # Parse the response payload
-    response_payload = json.loads(response['Payload'].read())
-    if response_payload['statusCode'] == 200:
-        return response_payload['body']
-    else:
-        raise Exception("Failed to retrieve access token from authorization Lambda.")
-
-def process_fhir_export(url, type, access_token):
+import bootstrap
+from log_utils import LOG_SAMPLE_EVERY, get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+from outbound_http import request, CircuitOpenError
+from token_provider import get_token_provider
+
+logger = get_logger(__name__)
+
+# Bucket HealthLake imports the exported NDJSON files from
+S3_BUCKET = 'myheathlakeimportbucket'
+
+def process_fhir_export(url, type, tokens, key=None):
+    """
+    Downloads one export output file and stores it in S3 under key (by default
+    HealthLakeOutput/<type>_<date>.ndjson). tokens is the export's
+    token_provider.TokenProvider; a 401 is retried once with a new token.
+    Returns the key, bytes and row count stored, or an error response.
+    Raises CircuitOpenError while the EHR host is failing, so callers stop
+    instead of trying every remaining file.
+    """
     parsed_url = urlparse(url)
 
     try:
         # Make a GET request to initiate bulk FHIR export
-        conn = http.client.HTTPSConnection(parsed_url.netloc)
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Accept': 'application/fhir+ndjson',
-        }
-        conn.request('GET', parsed_url.path, headers=headers)
-        response = conn.getresponse()
+        access_token = tokens.get()
+        for attempt in range(2):
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Accept': 'application/fhir+ndjson',
+            }
+            response = request('GET', url, parsed_url.path, headers=headers)
+            if response.status != 401 or attempt:
+                break
+            # The token expired mid-export: renew it and try once more
+            logger.info("Access token rejected, retrying with a new one", url=url)
+            access_token = tokens.refresh(access_token)
 
         # Check if the response is a redirect
         if response.status == 307:
             # Follow the redirect
             location = response.getheader('Location')
             parsed_location = urlparse(location)
-            conn = http.client.HTTPSConnection(parsed_location.netloc)
-            conn.request('GET', parsed_location.path + "?" + parsed_location.query, headers={'Content-Type': 'application/fhir+ndjson'})
-            response = conn.getresponse()
+            response = request('GET', location, parsed_location.path + "?" + parsed_location.query,
+                               headers={'Content-Type': 'application/fhir+ndjson'})
+
+        # Never store an error body as if it were export data
+        if response.status != 200:
+            raise Exception(f"File download failed with HTTP {response.status}")
+
+        raw_body = response.read()
+        add_metric('bytes_downloaded', len(raw_body), 'Bytes')
 
         # Check if the response is gzip-encoded
         if response.getheader('Content-Encoding') == 'gzip':
-            body_bytes = gzip.decompress(response.read())
+            body_bytes = gzip.decompress(raw_body)
             body = body_bytes.decode('utf-8')
         else:
-            body = response.read().decode('utf-8')
+            body = raw_body.decode('utf-8')
 
         jsonobjects = body.split('\n')
         if jsonobjects[-1] == '':
             jsonobjects = jsonobjects[:-1]
         
         # Initialize S3 client
-        s3 = boto3.client('s3')
-        todaydate = datetime.now().strftime('%Y-%m-%d')
+        s3 = bootstrap.get_client('s3')
 
         # Define the S3 key (filename) where the JSON object will be saved
-        key = f"HealthLakeOutput/{type}_{todaydate}.ndjson"
+        if key is None:
+            todaydate = datetime.now().strftime('%Y-%m-%d')
+            key = f"HealthLakeOutput/{type}_{todaydate}.ndjson"
 
         # Upload the JSON object as a file to the specified S3 bucket
-        s3.put_object(Body=body, Bucket='myheathlakeimportbucket', Key=key)
+        with span('s3_put'):
+            s3.put_object(Body=body, Bucket=S3_BUCKET, Key=key)
+        add_metric('files_processed', 1)
+        add_metric('rows', len(jsonobjects))
+        logger.info("File stored in S3", key=key, rows=len(jsonobjects), bytes=len(raw_body),
+                    sample_every=LOG_SAMPLE_EVERY)
+        return {'key': key, 'bytes': len(raw_body), 'rows': len(jsonobjects)}
 
-    except ClientError as e:
-        print(f"Error with S3 upload: {e}")
+    except bootstrap.ClientError as e:
+        logger.exception("Error with S3 upload", key=key)
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
+    except CircuitOpenError:
+        raise
     except Exception as e:
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)})
         }
 
+@instrument
+@profiled
 def lambda_handler(event, context):
     try:
-        # Invoke authorization Lambda to get a new access token
-        access_token = invoke_authorization_lambda()
+        provider_id = event.get('provider_id')
+        if not provider_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing required parameter: provider_id'})
+            }
+
+        # One token for all files, renewed in the background before it expires
+        tokens = get_token_provider(provider_id)
 
         # Get output from input event
         get_job_status = event.get('GetJobStatus')
         output = get_job_status.get('ResponseBody', {}).get('output', [])
 
-        # Process each URL in the output
-        for item in output:
-            process_fhir_export(item.get('url'), item.get('type'), access_token)
+        # Process each URL in the output; the token is only renewed in the
+        # background while these downloads run
+        with tokens.hold():
+            for item in output:
+                process_fhir_export(item.get('url'), item.get('type'), tokens)
 
         return {
             'statusCode': 200,
@@ -0,0 +1,175 @@
+import os
+import gzip
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+import bootstrap
+from ids import from_bin, id_timestamp, to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import span, add_metric
+
+logger = get_logger(__name__)
+
+# s3://bucket/prefix archived data_fetch_history rows are written to. There is
+# no default: the rows are deleted once archived, and /tmp does not outlive the container
+ARCHIVE_OUTPUT = os.environ.get('ARCHIVE_OUTPUT', '')
+# Lets tests and local runs archive to a local directory instead
+ARCHIVE_ALLOW_LOCAL = os.environ.get('ARCHIVE_ALLOW_LOCAL', 'false').lower() == 'true'
+
+# Filters compared as canonical ids; the rest compare case-insensitively, like
+# the _ci collation the live query is matched under
+ID_COLUMNS = {'fetch_id', 'provider_id'}
+# How far a row's fetch_time is looked for from the time in its fetch_id. A
+# completion can be retried after the id was made, and callers may pass fetch_time
+FETCH_ID_TIME_SLACK = timedelta(days=1)
+
+
+def parse_fetch_time(value):
+    """
+    Parses a since / until bound ("2024-01-31", "2024-01-31T12:00:00" or
+    "2024-01-31 12:00:00") into a naive UTC datetime. Raises ValueError for
+    anything else.
+    """
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def archive_output_error():
+    """Returns why ARCHIVE_OUTPUT cannot hold archives, or None when it can."""
+    if not ARCHIVE_OUTPUT:
+        return 'ARCHIVE_OUTPUT is not set'
+    if not ARCHIVE_OUTPUT.startswith('s3://') and not ARCHIVE_ALLOW_LOCAL:
+        return f'ARCHIVE_OUTPUT must be an s3:// location, not {ARCHIVE_OUTPUT}'
+    return None
+
+
+def archive_name(period_start, first_fetch_id):
+    """Object name of an archive: one folder per month, named after its first row."""
+    return f'data_fetch_history/{period_start:%Y-%m}/{first_fetch_id}.ndjson.gz'
+
+
+def write_archive(name, rows):
+    """
+    Writes rows as gzipped NDJSON (the same JSON the API returns) to
+    ARCHIVE_OUTPUT and returns (location, size in bytes). Writing the same
+    name again replaces the object, so a re-run after an interruption does
+    not leave a second copy behind. Raises RuntimeError when ARCHIVE_OUTPUT
+    cannot hold archives, so nothing is deleted on the strength of a lost copy.
+    """
+    error = archive_output_error()
+    if error:
+        raise RuntimeError(error)
+
+    with span('serialize'):
+        data = gzip.compress(''.join(to_json(row) + '\n' for row in rows).encode('utf-8'))
+
+    if ARCHIVE_OUTPUT.startswith('s3://'):
+        bucket, _, prefix = ARCHIVE_OUTPUT[len('s3://'):].partition('/')
+        key = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        with span('s3_put'):
+            bootstrap.get_client('s3').put_object(Bucket=bucket, Key=key, Body=data,
+                                                  ContentType='application/x-ndjson', ContentEncoding='gzip')
+        location = f's3://{bucket}/{key}'
+    else:
+        location = os.path.join(ARCHIVE_OUTPUT, name)
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        with open(location, 'wb') as f:
+            f.write(data)
+
+    add_metric('bytes_archived', len(data), 'Bytes')
+    return location, len(data)
+
+
+def read_archive(location):
+    """Returns the rows of one archive written by write_archive."""
+    if location.startswith('s3://'):
+        bucket, _, key = location[len('s3://'):].partition('/')
+        with span('s3_get'):
+            data = bootstrap.get_client('s3').get_object(Bucket=bucket, Key=key)['Body'].read()
+    else:
+        with open(location, 'rb') as f:
+            data = f.read()
+    return [json.loads(line) for line in gzip.decompress(data).splitlines() if line]
+
+
+def _normalize(column, value):
+    if value is None:
+        return None
+    if column in ID_COLUMNS:
+        return from_bin(to_bin(value))
+    return str(value).casefold()
+
+
+def _matches(row, filters, since, until):
+    if any(_normalize(column, row.get(column)) != _normalize(column, value) for column, value in filters.items()):
+        return False
+    # Archived times are "YYYY-MM-DD HH:MM:SS" strings, the same form str() gives a datetime
+    if since is not None and row['fetch_time'] < str(since):
+        return False
+    if until is not None and row['fetch_time'] >= str(until):
+        return False
+    return True
+
+
+def fetch_id_window(fetch_id):
+    """
+    The fetch_time range a fetch_id's row is most likely in: FETCH_ID_TIME_SLACK
+    either side of the creation time new_id() encoded in it. None for ids
+    without one (random ids from before time-ordered ids).
+    """
+    try:
+        if uuid.UUID(str(fetch_id)).version != 7:
+            return None
+    except ValueError:
+        return None
+    created = datetime.fromtimestamp(id_timestamp(fetch_id), timezone.utc).replace(tzinfo=None)
+    return created - FETCH_ID_TIME_SLACK, created + FETCH_ID_TIME_SLACK
+
+
+def read_archived_history(cursor, filters, since=None, until=None):
+    """
+    Returns the archived data_fetch_history rows that match filters (a dict
+    of column -> value, e.g. provider_id or status) and fall in [since, until).
+    Only archives whose time range overlaps the bounds are read, so narrow
+    bounds keep the number of objects fetched small. A fetch_id filter is
+    first looked for near the time encoded in the id, and in every archive
+    only when it is not there.
+    """
+    window = fetch_id_window(filters['fetch_id']) if filters.get('fetch_id') else None
+    if window:
+        narrowed_since = max(window[0], since) if since else window[0]
+        narrowed_until = min(window[1], until) if until else window[1]
+        if narrowed_since < narrowed_until:
+            rows = _read_archives(cursor, filters, narrowed_since, narrowed_until)
+            if rows:
+                return rows
+    return _read_archives(cursor, filters, since, until)
+
+
+def _read_archives(cursor, filters, since, until):
+    query = "SELECT location FROM data_fetch_history_archives"
+    where_clauses = []
+    params = []
+    if since is not None:
+        where_clauses.append("last_fetch_time >= %s")
+        params.append(since)
+    if until is not None:
+        where_clauses.append("first_fetch_time < %s")
+        params.append(until)
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+
+    with span('db_query'):
+        cursor.execute(query + " ORDER BY first_fetch_time", params)
+        locations = [row['location'] for row in cursor.fetchall()]
+
+    rows = []
+    for location in locations:
+        rows.extend(row for row in read_archive(location) if _matches(row, filters, since, until))
+
+    add_metric('archives_read', len(locations))
+    logger.info("Archived history read", archives=len(locations), rows=len(rows))
+    return rows
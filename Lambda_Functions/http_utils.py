@@ -0,0 +1,114 @@
+import json
+import hashlib
+from urllib.parse import urlparse
+
+
+def get_header(event, name):
+    """
+    Returns a request header from an API Gateway event, matching the name
+    case-insensitively. Returns None for direct invocations without headers.
+    """
+    headers = event.get('headers') if isinstance(event, dict) else None
+    if not headers:
+        return None
+
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def make_etag(*parts):
+    """
+    Builds a strong ETag from the values that fully determine a response body,
+    e.g. table version counters plus the query parameters of the request.
+    """
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8'))
+    return f'"{digest.hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Checks an If-None-Match header value (single, list or '*') against an ETag."""
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+def not_modified_response(etag):
+    """Builds an empty 304 response for a request whose cached copy is still current."""
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'no-cache'
+        },
+        'body': ''
+    }
+
+
+def version_etag(version):
+    """Builds the ETag of a single row from its version column."""
+    return f'"{version}"'
+
+
+def parse_if_match(if_match):
+    """
+    Returns the row version named by an If-Match header ("3", "\"3\"" or
+    W/"3"), or None when the header is missing or '*'. Raises ValueError for
+    anything else, since no other ETag can match a row.
+    """
+    if not if_match or if_match.strip() == '*':
+        return None
+
+    candidate = if_match.strip()
+    if candidate.startswith('W/'):
+        candidate = candidate[2:]
+    return int(candidate.strip('"'))
+
+
+def prefers_minimal(event):
+    """True when the client sent "Prefer: return=minimal" or ?return=minimal."""
+    prefer = get_header(event, 'Prefer') or ''
+    params = (event.get('queryStringParameters') if isinstance(event, dict) else None) or {}
+    return 'return=minimal' in prefer.replace(' ', '').lower() or params.get('return') == 'minimal'
+
+
+def open_connection(target, timeout=None):
+    """
+    Opens an HTTP(S) connection for a bare host ("api.example.com"), a
+    host:port, or a full URL. Bare hosts and https:// URLs use TLS; an explicit
+    http:// scheme is honoured so the export functions can run against local
+    stand-in servers. timeout is the socket timeout in seconds.
+    """
+    # Imported here so handlers that only use the ETag helpers skip http.client and ssl
+    import http.client
+
+    options = {'timeout': timeout} if timeout else {}
+    if '://' not in target:
+        return http.client.HTTPSConnection(target, **options)
+
+    parsed = urlparse(target)
+    if parsed.scheme == 'http':
+        return http.client.HTTPConnection(parsed.netloc, **options)
+    return http.client.HTTPSConnection(parsed.netloc, **options)
+
+
+def wants_consistent_read(event):
+    """
+    True when the caller has to see its own writes and so must not be served
+    from the read replica: an "X-Consistent-Read: true" header,
+    ?consistent_read=true, or "consistent_read": true in a direct invocation.
+    """
+    if not isinstance(event, dict):
+        return False
+    params = event.get('queryStringParameters') or {}
+    return str(get_header(event, 'X-Consistent-Read')).lower() == 'true' or \
+        params.get('consistent_read') == 'true' or event.get('consistent_read') is True
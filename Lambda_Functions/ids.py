@@ -0,0 +1,71 @@
+import os
+import time
+import uuid
+import threading
+
+# Last timestamp and sequence handed out in this container, so ids generated
+# within the same millisecond still sort in creation order
+_last_ms = 0
+_sequence = 0
+_lock = threading.Lock()
+
+
+def new_id():
+    """
+    Returns a new time-ordered UUID (version 7, RFC 9562) as a 36-character string.
+
+    The first 48 bits are the Unix time in milliseconds, so new primary keys
+    land at the end of the InnoDB index instead of at random pages the way
+    UUID() / uuid4 keys do, and ids can be generated here before the INSERT
+    so the row never has to be read back to learn its key.
+    """
+    global _last_ms, _sequence
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Random start leaves room to count up within the millisecond
+            _sequence = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            # Same millisecond (or the clock moved back): keep counting
+            _sequence += 1
+            if _sequence > 0xFFF:
+                _last_ms += 1
+                _sequence = 0
+        timestamp_ms, sequence = _last_ms, _sequence
+
+    random_bits = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (timestamp_ms << 80) | (0x7 << 76) | (sequence << 64) | (0b10 << 62) | random_bits
+    return str(uuid.UUID(int=value))
+
+
+def id_timestamp(id_value):
+    """Returns the creation time (Unix seconds) encoded in an id from new_id()."""
+    return (uuid.UUID(str(id_value)).int >> 80) / 1000
+
+
+def to_bin(id_value):
+    """
+    Converts an id string to the 16 bytes stored in the BINARY(16) key
+    columns, matching MySQL's UUID_TO_BIN(id) (no swap). Ids created before
+    the binary migration convert the same way, so existing ids keep working.
+
+    A value that is not a UUID is passed through as its raw bytes, which can
+    never equal a stored key: lookups by a malformed id simply find nothing
+    and foreign key references to one fail with error 1452, as they did when
+    keys were strings.
+    """
+    if id_value is None or isinstance(id_value, (bytes, bytearray)):
+        return id_value
+    try:
+        return uuid.UUID(str(id_value)).bytes
+    except ValueError:
+        return str(id_value).encode('utf-8')
+
+
+def from_bin(value):
+    """Converts a BINARY(16) key back to its canonical 36-character string."""
+    if isinstance(value, (bytes, bytearray)) and len(value) == 16:
+        return str(uuid.UUID(bytes=bytes(value)))
+    return value
@@ -1,12 +1,168 @@
 import os
 import json
-import pymysql
-from datetime import datetime
+from datetime import datetime, timezone
+import bootstrap
+from fetch_summary import record_fetches
+from ids import from_bin, new_id, to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+# Largest number of records accepted by one bulk request
+HISTORY_BATCH_MAX = int(os.environ.get('HISTORY_BATCH_MAX', 5000))
+
+FETCH_STATUSES = {'Success', 'Partial', 'Failed'}
+
+def build_fetch_record(record, fetch_time):
+    """
+    Builds the full data_fetch_history row for one record, with the fetch_id
+    generated here so the inserted row never has to be read back.
+    """
+    return {
+        'fetch_id': new_id(),
+        'provider_id': record.get('provider_id'),
+        'group_id': record.get('group_id'),
+        'fetch_time': record.get('fetch_time') or fetch_time,
+        'status': record.get('status') or 'Success',  # Default to Success if not provided
+        's3_location': record.get('s3_location'),
+        'error_details': record.get('error_details')
+    }
+
+def validate_record(record):
+    """Returns the problems with one record; empty when it can be inserted."""
+    if not isinstance(record, dict):
+        return ['Record must be an object']
+    errors = []
+    if not record.get('provider_id'):
+        errors.append('Missing required field: provider_id')
+    if record.get('status') and record['status'] not in FETCH_STATUSES:
+        errors.append(f"Invalid status: {record['status']}")
+    return errors
+
+def insert_fetch_records(cursor, rows):
+    """
+    Inserts prepared rows and adds them to the fetch summary tables;
+    executemany sends them as multi-row INSERTs.
+    """
+    insert_query = """
+        INSERT INTO data_fetch_history (
+            fetch_id, provider_id, group_id, fetch_time, status, s3_location, error_details
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s);
+    """
+    cursor.executemany(insert_query, [
+        (to_bin(row['fetch_id']), to_bin(row['provider_id']), row['group_id'], row['fetch_time'],
+         row['status'], row['s3_location'], row['error_details'])
+        for row in rows
+    ])
+    record_fetches(cursor, rows)
+
+def lookup_providers(cursor, provider_ids):
+    """Fetches name and type for every distinct provider_id with a single query."""
+    provider_ids = sorted(set(provider_ids))
+    query = "SELECT provider_id, provider_name, provider_type FROM healthcare_providers WHERE provider_id IN ({})".format(
+        ','.join(['%s'] * len(provider_ids))
+    )
+    cursor.execute(query, [to_bin(provider_id) for provider_id in provider_ids])
+    return {row.pop('provider_id'): row for row in cursor.fetchall()}
+
+def insert_bulk(records):
+    """
+    Inserts many data fetch records in one transaction. Records that fail
+    validation or name an unknown provider are reported and skipped; the rest
+    are written with multi-row INSERTs and pre-generated fetch_ids.
+    """
+    if not records:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'No records supplied'})
+        }
+    if len(records) > HISTORY_BATCH_MAX:
+        return {
+            'statusCode': 413,
+            'body': json.dumps({
+                'error': f'At most {HISTORY_BATCH_MAX} records can be added per request',
+                'received': len(records)
+            })
+        }
+
+    results = []
+    for index, record in enumerate(records):
+        errors = validate_record(record)
+        results.append({'index': index, 'status': 'invalid', 'errors': errors} if errors
+                       else {'index': index, 'status': 'pending'})
+
+    valid_indexes = [result['index'] for result in results if result['status'] == 'pending']
+    providers = {}
+    rows = []
+    if valid_indexes:
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        try:
+            # One lookup covers every distinct provider in the batch and also
+            # catches unknown providers before they fail the whole INSERT
+            with span('db_query'):
+                providers = lookup_providers(cursor, [records[index]['provider_id'] for index in valid_indexes])
+
+            fetch_time = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+            for index in valid_indexes:
+                record = records[index]
+                # Provider keys are canonical lowercase ids, as from_bin returns them
+                if from_bin(to_bin(record['provider_id'])) not in providers:
+                    results[index] = {'index': index, 'status': 'invalid',
+                                      'errors': [f"Unknown provider_id: {record['provider_id']}"]}
+                    continue
+                row = build_fetch_record(record, fetch_time)
+                rows.append(row)
+                results[index] = {'index': index, 'status': 'created', 'fetch_id': row['fetch_id'],
+                                  'provider_id': row['provider_id']}
+
+            if rows:
+                with span('db_query'):
+                    insert_fetch_records(cursor, rows)
+                    conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+    invalid_count = len(records) - len(rows)
+    add_metric('rows', len(rows))
+    logger.info("Data fetch history records added", created=len(rows), invalid=invalid_count)
+
+    with span('serialize'):
+        response_body = to_json({
+            'message': f'{len(rows)} data fetch history records added successfully',
+            'created': len(rows),
+            'invalid': invalid_count,
+            'results': results,
+            'providers': providers
+        })
+
+    return {
+        # 207 tells the caller to inspect the per-record results
+        'statusCode': (201 if not invalid_count else 207) if rows else 400,
+        'headers': {'Content-Type': 'application/json'},
+        'body': response_body
+    }
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that receives JSON payload with data fetch details
     and inserts it into the data_fetch_history table.
+
+    Bulk mode: a JSON list of records, or {"records": [...]}, is inserted in
+    one transaction and answered with a result per record.
     """
     try:
         # Parse the incoming JSON payload, handling different event structures
@@ -20,21 +176,10 @@ def lambda_handler(event, context):
             # Direct Lambda invocation pattern
             body = event
         
-        print("Event payload parsed:", body)
+        logger.debug("Event payload parsed", body=body)
 
-        # Connect to the database
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
-        conn = pymysql.connect(**db_config)
-        cursor = conn.cursor()
-        print("Database connection established.")
+        if isinstance(body, list) or (isinstance(body, dict) and isinstance(body.get('records'), list)):
+            return insert_bulk(body if isinstance(body, list) else body['records'])
 
         # Validate required field
         provider_id = body.get('provider_id')
@@ -46,42 +191,32 @@ def lambda_handler(event, context):
                 })
             }
 
-        # SQL query to insert data into the data_fetch_history table
-        insert_query = """
-            INSERT INTO data_fetch_history (
-                provider_id, group_id, status, s3_location, error_details
-            ) VALUES (%s, %s, %s, %s, %s);
-        """
-
-        # Get current datetime for fetch_time (will use database default)
-        values = (
-            provider_id,
-            body.get('group_id'),  # Added group_id
-            body.get('status', 'Success'),  # Default to Success if not provided
-            body.get('s3_location'),
-            body.get('error_details')
-        )
-
-        cursor.execute(insert_query, values)
-        conn.commit()
-        
-        # Get the inserted record
-        select_query = "SELECT * FROM data_fetch_history WHERE fetch_id = LAST_INSERT_ID()"
-        cursor.execute(select_query)
-        new_fetch_record = cursor.fetchone()
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        # The response is built from the values written, fetch_time included,
+        # so the record is not selected again after the INSERT
+        new_fetch_record = build_fetch_record(body, datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0))
+
+        with span('db_query'):
+            insert_fetch_records(cursor, [new_fetch_record])
+            conn.commit()
         
         # Also retrieve the provider information for context
-        provider_query = "SELECT provider_name, provider_type FROM healthcare_providers WHERE provider_id = %s"
-        cursor.execute(provider_query, (provider_id,))
-        provider_info = cursor.fetchone()
+        with span('db_query'):
+            # Provider keys are canonical lowercase ids, as from_bin returns them
+            provider_info = lookup_providers(cursor, [provider_id]).get(from_bin(to_bin(provider_id)))
         
         cursor.close()
         conn.close()
-        print("Data fetch history record added successfully")
+        logger.info("Data fetch history record added", provider_id=provider_id, fetch_id=new_fetch_record['fetch_id'])
 
         # Combine the data for the response
         response_data = {
-            'data_fetch': json.loads(json.dumps(new_fetch_record, default=str))
+            'data_fetch': new_fetch_record
         }
         
         if provider_info:
@@ -90,17 +225,17 @@ def lambda_handler(event, context):
         return {
             'statusCode': 201,  # Created
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
+            'body': to_json({
                 'message': 'Data fetch history record added successfully',
                 'data': response_data
             })
         }
 
-    except pymysql.MySQLError as e:
+    except bootstrap.MySQLError as e:
         error_code = e.args[0]
         error_message = e.args[1]
         
-        print(f"MySQL Error {error_code}: {error_message}")
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
         
         if error_code == 1452:  # Foreign key constraint failure
             return {
@@ -119,11 +254,11 @@ def lambda_handler(event, context):
                 })
             }
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to add data fetch history record")
         return {
             'statusCode': 500,
             'body': json.dumps({
                 'error': 'Failed to add data fetch history record',
                 'details': str(e)
             })
-        }
\ No newline at end of file
+        }
@@ -1,9 +1,18 @@
-import os
 import json
-import pymysql
-import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+import bootstrap
+from cache_utils import bump_table_version
+from http_utils import version_etag
+from ids import new_id, to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that receives JSON payload with EHR system data
@@ -21,21 +30,13 @@ def lambda_handler(event, context):
             # Direct Lambda invocation pattern
             body = event
         
-        print("Event payload parsed:", body)
+        logger.debug("Event payload parsed", body=body)
 
         # Connect to the database
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
-        conn = pymysql.connect(**db_config)
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
         cursor = conn.cursor()
-        print("Database connection established.")
+        logger.debug("Database connection established")
 
         # Validate required fields
         required_fields = ['ehr_name']
@@ -50,49 +51,67 @@ def lambda_handler(event, context):
                 })
             }
 
+        # Generate the id and defaults here so the response needs no read-back
+        added_on = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        new_ehr = {
+            'ehr_id': new_id(),
+            'ehr_name': body.get('ehr_name'),
+            'documentation_link': body.get('documentation_link'),
+            'authorization_url': body.get('authorization_url'),
+            'connection_url': body.get('connection_url'),
+            'description': body.get('description'),
+            'is_supported': body.get('is_supported', False),  # Default to False if not provided
+            'is_tenant_id_required': False,
+            'added_on': added_on,
+            'last_updated': added_on,
+            'version': 1
+        }
+
         # SQL query to insert data into the ehr_systems table - updated for new schema
         insert_query = """
             INSERT INTO ehr_systems (
-                ehr_name, documentation_link, authorization_url, connection_url,
-                description, is_supported
-            ) VALUES (%s, %s, %s, %s, %s, %s);
+                ehr_id, ehr_name, documentation_link, authorization_url, connection_url,
+                description, is_supported, added_on, last_updated
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
         """
 
         values = (
-            body.get('ehr_name'),
-            body.get('documentation_link'),
-            body.get('authorization_url'),
-            body.get('connection_url'),
-            body.get('description'),
-            body.get('is_supported', False)  # Default to False if not provided
+            to_bin(new_ehr['ehr_id']),
+            new_ehr['ehr_name'],
+            new_ehr['documentation_link'],
+            new_ehr['authorization_url'],
+            new_ehr['connection_url'],
+            new_ehr['description'],
+            new_ehr['is_supported'],
+            added_on,
+            added_on
         )
 
-        cursor.execute(insert_query, values)
-        conn.commit()
-        
-        # Get the inserted record
-        select_query = "SELECT * FROM ehr_systems WHERE ehr_id = LAST_INSERT_ID()"
-        cursor.execute(select_query)
-        new_ehr = cursor.fetchone()
+        with span('db_query'):
+            cursor.execute(insert_query, values)
+            # Invalidate cached listings (ETags) in every container
+            bump_table_version(cursor, 'ehr_systems')
+            conn.commit()
         
         cursor.close()
         conn.close()
-        print("EHR system added successfully")
+        logger.info("EHR system added", ehr_id=new_ehr['ehr_id'])
 
         return {
             'statusCode': 201,  # Created
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
+            # Lets the client send If-Match on its first update
+            'headers': {'Content-Type': 'application/json', 'ETag': version_etag(new_ehr['version'])},
+            'body': to_json({
                 'message': 'EHR system added successfully',
-                'ehr_system': json.loads(json.dumps(new_ehr, default=str))  # Convert dates to strings
+                'ehr_system': new_ehr
             })
         }
 
-    except pymysql.MySQLError as e:
+    except bootstrap.MySQLError as e:
         error_code = e.args[0]
         error_message = e.args[1]
         
-        print(f"MySQL Error {error_code}: {error_message}")
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
         
         if error_code == 1062:  # Duplicate entry
             return {
@@ -111,7 +130,7 @@ def lambda_handler(event, context):
                 })
             }
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to add EHR system")
         return {
             'statusCode': 500,
             'body': json.dumps({
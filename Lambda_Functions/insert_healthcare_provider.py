@@ -1,8 +1,18 @@
-import os
 import json
-import pymysql
-from datetime import datetime
+from datetime import datetime, timezone
+import bootstrap
+from cache_utils import bump_table_version
+from http_utils import version_etag
+from ids import new_id, to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that receives a JSON payload with healthcare provider data
@@ -20,7 +30,7 @@ def lambda_handler(event, context):
             # Direct Lambda invocation pattern
             body = event
         
-        print("Event payload parsed, processing provider data...")
+        logger.debug("Event payload parsed, processing provider data")
 
         # Extract the fields from the body
         provider_name = body.get('provider_name')
@@ -35,20 +45,6 @@ def lambda_handler(event, context):
         notes = body.get('note')       
         secret_name = body.get('secret_name')   # Secret name passed directly
         
-        # Connect to the database
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
-        conn = pymysql.connect(**db_config)
-        cursor = conn.cursor()
-        print("Database connection established.")
-
         # Validate required fields
         required_fields = ['provider_name', 'provider_type', 'contact_email', 'contact_phone']
         missing_fields = []
@@ -71,94 +67,83 @@ def lambda_handler(event, context):
                 })
             }
 
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        # The id and server-side defaults are filled in here, so the response
+        # comes straight from the values written and needs no SELECT afterwards
+        new_provider = {
+            'provider_id': new_id(),
+            'provider_name': provider_name,
+            'provider_type': provider_type,
+            'contact_email': contact_email,
+            'contact_phone': contact_phone,
+            'address': address,
+            'ehr_id': ehr_id,
+            'bulk_fhir_url': bulk_fhir_url,
+            'tenant_id': tenant_id,
+            'secret_name': secret_name,
+            'status': status or 'Pending',
+            'notes': notes,
+            'onboarded_date': datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0),
+            'last_data_fetch': None,
+            'version': 1
+        }
+        provider_id = new_provider['provider_id']
+
         # SQL query to insert data into the healthcare_providers table
         insert_query = """
             INSERT INTO healthcare_providers (
-                provider_name, provider_type, contact_email, contact_phone, address,
+                provider_id, provider_name, provider_type, contact_email, contact_phone, address,
                 ehr_id, bulk_fhir_url, tenant_id, secret_name,
-                status, notes
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+                status, notes, onboarded_date
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
         """
 
         values = (
+            to_bin(provider_id),
             provider_name,
             provider_type,
             contact_email,
             contact_phone,
             address,
-            ehr_id,
+            to_bin(ehr_id),
             bulk_fhir_url,
             tenant_id,
             secret_name,
-            status,
-            notes
+            new_provider['status'],
+            notes,
+            new_provider['onboarded_date']
         )
 
-        cursor.execute(insert_query, values)
-        conn.commit()
-        
-        # Get the last inserted ID
-        provider_id = cursor.lastrowid
-        
-        if not provider_id:
-            # If lastrowid is not available, try to find the new record by other means
-            print("Warning: Could not get lastrowid, trying alternative method")
-            find_query = """
-                SELECT provider_id FROM healthcare_providers 
-                WHERE provider_name = %s AND contact_email = %s
-                ORDER BY onboarded_date DESC LIMIT 1
-            """
-            cursor.execute(find_query, (provider_name, contact_email))
-            result = cursor.fetchone()
-            if result:
-                provider_id = result['provider_id']
-                print(f"Found provider using alternative method: {provider_id}")
-            else:
-                print("Warning: Could not find newly inserted provider")
-                provider_id = "unknown"  # Fallback
-        
-        # Get the inserted record with explicit selection of provider_id
-        select_query = "SELECT provider_id, provider_name, provider_type, contact_email, contact_phone, address, ehr_id, bulk_fhir_url, tenant_id, secret_name, status, notes, onboarded_date, last_data_fetch FROM healthcare_providers WHERE provider_id = %s"
-        cursor.execute(select_query, (provider_id,))
-        new_provider = cursor.fetchone()
-        
-        # Handle case where we couldn't retrieve the newly inserted record
-        if not new_provider:
-            print(f"Warning: Could not retrieve provider details for ID: {provider_id}")
-            # Create a minimal provider record so we can still return something
-            new_provider = {
-                'provider_id': provider_id,
-                'provider_name': provider_name,
-                'provider_type': provider_type,
-                'contact_email': contact_email,
-                'contact_phone': contact_phone
-            }
+        with span('db_query'):
+            cursor.execute(insert_query, values)
+            # Invalidate cached listings (ETags) in every container
+            bump_table_version(cursor, 'healthcare_providers')
+            conn.commit()
         
         cursor.close()
         conn.close()
-        print(f"Provider added successfully with ID: {provider_id}")
-
-        # Make sure provider_id is explicitly included
-        response_provider = json.loads(json.dumps(new_provider, default=str))
-        
-        # Double-check that provider_id is in the response
-        if 'provider_id' not in response_provider and provider_id:
-            response_provider['provider_id'] = str(provider_id)
+        logger.info("Provider added", provider_id=provider_id)
 
         return {
             'statusCode': 201,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
+            # Lets the client send If-Match on its first update
+            'headers': {'Content-Type': 'application/json', 'ETag': version_etag(new_provider['version'])},
+            'body': to_json({
                 'message': 'Healthcare provider added successfully',
-                'provider': response_provider
+                'provider': new_provider
             })
         }
 
-    except pymysql.MySQLError as e:
+    except bootstrap.MySQLError as e:
         error_code = e.args[0]
         error_message = e.args[1]
         
-        print(f"MySQL Error {error_code}: {error_message}")
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
         
         if error_code == 1062:  # Duplicate entry
             return {
@@ -185,7 +170,7 @@ def lambda_handler(event, context):
                 })
             }
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to add healthcare provider")
         return {
             'statusCode': 500,
             'body': json.dumps({
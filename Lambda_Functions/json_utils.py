@@ -0,0 +1,42 @@
+import json
+import base64
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+# orjson is optional - bundle it in the deployment package (or a layer) for
+# faster serialization of large row lists, otherwise the stdlib is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    """
+    Converts the non-JSON types returned by DictCursor rows. Dates and times
+    keep the same text form as str() so responses match the old default=str output.
+    """
+    if isinstance(value, (datetime, date, time, timedelta)):
+        return str(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return base64.b64encode(value).decode('ascii')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def to_json(data):
+        """Serializes a response payload, including raw DictCursor rows, to a JSON string in one pass."""
+        return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    def to_json(data):
+        """Serializes a response payload, including raw DictCursor rows, to a JSON string in one pass."""
+        return json.dumps(data, default=_default)
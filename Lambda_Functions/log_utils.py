@@ -0,0 +1,120 @@
+import os
+import sys
+import traceback
+from datetime import datetime, timezone
+from json_utils import to_json
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+# Field names whose values are never written to the logs
+SENSITIVE_FIELDS = {
+    'password', 'client_secret', 'client_id', 'access_token', 'refresh_token',
+    'id_token', 'authorization', 'secretstring', 'secret_value', 'token'
+}
+REDACTED = '***REDACTED***'
+
+# Default sample_every for events repeated once per file or per poll
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 10))
+
+# Fields shared by every record of the current invocation, e.g. the request id
+_context_fields = {}
+
+
+def set_log_context(**fields):
+    """Replaces the fields attached to every log record (call once per invocation)."""
+    _context_fields.clear()
+    _context_fields.update({key: value for key, value in fields.items() if value is not None})
+
+
+def redact(value):
+    """Returns a copy of value with sensitive dictionary fields masked, at any depth."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_FIELDS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class StructuredLogger:
+    """
+    Emits one JSON object per log record on stdout, which CloudWatch stores as-is.
+
+    - The level comes from the LOG_LEVEL environment variable (default INFO) and
+      records below it return before any formatting happens.
+    - Field values may be zero-argument callables; they are only evaluated when
+      the record is actually written, so expensive payloads cost nothing when
+      the level is disabled.
+    - sample_every=N writes only the first and then every Nth occurrence of a
+      message, for events that repeat inside loops (LOG_SAMPLE_EVERY is the
+      usual N).
+    - Sensitive fields (tokens, secrets, passwords) are always redacted.
+    """
+
+    def __init__(self, name, level=None):
+        self.name = name
+        level_name = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+        self.level = LEVELS_BY_NAME.get(level_name, INFO)
+        self._occurrences = {}
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def debug(self, message, **fields):
+        self._log(DEBUG, message, fields)
+
+    def info(self, message, **fields):
+        self._log(INFO, message, fields)
+
+    def warning(self, message, **fields):
+        self._log(WARNING, message, fields)
+
+    def error(self, message, **fields):
+        self._log(ERROR, message, fields)
+
+    def exception(self, message, **fields):
+        """Logs at ERROR level with the traceback of the exception being handled."""
+        fields['traceback'] = traceback.format_exc
+        self._log(ERROR, message, fields)
+
+    def _log(self, level, message, fields):
+        if level < self.level:
+            return
+
+        sample_every = fields.pop('sample_every', None)
+        if sample_every:
+            seen = self._occurrences.get(message, 0) + 1
+            self._occurrences[message] = seen
+            if seen != 1 and seen % sample_every:
+                return
+            fields['occurrences'] = seen
+
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'level': LEVEL_NAMES[level],
+            'logger': self.name,
+            'message': message
+        }
+        record.update(_context_fields)
+        for key, value in fields.items():
+            record[key] = value() if callable(value) else value
+
+        try:
+            line = to_json(redact(record))
+        except Exception as e:
+            line = to_json({'level': 'ERROR', 'logger': self.name, 'message': message,
+                            'log_error': f'Could not serialize log record: {e}'})
+        sys.stdout.write(line + '\n')
+
+
+def get_logger(name):
+    """Returns a structured logger for a handler module."""
+    return StructuredLogger(name)
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from json_utils import to_json
+from log_utils import set_log_context
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Wintergreen')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+
+# True until the first invocation of this container has started
+_cold_start = True
+
+# Metrics of the invocation currently running in this container
+_current = None
+
+
+class InvocationMetrics:
+    """
+    Accumulates timings and counters for a single handler invocation.
+    Spans with the same name are summed, so three db_query spans report the
+    total query time plus db_query_count = 3.
+    """
+
+    def __init__(self, function_name, request_id=None, cold_start=False):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.cold_start = cold_start
+        self.started = time.perf_counter()
+        self.span_ms = {}
+        self.span_counts = {}
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, elapsed_ms):
+        with self._lock:
+            self.span_ms[name] = self.span_ms.get(name, 0.0) + elapsed_ms
+            self.span_counts[name] = self.span_counts.get(name, 0) + 1
+
+    def add_metric(self, name, value, unit='Count'):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+            self.units[name] = unit
+
+    def to_emf(self):
+        """Builds one CloudWatch Embedded Metric Format record for the invocation."""
+        record = {
+            'FunctionName': self.function_name,
+            'request_id': self.request_id,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 3)
+        }
+        definitions = [{'Name': 'duration_ms', 'Unit': 'Milliseconds'}]
+
+        for name, elapsed in self.span_ms.items():
+            record[f'{name}_ms'] = round(elapsed, 3)
+            record[f'{name}_count'] = self.span_counts[name]
+            definitions.append({'Name': f'{name}_ms', 'Unit': 'Milliseconds'})
+            definitions.append({'Name': f'{name}_count', 'Unit': 'Count'})
+
+        for name, value in self.values.items():
+            record[name] = value
+            definitions.append({'Name': name, 'Unit': self.units[name]})
+
+        record['ColdStart'] = int(self.cold_start)
+        definitions.append({'Name': 'ColdStart', 'Unit': 'Count'})
+        record.update(self.properties)
+
+        record['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['FunctionName']],
+                'Metrics': definitions
+            }]
+        }
+        return record
+
+
+@contextmanager
+def span(name):
+    """
+    Times a block as a named span (db_connect, db_query, http_request, s3_put,
+    serialize, ...) of the current invocation. Outside an instrumented handler
+    the block runs untimed.
+    """
+    metrics = _current
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_span(name, (time.perf_counter() - start) * 1000)
+
+
+def add_metric(name, value, unit='Count'):
+    """Adds value to a counter of the current invocation, e.g. rows or bytes."""
+    if _current is not None:
+        _current.add_metric(name, value, unit)
+
+
+def set_property(name, value):
+    """Attaches a non-metric field (e.g. provider_id) to the invocation record."""
+    if _current is not None:
+        _current.properties[name] = value
+
+
+def instrument(handler):
+    """
+    Decorator for lambda_handler that records the cold/warm flag, total
+    duration, any spans and counters recorded while it runs, and the response
+    size, then writes them as a single EMF record to stdout.
+    """
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', handler.__module__)
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _cold_start, _current
+
+        request_id = getattr(context, 'aws_request_id', None)
+        set_log_context(request_id=request_id, function=function_name)
+        if not METRICS_ENABLED:
+            return handler(event, context)
+
+        metrics = InvocationMetrics(function_name, request_id, _cold_start)
+        _cold_start = False
+        previous, _current = _current, metrics
+        try:
+            response = handler(event, context)
+            if isinstance(response, dict):
+                if 'statusCode' in response:
+                    metrics.properties['status_code'] = response['statusCode']
+                if isinstance(response.get('body'), str):
+                    metrics.add_metric('response_bytes', len(response['body']), 'Bytes')
+            return response
+        except Exception:
+            metrics.add_metric('errors', 1)
+            raise
+        finally:
+            _current = previous
+            sys.stdout.write(to_json(metrics.to_emf()) + '\n')
+
+    return wrapper
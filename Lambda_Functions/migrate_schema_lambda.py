@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import bootstrap
+from cache_utils import bump_table_version
+from fetch_summary import BACKFILL_STATEMENTS
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+from schema import TABLES
+
+logger = get_logger(__name__)
+
+# Rows converted per UPDATE, so a large data_fetch_history never holds one huge transaction
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 10000))
+
+# Every UUID column moved from VARCHAR(36) to BINARY(16), parents before children,
+# with the definition it ends up with (matching schema.py)
+ID_COLUMNS = [
+    ('ehr_systems', 'ehr_id', True, "BINARY(16) NOT NULL DEFAULT (UUID_TO_BIN(UUID()))"),
+    ('healthcare_providers', 'provider_id', True, "BINARY(16) NOT NULL DEFAULT (UUID_TO_BIN(UUID()))"),
+    ('healthcare_providers', 'ehr_id', False, "BINARY(16)"),
+    ('data_fetch_history', 'fetch_id', True, "BINARY(16) NOT NULL DEFAULT (UUID_TO_BIN(UUID()))"),
+    ('data_fetch_history', 'provider_id', False, "BINARY(16) NOT NULL"),
+]
+
+# Columns added after the first release, as (table, column, definition)
+ADDED_COLUMNS = [
+    ('healthcare_providers', 'version', "INT UNSIGNED NOT NULL DEFAULT 1"),
+    ('ehr_systems', 'version', "INT UNSIGNED NOT NULL DEFAULT 1"),
+]
+
+# Indexes added after the first release, as (table, index, kind, columns)
+ADDED_INDEXES = [
+    ('data_fetch_history', 'idx_data_fetch_history_time', 'INDEX', "(fetch_time)"),
+    ('healthcare_providers', 'idx_healthcare_providers_name', 'INDEX', "(provider_name)"),
+    ('healthcare_providers', 'ft_healthcare_providers_search', 'FULLTEXT INDEX',
+     "(provider_name, address, contact_email)"),
+]
+
+# Foreign key clauses in the schema.py table definitions
+FOREIGN_KEY_PATTERN = re.compile(r"FOREIGN KEY \((\w+)\) REFERENCES (\w+)\((\w+)\)([^,\n]*)")
+
+# Suffix of the temporary column holding converted values while a column migrates
+TEMP_SUFFIX = '__bin'
+
+
+def column_types(cursor, database):
+    """Returns {(table, column): data_type} for every column of the migrated tables."""
+    cursor.execute("""
+        SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name, DATA_TYPE AS data_type
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ('ehr_systems', 'healthcare_providers', 'data_fetch_history')
+    """, (database,))
+    return {(row['table_name'], row['column_name']): row['data_type'].lower() for row in cursor.fetchall()}
+
+
+def existing_tables(cursor, database):
+    """Returns the names of the tables that already exist in the database."""
+    cursor.execute("SELECT TABLE_NAME AS table_name FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s",
+                   (database,))
+    return {row['table_name'] for row in cursor.fetchall()}
+
+
+def existing_indexes(cursor, database):
+    """Returns the (table, index) names of every index in the database."""
+    cursor.execute("SELECT DISTINCT TABLE_NAME AS table_name, INDEX_NAME AS index_name "
+                   "FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s", (database,))
+    return {(row['table_name'], row['index_name']) for row in cursor.fetchall()}
+
+
+def foreign_keys(cursor, database):
+    """Returns the foreign keys that involve any migrated column."""
+    cursor.execute("""
+        SELECT CONSTRAINT_NAME AS constraint_name, TABLE_NAME AS table_name, COLUMN_NAME AS column_name,
+               REFERENCED_TABLE_NAME AS referenced_table, REFERENCED_COLUMN_NAME AS referenced_column
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (database,))
+    migrated = {(table, column) for table, column, _, _ in ID_COLUMNS}
+    return [row for row in cursor.fetchall()
+            if (row['table_name'], row['column_name']) in migrated
+            or (row['referenced_table'], row['referenced_column']) in migrated]
+
+
+def schema_foreign_keys():
+    """
+    Returns every foreign key defined in schema.py as (table, column,
+    referenced table, referenced column, options such as ON DELETE CASCADE).
+    """
+    return [(name, *match) for name, definition in TABLES
+            for match in FOREIGN_KEY_PATTERN.findall(definition)]
+
+
+def missing_foreign_keys(cursor, database, tables):
+    """
+    Returns the schema.py foreign keys of the given tables that the database
+    lacks, e.g. because a run was interrupted after dropping them.
+    """
+    cursor.execute("""
+        SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name,
+               REFERENCED_TABLE_NAME AS referenced_table, REFERENCED_COLUMN_NAME AS referenced_column
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (database,))
+    present = {(row['table_name'], row['column_name'], row['referenced_table'], row['referenced_column'])
+               for row in cursor.fetchall()}
+    return [key for key in schema_foreign_keys() if key[0] in tables and key[:4] not in present]
+
+
+def count_invalid(cursor, table, column):
+    """Counts values UUID_TO_BIN would reject, so nothing is changed when any exist."""
+    cursor.execute(f"SELECT COUNT(*) AS invalid FROM `{table}` WHERE `{column}` IS NOT NULL AND IS_UUID(`{column}`) = 0")
+    return cursor.fetchone()['invalid']
+
+
+def migrate_column(cursor, conn, table, column, is_primary_key, definition, types):
+    """
+    Converts one VARCHAR(36) UUID column to BINARY(16) in place:
+    add a temporary binary column next to it, fill it in batches, then drop the
+    old column and give the new one its name (and the primary key) in one
+    ALTER TABLE. Safe to re-run after an interruption because the temporary
+    column is reused; a table left with only the temporary column (by an
+    earlier release that swapped the columns in two steps) is just renamed.
+    """
+    temp_column = f'{column}{TEMP_SUFFIX}'
+    if (table, column) not in types:
+        logger.info("Finishing interrupted column swap", table=table, column=column)
+        with span('db_query'):
+            cursor.execute(
+                f"ALTER TABLE `{table}` CHANGE COLUMN `{temp_column}` `{column}` {definition}"
+                + (f", ADD PRIMARY KEY (`{column}`)" if is_primary_key else '')
+            )
+        return 0
+
+    if (table, temp_column) not in types:
+        with span('db_query'):
+            cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{temp_column}` BINARY(16) NULL AFTER `{column}`")
+
+    converted = 0
+    while True:
+        with span('db_query'):
+            cursor.execute(
+                f"UPDATE `{table}` SET `{temp_column}` = UUID_TO_BIN(`{column}`) "
+                f"WHERE `{temp_column}` IS NULL AND `{column}` IS NOT NULL LIMIT %s",
+                (MIGRATION_BATCH_SIZE,)
+            )
+            conn.commit()
+        converted += cursor.rowcount
+        if cursor.rowcount < MIGRATION_BATCH_SIZE:
+            break
+    logger.info("Column values converted", table=table, column=column, rows=converted)
+
+    with span('db_query'):
+        cursor.execute(
+            f"ALTER TABLE `{table}` {'DROP PRIMARY KEY, ' if is_primary_key else ''}DROP COLUMN `{column}`, "
+            f"CHANGE COLUMN `{temp_column}` `{column}` {definition}"
+            + (f", ADD PRIMARY KEY (`{column}`)" if is_primary_key else '')
+        )
+    add_metric('rows', converted)
+    return converted
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that brings a database created by an earlier release up
+    to the current schema.py: it creates tables added since, adds the version
+    columns used by the update functions and the indexes added since,
+    restores missing foreign keys, and migrates the id columns of
+    ehr_systems, healthcare_providers and data_fetch_history from
+    VARCHAR(36) UUID strings to BINARY(16). Values are converted with UUID_TO_BIN without swapping, the
+    same mapping ids.to_bin uses, so every existing id string keeps working
+    through the API. Steps that are already done are skipped, so the
+    function can be run again safely. Pass {"dry_run": true} to only report
+    what would change.
+    """
+    dry_run = isinstance(event, dict) and str(event.get('dry_run', '')).lower() == 'true'
+    database = os.environ['DB_NAME']
+
+    try:
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        with span('db_query'):
+            types = column_types(cursor, database)
+            tables = existing_tables(cursor, database)
+            indexes = existing_indexes(cursor, database)
+            missing_keys = missing_foreign_keys(cursor, database, tables)
+        pending = [spec for spec in ID_COLUMNS if types.get((spec[0], spec[1])) != 'binary']
+        missing = [spec for spec in ADDED_COLUMNS if (spec[0], spec[1]) not in types]
+        new_tables = [(name, definition) for name, definition in TABLES if name not in tables]
+        missing_indexes = [spec for spec in ADDED_INDEXES if (spec[0], spec[1]) not in indexes]
+        if not pending and not missing and not new_tables and not missing_indexes and not missing_keys:
+            cursor.close()
+            conn.close()
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Schema is already up to date, nothing to migrate'})
+            }
+
+        # Check every column before anything is altered
+        invalid = {}
+        for table, column, _, _ in pending:
+            if (table, column) not in types:
+                # Only the converted temporary column is left
+                continue
+            with span('db_query'):
+                count = count_invalid(cursor, table, column)
+            if count:
+                invalid[f'{table}.{column}'] = count
+        if invalid or dry_run:
+            cursor.close()
+            conn.close()
+            return {
+                'statusCode': 409 if invalid else 200,
+                'body': json.dumps({
+                    'message': 'Columns contain values that are not UUIDs, nothing was changed' if invalid
+                               else 'Dry run, nothing was changed',
+                    'pending_columns': [f'{table}.{column}' for table, column, _, _ in pending],
+                    'missing_columns': [f'{table}.{column}' for table, column, _ in missing],
+                    'missing_tables': [name for name, _ in new_tables],
+                    'missing_indexes': [f'{table}.{index}' for table, index, _, _ in missing_indexes],
+                    'missing_foreign_keys': [f'{key[0]}.{key[1]}' for key in missing_keys],
+                    'invalid_values': invalid
+                })
+            }
+
+        # Adding a column with a constant default is an instant change in MySQL 8
+        for table, column, definition in missing:
+            logger.info("Adding column", table=table, column=column)
+            with span('db_query'):
+                cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+
+        # Foreign keys cannot span a VARCHAR and a BINARY column, so drop them
+        # while the columns change and recreate them afterwards. What to
+        # recreate comes from schema.py, so keys dropped by an interrupted
+        # run are restored too.
+        keys = []
+        if pending:
+            with span('db_query'):
+                keys = foreign_keys(cursor, database)
+        for key in keys:
+            logger.info("Dropping foreign key", constraint=key['constraint_name'], table=key['table_name'])
+            with span('db_query'):
+                cursor.execute(f"ALTER TABLE `{key['table_name']}` DROP FOREIGN KEY `{key['constraint_name']}`")
+
+        migrated = {}
+        for table, column, is_primary_key, definition in pending:
+            logger.info("Migrating column", table=table, column=column)
+            migrated[f'{table}.{column}'] = migrate_column(cursor, conn, table, column, is_primary_key, definition, types)
+
+        # Dropped keys keep their names; lost ones get a generated name
+        names = {(key['table_name'], key['column_name'], key['referenced_table'], key['referenced_column']):
+                 key['constraint_name'] for key in keys}
+        with span('db_query'):
+            missing_keys = missing_foreign_keys(cursor, database, tables)
+        for table, column, referenced_table, referenced_column, options in missing_keys:
+            name = names.get((table, column, referenced_table, referenced_column))
+            logger.info("Recreating foreign key", constraint=name, table=table, column=column)
+            with span('db_query'):
+                cursor.execute(
+                    f"ALTER TABLE `{table}` ADD {f'CONSTRAINT `{name}` ' if name else ''}"
+                    f"FOREIGN KEY (`{column}`) REFERENCES `{referenced_table}` (`{referenced_column}`){options}"
+                )
+
+        # Tables added since the database was created; these reference the
+        # binary keys, so they are created once the ids are migrated
+        for name, definition in new_tables:
+            logger.info("Creating table", table=name)
+            with span('db_query'):
+                cursor.execute(definition)
+                # Summary tables start from the history recorded so far;
+                # committed right away so a re-run never misses the backfill
+                if name in BACKFILL_STATEMENTS:
+                    cursor.execute(BACKFILL_STATEMENTS[name])
+                    conn.commit()
+
+        # Plain indexes are built online, so inserts into a large
+        # data_fetch_history carry on meanwhile. A FULLTEXT index blocks
+        # writes while it builds, which healthcare_providers can afford.
+        for table, index, kind, columns in missing_indexes:
+            logger.info("Adding index", table=table, index=index)
+            lock = 'NONE' if kind == 'INDEX' else 'SHARED'
+            with span('db_query'):
+                cursor.execute(f"ALTER TABLE `{table}` ADD {kind} `{index}` {columns}, ALGORITHM=INPLACE, LOCK={lock}")
+
+        # Cached listings and ETags were computed from the old rows
+        with span('db_query'):
+            for table in ('healthcare_providers', 'ehr_systems', 'data_fetch_history'):
+                bump_table_version(cursor, table)
+            conn.commit()
+
+        cursor.close()
+        conn.close()
+        logger.info("Schema migrated", columns=list(migrated), added=[spec[:2] for spec in missing],
+                    tables=[name for name, _ in new_tables], indexes=[spec[:2] for spec in missing_indexes])
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Schema migrated',
+                'rows_converted': migrated,
+                'columns_added': [f'{table}.{column}' for table, column, _ in missing],
+                'tables_created': [name for name, _ in new_tables],
+                'indexes_added': [f'{table}.{index}' for table, index, _, _ in missing_indexes],
+                'foreign_keys_recreated': [f'{key[0]}.{key[1]}' for key in missing_keys]
+            })
+        }
+
+    except bootstrap.MySQLError as e:
+        error_code = e.args[0]
+        error_message = e.args[1]
+
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Migration failed, run it again to resume',
+                'details': error_message
+            })
+        }
+    except Exception as e:
+        logger.exception("Migration failed")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Migration failed, run it again to resume',
+                'details': str(e)
+            })
+        }
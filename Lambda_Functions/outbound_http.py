@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from http_utils import open_connection
+from log_utils import get_logger
+from metrics import span, add_metric
+
+logger = get_logger(__name__)
+
+# Socket timeout for every outbound request
+OUTBOUND_TIMEOUT_SECONDS = float(os.environ.get('OUTBOUND_TIMEOUT_SECONDS', 30))
+# Upper bound of the per-host concurrency limit
+OUTBOUND_MAX_CONCURRENCY = int(os.environ.get('OUTBOUND_MAX_CONCURRENCY', 8))
+# Consecutive failures that open a host's circuit
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+# Share of failures among the recent requests that also opens it
+CIRCUIT_ERROR_RATE = float(os.environ.get('CIRCUIT_ERROR_RATE', 0.5))
+# How long an open circuit fails fast before one probe request is let through
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', 30))
+# Share of OUTBOUND_TIMEOUT_SECONDS after which a response that did arrive
+# still counts as a failure: a host answering just inside the timeout is failing
+CIRCUIT_SLOW_FRACTION = float(os.environ.get('CIRCUIT_SLOW_FRACTION', 0.8))
+
+# Recent outcomes per host the error rate is computed over
+CIRCUIT_WINDOW = 20
+# Responses that ask the client to slow down
+THROTTLE_STATUSES = {429, 503}
+
+
+class CircuitOpenError(Exception):
+    """Raised without connecting while a host's circuit is open."""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"Circuit open for {host}, retry in {retry_in:.0f} s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class Response:
+    """
+    A response whose body has already been read, so the host's concurrency
+    slot is free again before the caller looks at it. Offers the parts of
+    http.client.HTTPResponse the export functions use.
+    """
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self):
+        return self.body
+
+
+class HostState:
+    """
+    Circuit breaker and AIMD concurrency limit for one host. Every failure
+    (connection error, timeout, 5xx, or response headers slower than
+    CIRCUIT_SLOW_FRACTION of the timeout) counts against the circuit; 429 and
+    503 also halve the concurrency limit, and each success grows it back by
+    about one request per round trip.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.condition = threading.Condition()
+        self.limit = float(OUTBOUND_MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.outcomes = deque(maxlen=CIRCUIT_WINDOW)
+        self.consecutive_failures = 0
+        self.latency_ms = None
+        self.opened_at = None
+        self.probing = False
+
+    def acquire(self):
+        """Waits for a free slot, or raises CircuitOpenError while the circuit is open."""
+        with self.condition:
+            if self.opened_at is not None:
+                remaining = self.opened_at + CIRCUIT_OPEN_SECONDS - time.monotonic()
+                if remaining > 0 or self.probing:
+                    raise CircuitOpenError(self.host, max(remaining, 0))
+                # Half-open: this request tests whether the host has recovered
+                self.probing = True
+
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, ok, latency_ms, throttled):
+        """Records one request's outcome; latency_ms is the time until its response headers arrived."""
+        if ok and latency_ms >= CIRCUIT_SLOW_FRACTION * OUTBOUND_TIMEOUT_SECONDS * 1000:
+            ok = False
+            add_metric('outbound_slow', 1)
+
+        with self.condition:
+            self.in_flight -= 1
+            self.outcomes.append(ok)
+            self.latency_ms = latency_ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * latency_ms
+
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+                add_metric('outbound_throttled', 1)
+            elif ok:
+                self.limit = min(float(OUTBOUND_MAX_CONCURRENCY), self.limit + 1 / self.limit)
+
+            if ok:
+                self.consecutive_failures = 0
+                if self.probing:
+                    self.opened_at = None
+                    self.probing = False
+                    self.outcomes.clear()
+                    logger.info("Circuit closed", host=self.host)
+            else:
+                self.consecutive_failures += 1
+                error_rate = self.outcomes.count(False) / len(self.outcomes)
+                if self.probing or self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD or \
+                        (len(self.outcomes) >= CIRCUIT_WINDOW // 2 and error_rate >= CIRCUIT_ERROR_RATE):
+                    self.opened_at = time.monotonic()
+                    self.probing = False
+                    add_metric('circuit_opened', 1)
+                    logger.warning("Circuit opened", host=self.host, error_rate=round(error_rate, 2),
+                                   consecutive_failures=self.consecutive_failures,
+                                   latency_ms=round(self.latency_ms))
+            self.condition.notify_all()
+
+
+# Host states for this container
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+
+def host_state(target):
+    """Returns the container's HostState for a bare host, host:port or URL."""
+    host = urlparse(target).netloc if '://' in target else target
+    with _hosts_lock:
+        if host not in _hosts:
+            _hosts[host] = HostState(host)
+        return _hosts[host]
+
+
+def request(method, target, path, body=None, headers=None):
+    """
+    Sends one request to target (anything open_connection accepts) through
+    the host's circuit breaker and concurrency limit, and returns the fully
+    read Response. Raises CircuitOpenError without connecting while the
+    host's circuit is open, so a degraded EHR costs no connection timeouts.
+    """
+    state = host_state(target)
+    try:
+        state.acquire()
+    except CircuitOpenError:
+        add_metric('circuit_rejections', 1)
+        raise
+
+    ok = False
+    throttled = False
+    start = time.monotonic()
+    latency_ms = None
+    conn = None
+    try:
+        conn = open_connection(target, timeout=OUTBOUND_TIMEOUT_SECONDS)
+        with span('http_request'):
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            # Measured to the headers, so a large file is not mistaken for a slow host
+            latency_ms = (time.monotonic() - start) * 1000
+            data = response.read()
+        ok = response.status < 500
+        throttled = response.status in THROTTLE_STATUSES
+        return Response(response.status, response.msg, data)
+    finally:
+        if conn is not None:
+            conn.close()
+        if latency_ms is None:
+            latency_ms = (time.monotonic() - start) * 1000
+        state.release(ok, latency_ms, throttled)
@@ -0,0 +1,117 @@
+import os
+import io
+import time
+import functools
+import bootstrap
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Profile every invocation of this function
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', 'false').lower() == 'true'
+# Also honour a per-request "profile": true flag in the event or an X-Profile header.
+# Off by default so API callers cannot trigger profiling in production.
+PROFILE_ALLOW_EVENT_FLAG = os.environ.get('PROFILE_ALLOW_EVENT_FLAG', 'false').lower() == 'true'
+# Local directory or s3://bucket/prefix where profiles are written
+PROFILE_OUTPUT = os.environ.get('PROFILE_OUTPUT', '/tmp/profiles')
+PROFILE_TOP_N = int(os.environ.get('PROFILE_TOP_N', 25))
+
+
+def _event_requests_profile(event):
+    if not isinstance(event, dict):
+        return False
+    if str(event.get('profile', '')).lower() == 'true':
+        return True
+    headers = event.get('headers') or {}
+    return any(key.lower() == 'x-profile' and str(value).lower() == 'true'
+               for key, value in headers.items())
+
+
+def _write_output(name, data):
+    """Writes one profile artifact to the local directory or S3 prefix in PROFILE_OUTPUT."""
+    if PROFILE_OUTPUT.startswith('s3://'):
+        bucket, _, prefix = PROFILE_OUTPUT[len('s3://'):].partition('/')
+        key = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        bootstrap.get_client('s3').put_object(Bucket=bucket, Key=key, Body=data)
+        return f's3://{bucket}/{key}'
+
+    os.makedirs(PROFILE_OUTPUT, exist_ok=True)
+    path = os.path.join(PROFILE_OUTPUT, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _dump_stats(profiler):
+    """Serializes profiler stats in the format read by pstats.Stats / snakeviz."""
+    import marshal
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+def _build_report(profiler, snapshot, peak_bytes, elapsed_ms):
+    """Renders the top functions by cumulative time and the top allocation sites as text."""
+    import pstats
+    report = io.StringIO()
+    report.write(f"Wall time: {elapsed_ms:.1f} ms\n")
+    report.write(f"Peak traced memory: {peak_bytes / 1024:.1f} KiB\n\n")
+
+    report.write(f"Top {PROFILE_TOP_N} functions by cumulative time\n")
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+
+    report.write(f"\nTop {PROFILE_TOP_N} allocation sites\n")
+    for stat in snapshot.statistics('lineno')[:PROFILE_TOP_N]:
+        report.write(f"{stat}\n")
+    return report.getvalue()
+
+
+def profiled(handler):
+    """
+    Decorator for lambda_handler that captures a cProfile CPU profile and
+    tracemalloc allocation peaks when profiling is switched on, and writes
+    <request_id>.pstats plus a <request_id>.txt summary to PROFILE_OUTPUT.
+    When profiling is off the only cost is a flag check per invocation, and
+    cProfile / tracemalloc / pstats are not even imported.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if not PROFILE_ENABLED and not (PROFILE_ALLOW_EVENT_FLAG and _event_requests_profile(event)):
+            return handler(event, context)
+
+        import cProfile
+        import tracemalloc
+
+        request_id = getattr(context, 'aws_request_id', None) or f'local-{int(time.time() * 1000)}'
+        profiler = cProfile.Profile()
+        tracing_already = tracemalloc.is_tracing()
+        if not tracing_already:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            return handler(event, context)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing_already:
+                tracemalloc.stop()
+
+            try:
+                pstats_location = _write_output(f'{request_id}.pstats', _dump_stats(profiler))
+                report_location = _write_output(
+                    f'{request_id}.txt',
+                    _build_report(profiler, snapshot, peak_bytes, elapsed_ms).encode('utf-8')
+                )
+                logger.info("Profile written", pstats=pstats_location, report=report_location,
+                            peak_memory_bytes=peak_bytes, elapsed_ms=round(elapsed_ms, 1))
+            except Exception:
+                # Profiling must never change the outcome of the invocation
+                logger.exception("Failed to write profile")
+
+    return wrapper
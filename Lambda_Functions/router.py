@@ -0,0 +1,171 @@
+import json
+import base64
+import inspect
+import importlib
+import bootstrap
+from http_utils import get_header
+from log_utils import get_logger
+from metrics import instrument, set_property
+from profiling import profiled
+
+logger = get_logger(__name__)
+
+# (method, resource) -> module whose lambda_handler serves the route.
+# Resources use API Gateway's {param} syntax; path parameters are passed to
+# the handler both as query string parameters and as body fields.
+ROUTES = {
+    ('GET', '/providers'): 'get_healthcare_providers',
+    ('POST', '/providers'): 'insert_healthcare_provider',
+    ('POST', '/providers/batch'): 'batch_insert_healthcare_providers',
+    ('GET', '/providers/search'): 'search_healthcare_providers',
+    ('GET', '/providers/{provider_id}'): 'get_healthcare_provider',
+    ('PUT', '/providers/{provider_id}'): 'update_healthcare_provider',
+    ('GET', '/ehr-systems'): 'get_ehr_systems',
+    ('POST', '/ehr-systems'): 'insert_ehr_system',
+    ('GET', '/ehr-systems/{ehr_id}'): 'get_ehr_systems',
+    ('PUT', '/ehr-systems/{ehr_id}'): 'update_ehr_system',
+    ('GET', '/data-fetch-history'): 'get_data_fetch_history',
+    ('POST', '/data-fetch-history'): 'insert_data_fetch_history',
+    ('POST', '/data-fetch-history/complete'): 'complete_data_fetch',
+    ('GET', '/data-fetch-history/stats'): 'get_data_fetch_stats',
+    ('GET', '/data-fetch-history/{fetch_id}'): 'get_data_fetch_history',
+}
+
+# Every request served by this container shares one database connection
+bootstrap.enable_connection_reuse()
+
+# Undecorated handler functions, imported on the first request for their route
+_handlers = {}
+
+
+def _get_handler(module_name):
+    handler = _handlers.get(module_name)
+    if handler is None:
+        module = importlib.import_module(module_name)
+        # The router records metrics and profiles for the whole request, so call
+        # the handler logic underneath its own @instrument / @profiled wrappers
+        handler = inspect.unwrap(module.lambda_handler)
+        _handlers[module_name] = handler
+    return handler
+
+
+def _split(path):
+    return [segment for segment in path.strip('/').split('/') if segment]
+
+
+def match_route(method, path):
+    """
+    Finds the route for a request path such as /providers/123. Returns
+    ((module_name, resource, path_params) or None, path_exists), where
+    path_exists tells a 405 (path served for other methods) from a 404.
+    """
+    segments = _split(path)
+    path_exists = False
+    for (route_method, resource), module_name in ROUTES.items():
+        template = _split(resource)
+        if len(template) != len(segments):
+            continue
+        params = {}
+        for expected, actual in zip(template, segments):
+            if expected.startswith('{') and expected.endswith('}'):
+                params[expected[1:-1]] = actual
+            elif expected != actual:
+                break
+        else:
+            if route_method == method:
+                return (module_name, resource, params), path_exists
+            path_exists = True
+    return None, path_exists
+
+
+def _request_line(event):
+    """Reads method and path from REST API (v1) or HTTP API (v2) proxy events."""
+    http = (event.get('requestContext') or {}).get('http') or {}
+    method = (event.get('httpMethod') or http.get('method') or '').upper()
+    path = event.get('path') or event.get('rawPath') or http.get('path') or ''
+
+    # Drop a stage prefix such as /prod when the API is called on its default URL
+    stage = (event.get('requestContext') or {}).get('stage')
+    if stage and stage != '$default' and path.startswith(f'/{stage}/'):
+        path = path[len(stage) + 1:]
+    return method, path
+
+
+def _handler_event(event, resource, path_params):
+    """
+    Builds the event passed on to the handler. Path parameters are merged into
+    the query string parameters (read by the list handlers) and into the body
+    (read by the single-item and write handlers), so every existing handler
+    finds its id where it already looks.
+
+    Any other body (a JSON list, or CSV or NDJSON text, which is never parsed
+    as JSON even when it looks like an object) is passed on unchanged,
+    base64-decoded if API Gateway encoded it, for the handler to parse.
+    """
+    query_params = dict(event.get('queryStringParameters') or {})
+    query_params.update(path_params)
+
+    routed = dict(event)
+    body = event.get('body')
+    if isinstance(body, str) and event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+        routed['isBase64Encoded'] = False
+
+    content_type = (get_header(event, 'Content-Type') or '').lower()
+    if isinstance(body, str) and body and not any(kind in content_type for kind in ('csv', 'ndjson', 'jsonl')):
+        try:
+            parsed = json.loads(body)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, dict):
+            body = parsed
+    if not body:
+        body = dict(query_params)
+    if isinstance(body, dict):
+        body = dict(body)
+        body.update(path_params)
+
+    routed['resource'] = resource
+    routed['pathParameters'] = path_params or None
+    routed['queryStringParameters'] = query_params or None
+    routed['body'] = body
+    return routed
+
+
+def _error_response(status_code, message):
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps({'error': message})
+    }
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that serves every provider, EHR system and data fetch
+    history endpoint from one function, dispatching API Gateway proxy events
+    by method and path to the existing handler logic. One warm container then
+    shares a single database connection and the provider cache across all of
+    these endpoints instead of each function paying its own cold start.
+    """
+    method, path = _request_line(event)
+    if event.get('resource') and (method, event['resource']) in ROUTES:
+        # API Gateway already matched the route, reuse its parameters
+        resource = event['resource']
+        route = (ROUTES[(method, resource)], resource, event.get('pathParameters') or {})
+    else:
+        route, path_exists = match_route(method, path)
+
+    if route is None:
+        if path_exists:
+            return _error_response(405, f'Method {method} not allowed for {path}')
+        return _error_response(404, f'No route for {method} {path}')
+
+    module_name, resource, path_params = route
+    set_property('route', f'{method} {resource}')
+    logger.debug("Dispatching request", route=f'{method} {resource}', handler=module_name)
+
+    routed_event = _handler_event(event, resource, path_params)
+    return _get_handler(module_name)(routed_event, context)
@@ -1,10 +1,15 @@
-import boto3
 import json
 import uuid
 from datetime import datetime
-from botocore.config import Config
-from botocore.exceptions import ClientError
+import bootstrap
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event,context):
     """
     Stores provider credentials in AWS Secrets Manager.
@@ -29,7 +34,7 @@ def lambda_handler(event,context):
             # Direct Lambda invocation pattern
             body = event
         
-        print("Event payload parsed, processing credentials...")
+        logger.debug("Event payload parsed, processing credentials")
 
         # Extract sensitive credentials that should go to Secrets Manager
         client_id = body.get('client_id')
@@ -50,42 +55,40 @@ def lambda_handler(event,context):
                     'client_secret': client_secret
                 })
                 
-                print("Attempting to store credentials in Secrets Manager...")
+                logger.info("Storing credentials in Secrets Manager", secret_name=secret_name)
                 # Store in Secrets Manager
-                session = boto3.session.Session()
-                secrets_client = session.client(service_name='secretsmanager',region_name='us-west-1')
-                print("cli initiated")
-                response = secrets_client.create_secret(
-                    Name=secret_name,
-                    Description=f"API credentials for healthcare provider: {provider_name}",
-                    SecretString=secret_value,
-                )
+                secrets_client = bootstrap.get_client('secretsmanager', region_name='us-west-1')
+                with span('secrets_put'):
+                    response = secrets_client.create_secret(
+                        Name=secret_name,
+                        Description=f"API credentials for healthcare provider: {provider_name}",
+                        SecretString=secret_value,
+                    )
                 secrets_manager_arn = response['ARN']
                 return {
                     'status': 'success',
                     'arn': secrets_manager_arn,
                     'secret_name': secret_name
                 }
-                print(f"Credentials stored in Secrets Manager with ARN: {secrets_manager_arn}")
             except Exception as e:
-                print(f"Error storing credentials in Secrets Manager: {str(e)}")
+                logger.exception("Error storing credentials in Secrets Manager")
                 # Continue without storing credentials - just log the error
                 # We don't want to block provider creation if Secrets Manager fails
-                print("Proceeding without storing credentials.")
+                logger.warning("Proceeding without storing credentials")
                 pass
-    except ClientError as e:
+    except bootstrap.ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
-        print(f"AWS Error: {error_code} - {error_message}")
+        logger.error("AWS error", error_code=error_code, error_message=error_message)
         
         if error_code == 'AccessDeniedException':
-            print("Lambda lacks permissions to access Secrets Manager")
+            logger.error("Lambda lacks permissions to access Secrets Manager")
         elif error_code == 'ResourceNotFoundException':
-            print("The requested secret or resource was not found")
+            logger.error("The requested secret or resource was not found")
         elif error_code == 'InvalidRequestException':
-            print("The request was invalid due to: " + error_message)
+            logger.error("The request was invalid", error_message=error_message)
         elif error_code == 'LimitExceededException':
-            print("Service limit exceeded")
+            logger.error("Service limit exceeded")
         
         return {
             'status': 'error',
@@ -94,7 +97,7 @@ def lambda_handler(event,context):
         }
         
     except Exception as e:
-        print(f"Unexpected error storing credentials: {str(e)}")
+        logger.exception("Unexpected error storing credentials")
         return {
             'status': 'error',
             'error': 'UnexpectedException',
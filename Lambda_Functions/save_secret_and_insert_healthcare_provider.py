@@ -1,6 +1,13 @@
 import json
-import boto3
+import bootstrap
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     try:
         # Parse the incoming JSON payload, handling different event structures
@@ -14,7 +21,7 @@ def lambda_handler(event, context):
             # Direct Lambda invocation pattern
             body = event
         data = body
-        print("Event payload parsed, processing credentials...")
+        logger.debug("Event payload parsed, processing credentials")
 
         # Extract sensitive credentials that should go to Secrets Manager
         client_id = body.get('client_id')
@@ -22,7 +29,7 @@ def lambda_handler(event, context):
         
         # Store credentials in Secrets Manager if provided
         secret_name = None
-        client = boto3.client('lambda')
+        client = bootstrap.get_client('lambda')
         if client_id and client_secret:
             try:
                 # Generate a safe name for the secret based on provider name
@@ -35,24 +42,24 @@ def lambda_handler(event, context):
                     'client_secret': client_secret
                 })
                 
-                print("Attempting to store credentials in Secrets Manager...")
+                logger.info("Storing credentials in Secrets Manager", provider_name=provider_name)
                 # Store in Secrets Manager
                 
-                response = client.invoke(
-                    FunctionName = 'store_ehr_client_id_and_secret',
-                    InvocationType = 'RequestResponse',
-                    Payload = secret_value
-                )
-                print("Response from Lambda function:", response)
+                with span('lambda_invoke'):
+                    response = client.invoke(
+                        FunctionName = 'store_ehr_client_id_and_secret',
+                        InvocationType = 'RequestResponse',
+                        Payload = secret_value
+                    )
+                logger.debug("Secret store function responded", status_code=response.get('StatusCode'))
                 response_payload = json.loads(response['Payload'].read())
-                print("Response payload:", response_payload)
                 secret_name =response_payload.get('secret_name')
-                print(f"Credentials stored in Secrets Manager with secret_name: {secret_name}")
+                logger.info("Credentials stored in Secrets Manager", secret_name=secret_name)
             except Exception as e:
-                print(f"Error storing credentials in Secrets Manager: {str(e)}")
+                logger.exception("Error storing credentials in Secrets Manager")
                 # Continue without storing credentials - just log the error
                 # We don't want to block provider creation if Secrets Manager fails
-                print("Proceeding without storing credentials.")
+                logger.warning("Proceeding without storing credentials")
                 pass
         
         try:
@@ -69,17 +76,18 @@ def lambda_handler(event, context):
                 'note':body.get('note'),
                 'secret_name': secret_name
             })
-            response_healthcare_provider = client.invoke(
-                    FunctionName = 'insert_healthcare_provider',
-                    InvocationType = 'RequestResponse',
-                    Payload = healthcare_provider
-                )
-            print("Response from insert Lambda function:", response_healthcare_provider)
+            with span('lambda_invoke'):
+                response_healthcare_provider = client.invoke(
+                        FunctionName = 'insert_healthcare_provider',
+                        InvocationType = 'RequestResponse',
+                        Payload = healthcare_provider
+                    )
+            logger.debug("Insert function responded", status_code=response_healthcare_provider.get('StatusCode'))
         except Exception as e:
-                print(f"Error inserting: {str(e)}")
+                logger.exception("Error inserting healthcare provider")
                 # Continue without storing credentials - just log the error
                 # We don't want to block provider creation if Secrets Manager fails
-                print("Proceeding without storing credentials.")
+                logger.warning("Proceeding without storing credentials")
                 pass
         return {
             'statusCode': 201,
@@ -117,7 +125,7 @@ def lambda_handler(event, context):
                 })
             }
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to add healthcare provider")
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -0,0 +1,239 @@
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Table definitions for the onboarding database, shared by create_table_lambda
+# and the offline benchmarks so both always build the same schema.
+#
+# Ids are UUIDs stored as BINARY(16) (see ids.to_bin / ids.from_bin); the
+# application generates time-ordered ones so inserts append to the clustered index.
+# The version columns are bumped by every update and checked by conditional
+# updates (optimistic concurrency).
+#
+# search_healthcare_providers uses the FULLTEXT index for word and prefix
+# matches and idx_healthcare_providers_name for queries too short for it.
+
+CREATE_HEALTHCARE_PROVIDERS_TABLE = """
+    CREATE TABLE healthcare_providers (
+      provider_id BINARY(16) NOT NULL DEFAULT (UUID_TO_BIN(UUID())),
+      provider_name VARCHAR(255) NOT NULL,
+      provider_type ENUM('Hospital', 'Clinic', 'Private Practice', 'Specialist Center', 'Other') NOT NULL,
+      contact_email VARCHAR(255) NOT NULL,
+      contact_phone VARCHAR(20) NOT NULL,
+      address TEXT,
+      ehr_id BINARY(16),
+      tenant_id VARCHAR(255),
+      bulk_fhir_url VARCHAR(255),
+      secret_name VARCHAR(255),
+      onboarded_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      last_data_fetch TIMESTAMP DEFAULT NULL,
+      status ENUM('Active', 'Inactive', 'Pending', 'Error') NOT NULL DEFAULT 'Pending',
+      notes TEXT,
+      version INT UNSIGNED NOT NULL DEFAULT 1,
+      PRIMARY KEY (provider_id),
+      KEY idx_healthcare_providers_name (provider_name),
+      FULLTEXT KEY ft_healthcare_providers_search (provider_name, address, contact_email)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+CREATE_EHR_SYSTEMS_TABLE = """
+    CREATE TABLE ehr_systems (
+      ehr_id BINARY(16) NOT NULL DEFAULT (UUID_TO_BIN(UUID())),
+      ehr_name VARCHAR(255) NOT NULL,
+      documentation_link VARCHAR(255),
+      authorization_url VARCHAR(255),
+      connection_url VARCHAR(255),
+      description TEXT,
+      is_supported BOOLEAN,
+      is_tenant_id_required BOOLEAN DEFAULT FALSE,
+      added_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      version INT UNSIGNED NOT NULL DEFAULT 1,
+      PRIMARY KEY (ehr_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+CREATE_DATA_FETCH_HISTORY_TABLE = """
+    CREATE TABLE data_fetch_history (
+      fetch_id BINARY(16) NOT NULL DEFAULT (UUID_TO_BIN(UUID())),
+      provider_id BINARY(16) NOT NULL,
+      group_id VARCHAR(255),
+      fetch_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      status ENUM('Success', 'Partial', 'Failed') NOT NULL DEFAULT 'Success',
+      s3_location VARCHAR(255),
+      error_details TEXT,
+      PRIMARY KEY (fetch_id),
+      KEY idx_data_fetch_history_time (fetch_time),
+      FOREIGN KEY (provider_id) REFERENCES healthcare_providers(provider_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Where data_fetch_history rows older than the retention window went: one row
+# per gzipped NDJSON object written by archive_data_fetch_history
+CREATE_DATA_FETCH_HISTORY_ARCHIVES_TABLE = """
+    CREATE TABLE data_fetch_history_archives (
+      first_fetch_id BINARY(16) NOT NULL,
+      period_start DATE NOT NULL,
+      location VARCHAR(1024) NOT NULL,
+      row_count INT UNSIGNED NOT NULL,
+      bytes BIGINT UNSIGNED NOT NULL,
+      first_fetch_time TIMESTAMP NOT NULL,
+      last_fetch_time TIMESTAMP NOT NULL,
+      archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (first_fetch_id),
+      KEY idx_data_fetch_history_archives_time (first_fetch_time, last_fetch_time)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Fetch statistics per provider, kept up to date by every data_fetch_history
+# insert (see fetch_summary) so dashboards never aggregate the raw history
+CREATE_PROVIDER_FETCH_SUMMARY_TABLE = """
+    CREATE TABLE provider_fetch_summary (
+      provider_id BINARY(16) NOT NULL,
+      fetch_count INT UNSIGNED NOT NULL DEFAULT 0,
+      success_count INT UNSIGNED NOT NULL DEFAULT 0,
+      partial_count INT UNSIGNED NOT NULL DEFAULT 0,
+      failed_count INT UNSIGNED NOT NULL DEFAULT 0,
+      last_fetch_time TIMESTAMP NULL DEFAULT NULL,
+      last_status ENUM('Success', 'Partial', 'Failed'),
+      last_success_time TIMESTAMP NULL DEFAULT NULL,
+      last_failure_time TIMESTAMP NULL DEFAULT NULL,
+      PRIMARY KEY (provider_id),
+      FOREIGN KEY (provider_id) REFERENCES healthcare_providers(provider_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Fetch counts per provider and day, for the 7 and 30 day statistics
+CREATE_PROVIDER_FETCH_DAILY_TABLE = """
+    CREATE TABLE provider_fetch_daily (
+      provider_id BINARY(16) NOT NULL,
+      fetch_date DATE NOT NULL,
+      success_count INT UNSIGNED NOT NULL DEFAULT 0,
+      partial_count INT UNSIGNED NOT NULL DEFAULT 0,
+      failed_count INT UNSIGNED NOT NULL DEFAULT 0,
+      PRIMARY KEY (provider_id, fetch_date),
+      KEY idx_provider_fetch_daily_date (fetch_date),
+      FOREIGN KEY (provider_id) REFERENCES healthcare_providers(provider_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# One row per Bulk FHIR export, so an interrupted export resumes where it
+# stopped instead of being kicked off again (see export_orchestrator)
+CREATE_EXPORT_JOBS_TABLE = """
+    CREATE TABLE export_jobs (
+      job_id BINARY(16) NOT NULL,
+      provider_id BINARY(16) NOT NULL,
+      resource_types VARCHAR(255) NOT NULL,
+      state ENUM('kickoff', 'polling', 'downloading', 'completing', 'complete', 'failed') NOT NULL DEFAULT 'kickoff',
+      export_url VARCHAR(1024),
+      s3_prefix VARCHAR(512),
+      files_total INT UNSIGNED,
+      files_done INT UNSIGNED NOT NULL DEFAULT 0,
+      bytes_downloaded BIGINT UNSIGNED NOT NULL DEFAULT 0,
+      attempts INT UNSIGNED NOT NULL DEFAULT 0,
+      last_error TEXT,
+      fetch_id BINARY(16),
+      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      PRIMARY KEY (job_id),
+      KEY idx_export_jobs_provider_state (provider_id, state),
+      FOREIGN KEY (provider_id) REFERENCES healthcare_providers(provider_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Output files of an export job and whether each one is already in S3
+CREATE_EXPORT_JOB_FILES_TABLE = """
+    CREATE TABLE export_job_files (
+      job_id BINARY(16) NOT NULL,
+      file_index INT UNSIGNED NOT NULL,
+      resource_type VARCHAR(64),
+      url VARCHAR(2048) NOT NULL,
+      state ENUM('pending', 'done') NOT NULL DEFAULT 'pending',
+      s3_key VARCHAR(512),
+      bytes BIGINT UNSIGNED,
+      completed_at TIMESTAMP NULL DEFAULT NULL,
+      PRIMARY KEY (job_id, file_index),
+      FOREIGN KEY (job_id) REFERENCES export_jobs(job_id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# At most one running export per provider and set of resource types. A
+# request for an export that is already running joins that job instead of
+# starting another; the lease expires if the job stops making progress.
+CREATE_EXPORT_LEASES_TABLE = """
+    CREATE TABLE export_leases (
+      provider_id BINARY(16) NOT NULL,
+      resource_types VARCHAR(255) NOT NULL,
+      job_id BINARY(16) NOT NULL,
+      expires_at TIMESTAMP NOT NULL,
+      PRIMARY KEY (provider_id, resource_types),
+      KEY idx_export_leases_job (job_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Per-table change counters used to invalidate container caches after writes
+CREATE_TABLE_VERSIONS_TABLE = """
+    CREATE TABLE table_versions (
+      table_name VARCHAR(64) NOT NULL,
+      version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+      last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      PRIMARY KEY (table_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+# Tables in creation order - tables referenced by foreign keys come first
+TABLES = [
+    ('healthcare_providers', CREATE_HEALTHCARE_PROVIDERS_TABLE),
+    ('ehr_systems', CREATE_EHR_SYSTEMS_TABLE),
+    ('data_fetch_history', CREATE_DATA_FETCH_HISTORY_TABLE),
+    ('data_fetch_history_archives', CREATE_DATA_FETCH_HISTORY_ARCHIVES_TABLE),
+    ('provider_fetch_summary', CREATE_PROVIDER_FETCH_SUMMARY_TABLE),
+    ('provider_fetch_daily', CREATE_PROVIDER_FETCH_DAILY_TABLE),
+    ('export_jobs', CREATE_EXPORT_JOBS_TABLE),
+    ('export_job_files', CREATE_EXPORT_JOB_FILES_TABLE),
+    ('export_leases', CREATE_EXPORT_LEASES_TABLE),
+    ('table_versions', CREATE_TABLE_VERSIONS_TABLE)
+]
+
+# Rows every fresh database starts with
+SEED_STATEMENTS = [
+    """
+    INSERT INTO table_versions (table_name) VALUES
+        ('healthcare_providers'), ('ehr_systems'), ('data_fetch_history');
+    """,
+    # Athena Health EHR system
+    """
+    INSERT INTO ehr_systems (
+        ehr_name, documentation_link, authorization_url, connection_url, 
+        description, is_supported, is_tenant_id_required
+    ) VALUES (
+        'Athena Health',
+        'https://docs.athenahealth.com/api/guides/overview',
+        'https://api.preview.platform.athenahealth.com/oauth2/v1/token',
+        'api.preview.platform.athenahealth.com',
+        'Athena health EHR system',
+        true,
+        false
+    );
+    """
+]
+
+
+def create_schema(cursor):
+    """
+    Drops all tables (dependent tables first) and recreates them with their
+    seed rows. The caller is responsible for committing.
+    """
+    logger.info("Dropping existing tables if they exist")
+    for table_name, _ in reversed(TABLES):
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`;")
+        logger.info("Table dropped if it existed", table=table_name)
+
+    logger.info("Creating fresh tables")
+    for table_name, definition in TABLES:
+        cursor.execute(definition)
+        logger.info("Table created", table=table_name)
+
+    for statement in SEED_STATEMENTS:
+        cursor.execute(statement)
+    logger.info("Seed rows inserted")
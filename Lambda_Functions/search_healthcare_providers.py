@@ -0,0 +1,156 @@
+import re
+import json
+import bootstrap
+from http_utils import wants_consistent_read
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span, add_metric
+from profiling import profiled
+
+logger = get_logger(__name__)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Words shorter than innodb_ft_min_token_size are not in the FULLTEXT index
+FULLTEXT_MIN_TOKEN = 3
+# InnoDB's default stopwords are not indexed either, so they cannot be required
+FULLTEXT_STOPWORDS = frozenset((
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i', 'in',
+    'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www'
+))
+
+# Columns returned for each match, enough to fill a typeahead list
+RESULT_COLUMNS = "provider_id, provider_name, provider_type, contact_email, address, status"
+
+
+def search_terms(query):
+    """
+    Splits a search string into the words the FULLTEXT index can match,
+    dropping boolean-mode operators, short words and stopwords.
+    """
+    return [word for word in re.findall(r'\w+', query.lower())
+            if len(word) >= FULLTEXT_MIN_TOKEN and word not in FULLTEXT_STOPWORDS]
+
+
+def like_prefix(query):
+    """A LIKE pattern matching values that start with query, wildcards escaped."""
+    return re.sub(r'([\\%_])', r'\\\1', query) + '%'
+
+
+def build_search(query, limit):
+    """
+    Returns the SQL and parameters for a search. Every word must match the
+    start of a word in provider_name, address or contact_email, so "st
+    mary bos" finds "St. Mary's Hospital, Boston". Providers whose name
+    starts with the query rank first, then by FULLTEXT relevance. Queries
+    without a word the index can match search name prefixes instead.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return f"""
+            SELECT {RESULT_COLUMNS}, 0 AS score
+            FROM healthcare_providers
+            WHERE provider_name LIKE %s
+            ORDER BY provider_name
+            LIMIT %s
+        """, (like_prefix(query), limit)
+
+    # Every term is required and matches as a prefix ("mar*" finds "Mary")
+    against = ' '.join(f'+{term}*' for term in terms)
+    return f"""
+        SELECT {RESULT_COLUMNS},
+               MATCH (provider_name, address, contact_email) AGAINST (%s IN BOOLEAN MODE) AS score
+        FROM healthcare_providers
+        WHERE MATCH (provider_name, address, contact_email) AGAINST (%s IN BOOLEAN MODE)
+        ORDER BY provider_name LIKE %s DESC, score DESC, provider_name
+        LIMIT %s
+    """, (against, against, like_prefix(query), limit)
+
+
+@instrument
+@profiled
+def lambda_handler(event, context):
+    """
+    Lambda function that searches healthcare providers by name, address
+    (e.g. city) or contact email for typeahead fields, returning the best
+    matches first instead of the whole provider list.
+
+    Input (query string parameters):
+        q: the search text
+        limit (optional): most matches returned (default 20, at most 100)
+    """
+    try:
+        query_params = (event.get('queryStringParameters') if isinstance(event, dict) else None) or {}
+        query = (query_params.get('q') or '').strip()
+        if not query:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Missing required parameter: q'})
+            }
+        try:
+            limit = int(query_params.get('limit') or DEFAULT_LIMIT)
+            if not 1 <= limit <= MAX_LIMIT:
+                raise ValueError
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'error': f'limit must be a number from 1 to {MAX_LIMIT}'})
+            }
+
+        # Served by the read replica unless the caller needs its own writes
+        with span('db_connect'):
+            conn = bootstrap.connect_db(read_only=not wants_consistent_read(event))
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        sql, params = build_search(query, limit)
+        with span('db_query'):
+            cursor.execute(sql, params)
+            providers = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        add_metric('rows', len(providers))
+        logger.info("Providers searched", count=len(providers))
+
+        with span('serialize'):
+            response_body = to_json({
+                'query': query,
+                'count': len(providers),
+                'providers': providers
+            })
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'body': response_body
+        }
+
+    except bootstrap.MySQLError as e:
+        error_code = e.args[0]
+        error_message = e.args[1]
+
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'error': 'Database error occurred',
+                'details': error_message
+            })
+        }
+    except Exception as e:
+        logger.exception("Failed to search providers")
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'error': 'Failed to search providers',
+                'details': str(e)
+            })
+        }
@@ -0,0 +1,208 @@
+import io
+import os
+import csv
+import bootstrap
+from ids import new_id
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import span, add_metric
+
+logger = get_logger(__name__)
+
+# s3://bucket/prefix where exports are written. There is no default: a file
+# in the function's /tmp could never be downloaded by the caller
+EXPORT_OUTPUT = os.environ.get('EXPORT_OUTPUT', '')
+# Lets tests and local runs export to a local directory instead
+EXPORT_ALLOW_LOCAL = os.environ.get('EXPORT_ALLOW_LOCAL', 'false').lower() == 'true'
+# Lifetime of the pre-signed download URL returned for S3 exports
+EXPORT_URL_SECONDS = int(os.environ.get('EXPORT_URL_SECONDS', 3600))
+
+# Supported formats and their content types
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+# Rows read from the server per round trip
+EXPORT_FETCH_ROWS = 1000
+# Multipart upload part size; S3 requires at least 5 MiB for all but the last part
+EXPORT_PART_BYTES = 8 * 1024 * 1024
+# Seconds the server waits on a slow reader before dropping an unbuffered query
+EXPORT_NET_WRITE_TIMEOUT = 600
+
+
+def get_export_format(event):
+    """Returns the ?export= (or "export" in a direct invocation) value, or None."""
+    if not isinstance(event, dict):
+        return None
+    params = event.get('queryStringParameters') or {}
+    return params.get('export') or event.get('export')
+
+
+def export_output_error():
+    """Returns why EXPORT_OUTPUT cannot hold exports, or None when it can."""
+    if not EXPORT_OUTPUT:
+        return 'EXPORT_OUTPUT is not set'
+    if not EXPORT_OUTPUT.startswith('s3://') and not EXPORT_ALLOW_LOCAL:
+        return f'EXPORT_OUTPUT must be an s3:// location, not {EXPORT_OUTPUT}'
+    return None
+
+
+class _FileSink:
+    def __init__(self, directory, name):
+        self.location = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        self._file = open(self.location, 'wb')
+
+    def write(self, data):
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.location)
+
+
+class _S3Sink:
+    """Multipart upload that holds at most one part in memory."""
+
+    def __init__(self, bucket, key, content_type):
+        self.bucket = bucket
+        self.key = key
+        self.location = f's3://{bucket}/{key}'
+        self._s3 = bootstrap.get_client('s3')
+        self._upload_id = self._s3.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+        self._parts = []
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= EXPORT_PART_BYTES:
+            self._upload_part()
+
+    def _upload_part(self):
+        part_number = len(self._parts) + 1
+        with span('s3_put'):
+            response = self._s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                            PartNumber=part_number, Body=bytes(self._buffer))
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self._buffer.clear()
+
+    def close(self):
+        # The last part may be smaller than 5 MiB, or empty for an empty export
+        if self._buffer or not self._parts:
+            self._upload_part()
+        with span('s3_put'):
+            self._s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                               MultipartUpload={'Parts': self._parts})
+
+    def abort(self):
+        self._s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def presigned_url(self):
+        return self._s3.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': self.key},
+                                               ExpiresIn=EXPORT_URL_SECONDS)
+
+
+def _open_sink(name, export_format):
+    error = export_output_error()
+    if error:
+        raise RuntimeError(error)
+    if EXPORT_OUTPUT.startswith('s3://'):
+        bucket, _, prefix = EXPORT_OUTPUT[len('s3://'):].partition('/')
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        return _S3Sink(bucket, f'{prefix}{name}', EXPORT_FORMATS[export_format])
+    return _FileSink(EXPORT_OUTPUT, name)
+
+
+def _write_rows(conn, query, params, export_format, sink):
+    """Streams the rows of query into sink and returns (rows, bytes) written."""
+    from pymysql.cursors import SSDictCursor
+
+    rows = 0
+    size = 0
+    cursor = conn.cursor(SSDictCursor)
+    try:
+        with span('db_query'):
+            cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+
+        text = io.StringIO()
+        writer = csv.writer(text)
+        if export_format == 'csv':
+            writer.writerow(columns)
+
+        while True:
+            with span('db_query'):
+                batch = cursor.fetchmany(EXPORT_FETCH_ROWS)
+            if not batch:
+                break
+            with span('serialize'):
+                if export_format == 'csv':
+                    writer.writerows([row[column] for column in columns] for row in batch)
+                else:
+                    for row in batch:
+                        text.write(to_json(row))
+                        text.write('\n')
+                data = text.getvalue().encode('utf-8')
+                text.seek(0)
+                text.truncate()
+            sink.write(data)
+            rows += len(batch)
+            size += len(data)
+
+        # The CSV header of an empty result is still unwritten
+        remainder = text.getvalue().encode('utf-8')
+        if remainder:
+            sink.write(remainder)
+            size += len(remainder)
+        sink.close()
+    except BaseException:
+        sink.abort()
+        raise
+    finally:
+        # Closing an unbuffered cursor reads and discards any unread rows
+        cursor.close()
+    return rows, size
+
+
+def export_query(conn, query, params, export_format, table_name):
+    """
+    Streams every row of query to EXPORT_OUTPUT as NDJSON or CSV and returns a
+    pointer to the file: its location, format, row count and size, plus a
+    pre-signed download URL for S3 exports.
+
+    Rows are read with an unbuffered SSDictCursor and written out in batches,
+    so memory use does not grow with the table. The connection cannot run
+    other queries until this returns.
+    """
+    # A slow upload must not make the server drop the unbuffered query. The
+    # connection may be reused by later invocations, so the old value is put back
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT @@SESSION.net_write_timeout AS net_write_timeout")
+        previous_timeout = cursor.fetchone()['net_write_timeout']
+        cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT,))
+    try:
+        sink = _open_sink(f'{table_name}/{new_id()}.{export_format}', export_format)
+        rows, size = _write_rows(conn, query, params, export_format, sink)
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("SET SESSION net_write_timeout = %s", (previous_timeout,))
+
+    add_metric('rows', rows)
+    add_metric('bytes_exported', size, 'Bytes')
+    logger.info("Table exported", table=table_name, export_format=export_format, rows=rows, location=sink.location)
+
+    pointer = {
+        'location': sink.location,
+        'format': export_format,
+        'content_type': EXPORT_FORMATS[export_format],
+        'rows': rows,
+        'bytes': size
+    }
+    if isinstance(sink, _S3Sink):
+        pointer['url'] = sink.presigned_url()
+    return pointer
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+import bootstrap
+from log_utils import get_logger
+from metrics import span, add_metric
+
+logger = get_logger(__name__)
+
+# Refresh this long before a token expires (capped at half its lifetime)
+TOKEN_REFRESH_MARGIN_SECONDS = float(os.environ.get('TOKEN_REFRESH_MARGIN_SECONDS', 60))
+# Lifetime assumed when the token endpoint does not send expires_in
+DEFAULT_TOKEN_LIFETIME_SECONDS = float(os.environ.get('DEFAULT_TOKEN_LIFETIME_SECONDS', 300))
+
+
+class TokenProvider:
+    """
+    Thread-safe holder of one EHR access token, shared by every download of
+    an export.
+
+    fetch() returns (access_token, expires_in seconds or None). While a
+    download holds the provider (see hold()), the token is replaced in the
+    background shortly before it expires, so callers of get() normally never
+    wait for the token endpoint. Once nothing holds it, the token is only
+    fetched again when get() finds it expired. A request rejected with 401
+    calls refresh(stale_token) and retries once; when several workers hit the
+    same 401, only the first one fetches a new token.
+    """
+
+    def __init__(self, fetch, refresh_margin=None):
+        self._fetch = fetch
+        self.refresh_margin = TOKEN_REFRESH_MARGIN_SECONDS if refresh_margin is None else refresh_margin
+        self._lock = threading.Lock()
+        self._token = None
+        self._lifetime = 0
+        self._expires_at = 0
+        self._timer = None
+        self._holders = 0
+
+    @contextmanager
+    def hold(self):
+        """Keeps the token renewed in the background until the block exits."""
+        with self._lock:
+            self._holders += 1
+            if self._holders == 1:
+                self._schedule_locked()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._holders -= 1
+                if not self._holders:
+                    self._cancel_locked()
+
+    def get(self):
+        """Returns a token that has not expired, fetching one first if needed."""
+        with self._lock:
+            if self._token is None or time.monotonic() >= self._expires_at:
+                self._refresh_locked()
+            return self._token
+
+    def refresh(self, stale_token=None):
+        """
+        Replaces the token after the EHR rejected stale_token. Returns the new
+        token, or the current one if another worker already replaced it.
+        """
+        with self._lock:
+            if stale_token is None or self._token == stale_token:
+                self._refresh_locked()
+                add_metric('token_refreshes_on_401', 1)
+            return self._token
+
+    def close(self):
+        """Stops the background refresh."""
+        with self._lock:
+            self._cancel_locked()
+
+    def _refresh_locked(self):
+        self._store_locked(*self._fetch())
+
+    def _store_locked(self, token, expires_in):
+        self._lifetime = float(expires_in or DEFAULT_TOKEN_LIFETIME_SECONDS)
+        self._token = token
+        self._expires_at = time.monotonic() + self._lifetime
+        self._schedule_locked()
+        logger.debug("Access token fetched", expires_in=self._lifetime)
+
+    def _schedule_locked(self):
+        # Renew ahead of expiry; a frozen Lambda container simply runs the
+        # timer late, and get() still checks expiry itself
+        self._cancel_locked()
+        if not self._holders or self._token is None:
+            return
+        renew_at = self._expires_at - min(self.refresh_margin, self._lifetime / 2)
+        self._timer = threading.Timer(max(1.0, renew_at - time.monotonic()), self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_locked(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if not self._holders:
+                return
+            stale_token = self._token
+
+        # Fetched without the lock, so get() keeps returning the still valid
+        # token meanwhile
+        try:
+            token, expires_in = self._fetch()
+        except Exception as e:
+            # The next get() after expiry fetches synchronously instead
+            logger.warning("Background token refresh failed", error=str(e))
+            return
+
+        with self._lock:
+            # Keep a token a 401 refresh installed in the meantime
+            if self._token == stale_token:
+                self._store_locked(token, expires_in)
+        add_metric('token_refreshes', 1)
+
+
+def _invoke(function_name, payload):
+    client = bootstrap.get_client('lambda')
+    with span('lambda_invoke'):
+        response = client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(payload)
+        )
+        return json.loads(response['Payload'].read())
+
+
+def provider_token_fetcher(provider_id):
+    """
+    Returns a fetch function for TokenProvider that requests tokens for a
+    healthcare provider through get_healthcare_provider and
+    get_authorization_token. The provider is only looked up once.
+    """
+    token_request = {}
+
+    def fetch():
+        if not token_request:
+            provider_response = _invoke('get_healthcare_provider', {'provider_id': provider_id})
+            if provider_response.get('statusCode') != 200:
+                raise Exception(f"Provider lookup failed: {provider_response.get('body')}")
+            provider = json.loads(provider_response['body'])['provider']
+            token_request.update({
+                'secret_name': provider.get('secret_name'),
+                'connection_url': provider.get('connection_url'),
+                'authorization_url': provider.get('authorization_url')
+            })
+
+        token_response = _invoke('get_authorization_token', token_request)
+        if token_response.get('statusCode') != 200:
+            raise Exception(f"Authorization failed: {token_response.get('body')}")
+        token_data = json.loads(token_response['body'])
+        return token_data['access_token'], token_data.get('expires_in')
+
+    return fetch
+
+
+# One provider per healthcare provider for this container
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(provider_id):
+    """Returns the container's shared TokenProvider for a healthcare provider."""
+    with _providers_lock:
+        if provider_id not in _providers:
+            _providers[provider_id] = TokenProvider(provider_token_fetcher(provider_id))
+        return _providers[provider_id]
+
+
+def clear_token_providers():
+    """Forgets every cached token, as a new container would."""
+    with _providers_lock:
+        for provider in _providers.values():
+            provider.close()
+        _providers.clear()
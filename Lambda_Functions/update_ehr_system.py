@@ -1,8 +1,18 @@
-import os
 import json
-import pymysql
 from datetime import datetime
+import bootstrap
+from cache_utils import provider_cache, bump_table_version
+from http_utils import get_header, parse_if_match, prefers_minimal, version_etag
+from ids import to_bin
+from json_utils import to_json
+from log_utils import get_logger
+from metrics import instrument, span
+from profiling import profiled
 
+logger = get_logger(__name__)
+
+@instrument
+@profiled
 def lambda_handler(event, context):
     """
     Lambda function that updates an existing EHR system record.
@@ -12,6 +22,11 @@ def lambda_handler(event, context):
         Other fields to update (optional): ehr_name, documentation_link, 
         authorization_url, connection_url, description, is_supported,
         is_tenant_id_required
+        expected_version (optional): version the client last read; the update
+        is refused with 409 if the EHR system has changed since. An If-Match
+        header carrying the EHR system's ETag does the same.
+
+    Send "Prefer: return=minimal" to skip reading the record back.
     """
     try:
         # Parse the incoming JSON payload, handling different event structures
@@ -25,7 +40,7 @@ def lambda_handler(event, context):
             # Direct Lambda invocation pattern
             body = event
         
-        print("Event payload parsed, processing update request...")
+        logger.debug("Event payload parsed, processing update request")
 
         # Extract the ehr_id - required field
         ehr_id = body.get('ehr_id')
@@ -38,36 +53,6 @@ def lambda_handler(event, context):
                 })
             }
         
-        # Connect to the database
-        db_config = {
-            'host': os.environ['HOST'],
-            'user': os.environ['USER_NAME'],
-            'password': os.environ['PASSWORD'],
-            'database': os.environ['DB_NAME'],
-            'port': int(3306),
-            'cursorclass': pymysql.cursors.DictCursor
-        }
-
-        conn = pymysql.connect(**db_config)
-        cursor = conn.cursor()
-        print(f"Database connection established. Updating EHR system: {ehr_id}")
-
-        # First, check if the EHR system exists
-        check_query = "SELECT * FROM ehr_systems WHERE ehr_id = %s"
-        cursor.execute(check_query, (ehr_id,))
-        existing_ehr = cursor.fetchone()
-        
-        if not existing_ehr:
-            cursor.close()
-            conn.close()
-            return {
-                'statusCode': 404,
-                'body': json.dumps({
-                    'error': 'EHR system not found',
-                    'ehr_id': ehr_id
-                })
-            }
-        
         # Fields that can be updated
         updatable_fields = [
             'ehr_name', 'documentation_link', 'authorization_url', 
@@ -93,51 +78,135 @@ def lambda_handler(event, context):
                     'details': 'Request must include at least one updatable field'
                 })
             }
+
+        # Version the client last read, from the body or an If-Match header;
+        # without one the update applies whatever the current version is
+        try:
+            expected_version = body.get('expected_version')
+            if expected_version is None:
+                expected_version = parse_if_match(get_header(event, 'If-Match'))
+            else:
+                expected_version = int(expected_version)
+        except (TypeError, ValueError):
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'error': 'Invalid expected_version',
+                    'details': 'expected_version and If-Match must name an EHR system version'
+                })
+            }
         
-        # Add ehr_id for the WHERE clause
-        update_values.append(ehr_id)
-        
-        # Construct and execute the update query
-        update_query = f"UPDATE ehr_systems SET {', '.join(update_fields)} WHERE ehr_id = %s"
-        
-        print(f"Executing update query: {update_query}")
-        print(f"With values: {update_values}")
+        # Connect to the database
+        with span('db_connect'):
+            conn = bootstrap.connect_db()
+        cursor = conn.cursor()
+        logger.info("Updating EHR system", ehr_id=ehr_id, expected_version=expected_version)
+
+        # One conditional UPDATE: the version bump means every matched row
+        # counts as changed, so no affected rows means missing or stale
+        update_query = f"UPDATE ehr_systems SET {', '.join(update_fields)}, version = version + 1 WHERE ehr_id = %s"
+        update_values.append(to_bin(ehr_id))
+        if expected_version is not None:
+            update_query += " AND version = %s"
+            update_values.append(expected_version)
         
-        cursor.execute(update_query, update_values)
-        conn.commit()
+        logger.debug("Executing update query", query=update_query, values=update_values)
         
-        # Check if any rows were affected
-        rows_affected = cursor.rowcount
-        print(f"Rows affected: {rows_affected}")
+        with span('db_query'):
+            cursor.execute(update_query, update_values)
+            rows_affected = cursor.rowcount
+            if rows_affected:
+                # Invalidate cached provider lookups in every container
+                bump_table_version(cursor, 'ehr_systems')
+            conn.commit()
+
+        if not rows_affected:
+            current_version = None
+            if expected_version is not None:
+                # Only a failed conditional update needs a second look, to
+                # tell a stale version from a missing EHR system
+                with span('db_query'):
+                    cursor.execute("SELECT version FROM ehr_systems WHERE ehr_id = %s", (to_bin(ehr_id),))
+                    row = cursor.fetchone()
+                current_version = row['version'] if row else None
+            cursor.close()
+            conn.close()
+
+            if current_version is None:
+                return {
+                    'statusCode': 404,
+                    'body': json.dumps({
+                        'error': 'EHR system not found',
+                        'ehr_id': ehr_id
+                    })
+                }
+            logger.info("EHR system update conflict", ehr_id=ehr_id,
+                        expected_version=expected_version, current_version=current_version)
+            return {
+                'statusCode': 409,
+                'headers': {'ETag': version_etag(current_version)},
+                'body': json.dumps({
+                    'error': 'EHR system was modified by another request',
+                    'ehr_id': ehr_id,
+                    'expected_version': expected_version,
+                    'current_version': current_version
+                })
+            }
+
+        # Any cached provider may embed this EHR system's fields
+        provider_cache.clear()
+        logger.info("EHR system updated", ehr_id=ehr_id, rows_affected=rows_affected)
+
+        # A minimal response is built from the request alone; the new version
+        # is known whenever the starting version was
+        if prefers_minimal(event):
+            cursor.close()
+            conn.close()
+            response_body = {
+                'message': 'EHR system updated successfully',
+                'ehr_id': ehr_id
+            }
+            headers = {'Preference-Applied': 'return=minimal'}
+            if expected_version is not None:
+                response_body['version'] = expected_version + 1
+                headers['ETag'] = version_etag(expected_version + 1)
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps(response_body)
+            }
         
         # Get the updated record
-        cursor.execute(check_query, (ehr_id,))
-        updated_ehr = cursor.fetchone()
+        with span('db_query'):
+            cursor.execute("SELECT * FROM ehr_systems WHERE ehr_id = %s", (to_bin(ehr_id),))
+            updated_ehr = cursor.fetchone()
 
         # Get count of providers using this EHR system
         count_query = "SELECT COUNT(*) as provider_count FROM healthcare_providers WHERE ehr_id = %s"
-        cursor.execute(count_query, (ehr_id,))
-        count_result = cursor.fetchone()
+        with span('db_query'):
+            cursor.execute(count_query, (to_bin(ehr_id),))
+            count_result = cursor.fetchone()
         provider_count = count_result['provider_count'] if count_result else 0
         
         cursor.close()
         conn.close()
-        print("Database connection closed.")
+        logger.debug("Database connection closed")
 
         return {
             'statusCode': 200,
-            'body': json.dumps({
+            'headers': {'ETag': version_etag(updated_ehr['version'])},
+            'body': to_json({
                 'message': 'EHR system updated successfully',
-                'ehr_system': json.loads(json.dumps(updated_ehr, default=str)),
+                'ehr_system': updated_ehr,
                 'provider_count': provider_count
             })
         }
 
-    except pymysql.MySQLError as e:
+    except bootstrap.MySQLError as e:
         error_code = e.args[0]
         error_message = e.args[1]
         
-        print(f"MySQL Error {error_code}: {error_message}")
+        logger.error("MySQL error", error_code=error_code, error_message=error_message)
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -146,7 +215,7 @@ def lambda_handler(event, context):
             })
         }
     except Exception as e:
-        print(f"Error: {str(e)}")
+        logger.exception("Failed to update EHR system")
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -0,0 +1,330 @@
+"""
+Offline benchmark for the database-backed Lambda handlers.
+
+Seeds a local MySQL 8 / MariaDB server with synthetic ehr_systems,
+healthcare_providers and data_fetch_history rows (using the same schema as
+create_table_lambda), then drives each lambda_handler in-process with
+API Gateway proxy events and reports latency percentiles, SQL statements per
+call and response bytes.
+
+Start a throwaway server first, e.g.
+    docker run --rm -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench mysql:8
+
+Usage:
+    python benchmarks/bench_db_handlers.py --scale 1k
+    python benchmarks/bench_db_handlers.py --scale 100k --iterations 200 --output results.json
+    python benchmarks/bench_db_handlers.py --scale 100k --skip-seed --baseline results.json
+
+The handlers connect on port 3306 and read HOST, USER_NAME, PASSWORD and
+DB_NAME from the environment; the --host/--user/--password/--database options
+set them for the run. With --baseline the run exits non-zero when any
+scenario's p95 regresses by more than --max-regression.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Lambda_Functions')
+sys.path.insert(0, LAMBDA_DIR)
+
+# Row counts per scale; data_fetch_history is the table that grows without bound
+SCALES = {
+    '1k': {'ehr_systems': 5, 'healthcare_providers': 100, 'data_fetch_history': 1_000},
+    '100k': {'ehr_systems': 20, 'healthcare_providers': 10_000, 'data_fetch_history': 100_000},
+    '10m': {'ehr_systems': 50, 'healthcare_providers': 100_000, 'data_fetch_history': 10_000_000},
+}
+
+SEED_BATCH_SIZE = 5_000
+PROVIDER_TYPES = ['Hospital', 'Clinic', 'Private Practice', 'Specialist Center', 'Other']
+PROVIDER_STATUSES = ['Active', 'Inactive', 'Pending', 'Error']
+FETCH_STATUSES = ['Success', 'Success', 'Success', 'Partial', 'Failed']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--user', default=os.environ.get('USER_NAME', 'root'))
+    parser.add_argument('--password', default=os.environ.get('PASSWORD', 'bench'))
+    parser.add_argument('--database', default=os.environ.get('DB_NAME', 'wintergreen_bench'))
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--iterations', type=int, default=100, help='calls per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed calls per scenario')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data already in --database')
+    parser.add_argument('--scenarios', nargs='+', help='only run these scenarios')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed relative p95 increase against --baseline (default 0.25)')
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Points the handlers at the local server. Must run before any handler is imported."""
+    os.environ.update({
+        'HOST': args.host,
+        'USER_NAME': args.user,
+        'PASSWORD': args.password,
+        'DB_NAME': args.database,
+        # Keep handler logging and metrics records out of the benchmark output
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'ERROR'),
+        'METRICS_ENABLED': os.environ.get('METRICS_ENABLED', 'false'),
+    })
+
+
+def connect(args, database=None):
+    import pymysql
+    return pymysql.connect(host=args.host, user=args.user, password=args.password, port=3306,
+                           database=database, cursorclass=pymysql.cursors.DictCursor, autocommit=False)
+
+
+def insert_batches(cursor, conn, query, rows):
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        cursor.executemany(query, rows[start:start + SEED_BATCH_SIZE])
+        conn.commit()
+
+
+def seed(args, counts):
+    """Recreates the schema and fills it with synthetic rows."""
+    import schema
+    from ids import new_id, to_bin
+
+    conn = connect(args)
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`")
+    conn.close()
+
+    conn = connect(args, args.database)
+    cursor = conn.cursor()
+    schema.create_schema(cursor)
+    conn.commit()
+
+    rng = random.Random(42)
+    now = datetime.now().replace(microsecond=0)
+
+    ehr_ids = [new_id() for _ in range(counts['ehr_systems'])]
+    insert_batches(cursor, conn, """
+        INSERT INTO ehr_systems (ehr_id, ehr_name, documentation_link, authorization_url,
+                                 connection_url, description, is_supported, is_tenant_id_required)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(to_bin(ehr_id), f'EHR {i}', f'https://docs.ehr{i}.example.com', f'https://ehr{i}.example.com/oauth2/token',
+           f'ehr{i}.example.com', f'Synthetic EHR system {i}', True, i % 3 == 0)
+          for i, ehr_id in enumerate(ehr_ids)])
+
+    provider_ids = [new_id() for _ in range(counts['healthcare_providers'])]
+    insert_batches(cursor, conn, """
+        INSERT INTO healthcare_providers (provider_id, provider_name, provider_type, contact_email,
+                                          contact_phone, address, ehr_id, tenant_id, bulk_fhir_url,
+                                          secret_name, onboarded_date, last_data_fetch, status, notes)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(to_bin(provider_id), f'Provider {i}', rng.choice(PROVIDER_TYPES), f'contact{i}@provider{i}.example.org',
+           f'555-{i % 10000:04d}', f'{i} Main Street, Springfield', to_bin(rng.choice(ehr_ids)), f'tenant-{i}',
+           f'/fhir/r4/Group/{i}/$export', f'healthcare-provider/provider-{i}',
+           now - timedelta(days=rng.randint(0, 1000)), now - timedelta(hours=rng.randint(0, 500)),
+           rng.choice(PROVIDER_STATUSES), None)
+          for i, provider_id in enumerate(provider_ids)])
+
+    # Generate history in chunks so the 10m scale never holds all rows in memory
+    history_query = """
+        INSERT INTO data_fetch_history (fetch_id, provider_id, group_id, fetch_time, status,
+                                        s3_location, error_details)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    remaining = counts['data_fetch_history']
+    while remaining > 0:
+        batch = []
+        for _ in range(min(SEED_BATCH_SIZE, remaining)):
+            status = rng.choice(FETCH_STATUSES)
+            batch.append((to_bin(new_id()), to_bin(rng.choice(provider_ids)), f'group-{rng.randint(0, 99)}',
+                          now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)), status,
+                          f's3://myheathlakeimportbucket/HealthLakeOutput/{uuid.uuid4()}.ndjson',
+                          'Synthetic failure' if status == 'Failed' else None))
+        cursor.executemany(history_query, batch)
+        conn.commit()
+        remaining -= len(batch)
+
+    cursor.close()
+    conn.close()
+
+
+def load_ids(args):
+    from ids import from_bin
+
+    conn = connect(args, args.database)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT provider_id FROM healthcare_providers LIMIT 10000")
+        provider_ids = [from_bin(row['provider_id']) for row in cursor.fetchall()]
+        cursor.execute("SELECT ehr_id FROM ehr_systems")
+        ehr_ids = [from_bin(row['ehr_id']) for row in cursor.fetchall()]
+    conn.close()
+    return provider_ids, ehr_ids
+
+
+def api_event(method, path, query=None, body=None, headers=None):
+    """Builds an API Gateway REST proxy event like the ones the deployed API sends."""
+    return {
+        'resource': path,
+        'path': path,
+        'httpMethod': method,
+        'headers': {'Accept': 'application/json', 'Content-Type': 'application/json', **(headers or {})},
+        'queryStringParameters': query,
+        'pathParameters': None,
+        'requestContext': {
+            'resourcePath': path,
+            'httpMethod': method,
+            'stage': 'bench',
+            'requestId': str(uuid.uuid4())
+        },
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False
+    }
+
+
+def build_scenarios(provider_ids, ehr_ids, counts):
+    """Returns (name, handler module, event factory) for every benchmarked call."""
+    rng = random.Random(7)
+    scenarios = [
+        ('list_providers', 'get_healthcare_providers',
+         lambda: api_event('GET', '/providers')),
+        ('get_provider_by_id', 'get_healthcare_providers',
+         lambda: api_event('GET', '/providers', {'provider_id': rng.choice(provider_ids)})),
+        ('get_provider_with_ehr', 'get_healthcare_provider',
+         lambda: api_event('POST', '/provider', body={'provider_id': rng.choice(provider_ids)})),
+        ('list_ehr_systems', 'get_ehr_systems',
+         lambda: api_event('GET', '/ehr-systems')),
+        ('get_ehr_system_by_id', 'get_ehr_systems',
+         lambda: api_event('GET', '/ehr-systems', {'ehr_id': rng.choice(ehr_ids)})),
+        ('list_ehr_systems_with_counts', 'get_ehr_systems',
+         lambda: api_event('GET', '/ehr-systems', {'include_provider_count': 'true'})),
+        ('history_by_provider', 'get_data_fetch_history',
+         lambda: api_event('GET', '/data-fetch-history', {'provider_id': rng.choice(provider_ids)})),
+        ('history_failed_with_details', 'get_data_fetch_history',
+         lambda: api_event('GET', '/data-fetch-history',
+                           {'provider_id': rng.choice(provider_ids), 'status': 'Failed',
+                            'include_provider_details': 'true'})),
+    ]
+    # An unfiltered history listing returns every row; only meaningful at small scales
+    if counts['data_fetch_history'] <= 100_000:
+        scenarios.append(('history_all', 'get_data_fetch_history',
+                          lambda: api_event('GET', '/data-fetch-history')))
+    return scenarios
+
+
+class StatementCounter:
+    """Counts SQL statements sent through any pymysql cursor while installed."""
+
+    def __init__(self):
+        import pymysql.cursors
+        self.cursor_class = pymysql.cursors.Cursor
+        self.original_execute = self.cursor_class.execute
+        self.count = 0
+
+    def __enter__(self):
+        counter = self
+
+        def counting_execute(cursor, query, args=None):
+            counter.count += 1
+            return counter.original_execute(cursor, query, args)
+
+        self.cursor_class.execute = counting_execute
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cursor_class.execute = self.original_execute
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_scenario(handler, make_event, iterations, warmup, clear_cache):
+    for _ in range(warmup):
+        handler(make_event(), None)
+
+    latencies, statements, sizes, statuses = [], [], [], {}
+    for _ in range(iterations):
+        clear_cache()
+        event = make_event()
+        with StatementCounter() as counter:
+            start = time.perf_counter()
+            response = handler(event, None)
+            latencies.append((time.perf_counter() - start) * 1000)
+        statements.append(counter.count)
+        sizes.append(len(response.get('body') or ''))
+        statuses[response.get('statusCode')] = statuses.get(response.get('statusCode'), 0) + 1
+
+    return {
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_per_call': round(statistics.fmean(statements), 2),
+        'bytes_per_call': int(statistics.fmean(sizes)),
+        'status_codes': statuses
+    }
+
+
+def compare_to_baseline(results, baseline_path, max_regression):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and current['p95_ms'] > previous['p95_ms'] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if previous and current['queries_per_call'] > previous['queries_per_call']:
+            regressions.append(f"{name}: queries/call {previous['queries_per_call']} -> {current['queries_per_call']}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    counts = SCALES[args.scale]
+
+    if not args.skip_seed:
+        print(f"Seeding {args.database} at scale {args.scale}: {counts}")
+        start = time.perf_counter()
+        seed(args, counts)
+        print(f"Seeded in {time.perf_counter() - start:.1f} s")
+
+    import importlib
+    import cache_utils
+
+    provider_ids, ehr_ids = load_ids(args)
+    scenarios = build_scenarios(provider_ids, ehr_ids, counts)
+    if args.scenarios:
+        scenarios = [scenario for scenario in scenarios if scenario[0] in args.scenarios]
+
+    print(f"{'scenario':<30}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'bytes':>12}  status")
+    results = {}
+    for name, module_name, make_event in scenarios:
+        handler = importlib.import_module(module_name).lambda_handler
+        # Measure the database path, not the container cache
+        result = run_scenario(handler, make_event, args.iterations, args.warmup, cache_utils.provider_cache.clear)
+        results[name] = result
+        print(f"{name:<30}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+              f"{result['queries_per_call']:>9.2f}{result['bytes_per_call']:>12}  {result['status_codes']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'scale': args.scale, 'counts': counts, 'scenarios': results}, f, indent=2, default=str)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+End-to-end throughput benchmark for the Bulk FHIR export pipeline.
+
+Runs the same sequence as the Step Function,
+    initiate_bulk_fhir_export -> get_bulk_fhir_export_status (poll) -> get_patient_data
+with every external dependency replaced by a local stand-in:
+
+  - mock_fhir_server.py (separate process) plays the EHR: token endpoint,
+    $export kick-off, 202/Retry-After polling, 307 redirects and gzip NDJSON files
+  - local_aws.py (in-process thread) plays Lambda Invoke, Secrets Manager and S3
+
+get_healthcare_provider is answered with a fixed provider record pointing at
+the mock server, so no database is needed. The handlers themselves run
+unmodified in this process, so the reported peak RSS is theirs.
+
+Usage:
+    python benchmarks/bench_export_pipeline.py --files 8 --file-size-mb 16 --latency-ms 20
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'Lambda_Functions'))
+sys.path.insert(0, BENCH_DIR)
+
+PROVIDER_ID = 'bench-provider'
+SECRET_NAME = 'healthcare-provider/bench-provider'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=4, help='output files per export')
+    parser.add_argument('--file-size-mb', type=float, default=8.0, help='uncompressed size of each file')
+    parser.add_argument('--latency-ms', type=int, default=0, help='delay the mock EHR adds to every request')
+    parser.add_argument('--polls', type=int, default=2, help='202 responses before the export completes')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds the mock EHR sends')
+    parser.add_argument('--token-lifetime', type=float, default=300,
+                        help='seconds the mock EHR accepts a token; set below the download time to exercise refresh')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--s3-dir', help='keep uploaded objects in this directory instead of discarding them')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    return parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_ehr(args):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'mock_fhir_server.py'), '--port', str(port),
+         '--files', str(args.files), '--file-size-mb', str(args.file_size_mb),
+         '--latency-ms', str(args.latency_ms), '--polls', str(args.polls),
+         '--retry-after', str(args.retry_after), '--token-lifetime', str(args.token_lifetime)],
+        stdout=subprocess.PIPE, text=True
+    )
+    # The server prints its URL once the synthetic files are built and it is listening
+    line = process.stdout.readline()
+    if 'listening' not in line:
+        process.kill()
+        raise RuntimeError(f'Mock EHR server failed to start: {line!r}')
+    return process, f'http://127.0.0.1:{port}'
+
+
+def provider_record(base_url):
+    """The joined provider + EHR row get_healthcare_provider would return."""
+    return {
+        'provider_id': PROVIDER_ID,
+        'provider_name': 'Benchmark Provider',
+        'secret_name': SECRET_NAME,
+        'tenant_id': None,
+        'bulk_fhir_url': '/fhir/r4/Group/bench/$export',
+        'authorization_url': f'{base_url}/oauth2/v1/token',
+        'connection_url': base_url,
+        'is_tenant_id_required': False,
+        'status': 'Active'
+    }
+
+
+def register_stand_ins(aws, base_url):
+    import get_authorization_token
+
+    provider = provider_record(base_url)
+    aws.put_secret(SECRET_NAME, {'client_id': 'bench-client', 'client_secret': 'bench-secret'})
+
+    def get_healthcare_provider(event, context):
+        return {'statusCode': 200, 'body': json.dumps({'provider': provider})}
+
+    aws.register_function('get_healthcare_provider', get_healthcare_provider)
+    aws.register_function('get_authorization_token', get_authorization_token.lambda_handler)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_pipeline(aws):
+    import initiate_bulk_fhir_export
+    import get_bulk_fhir_export_status
+    import get_patient_data
+    from token_provider import get_token_provider
+
+    timings = {}
+    bytes_before = aws.stats['s3_bytes']
+    start = time.perf_counter()
+
+    stage = time.perf_counter()
+    export_url = initiate_bulk_fhir_export.lambda_handler({'provider_id': PROVIDER_ID}, None)
+    if not isinstance(export_url, str):
+        raise RuntimeError(f'Kick-off failed: {export_url}')
+    timings['kickoff_s'] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    # The same container-wide token get_patient_data downloads with
+    tokens = get_token_provider(PROVIDER_ID)
+    polls = 0
+    while True:
+        status = get_bulk_fhir_export_status.lambda_handler(
+            {'export_url': export_url, 'access_token': tokens.get()}, None)
+        polls += 1
+        if status['status'] == 'complete':
+            break
+        if status['status'] != 'pending':
+            raise RuntimeError(f'Status check failed: {status}')
+        time.sleep(float(status['retry_after']))
+    timings['polling_s'] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    result = get_patient_data.lambda_handler(
+        {'provider_id': PROVIDER_ID, 'GetJobStatus': {'ResponseBody': {'output': status['output']['output']}}}, None)
+    if result.get('statusCode') != 200:
+        raise RuntimeError(f'Download failed: {result}')
+    timings['download_s'] = time.perf_counter() - stage
+
+    timings['total_s'] = time.perf_counter() - start
+    stored = aws.stats['s3_bytes'] - bytes_before
+    return {
+        **{name: round(value, 3) for name, value in timings.items()},
+        'polls': polls,
+        'files': len(status['output']['output']),
+        'stored_mb': round(stored / (1024 * 1024), 2),
+        'download_mb_per_s': round(stored / (1024 * 1024) / timings['download_s'], 2),
+        'end_to_end_mb_per_s': round(stored / (1024 * 1024) / timings['total_s'], 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ.setdefault('METRICS_ENABLED', 'false')
+
+    from local_aws import start_local_aws
+
+    mock_ehr, base_url = start_mock_ehr(args)
+    try:
+        aws = start_local_aws(s3_dir=args.s3_dir)
+        register_stand_ins(aws, base_url)
+        print(f"Mock EHR at {base_url}, local AWS at {aws.endpoint_url}")
+        print(f"Baseline RSS {peak_rss_mb():.1f} MB; {args.files} files x {args.file_size_mb} MB, "
+              f"{args.latency_ms} ms latency, {args.polls} polls")
+
+        results = []
+        for run in range(1, args.runs + 1):
+            result = run_pipeline(aws)
+            results.append(result)
+            print(f"run {run}: total {result['total_s']:.2f} s (kick-off {result['kickoff_s']:.2f}, "
+                  f"polling {result['polling_s']:.2f}, download {result['download_s']:.2f}) | "
+                  f"{result['stored_mb']} MB stored | download {result['download_mb_per_s']} MB/s | "
+                  f"end-to-end {result['end_to_end_mb_per_s']} MB/s | peak RSS {result['peak_rss_mb']} MB")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'config': vars(args), 'runs': results}, f, indent=2)
+    finally:
+        mock_ehr.terminate()
+        mock_ehr.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark for response serialization in the listing handlers.
+
+Compares the original three-pass conversion
+    json.dumps({'providers': json.loads(json.dumps(rows, default=str))})
+with the single-pass json_utils.to_json on synthetic DictCursor rows shaped
+like healthcare_providers and data_fetch_history.
+
+Usage:
+    python benchmarks/bench_json_serialization.py [--rows 1000 10000 100000] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Lambda_Functions'))
+
+import json_utils
+
+
+def make_provider_rows(count):
+    now = datetime(2025, 3, 1, 12, 0, 0)
+    return [{
+        'provider_id': str(uuid.uuid4()),
+        'provider_name': f'Provider {i}',
+        'provider_type': random.choice(['Hospital', 'Clinic', 'Private Practice']),
+        'contact_email': f'contact{i}@example.org',
+        'contact_phone': '555-0100',
+        'address': f'{i} Main Street, Springfield',
+        'ehr_id': str(uuid.uuid4()),
+        'tenant_id': None,
+        'bulk_fhir_url': f'/fhir/r4/Group/{i}/$export',
+        'secret_name': f'healthcare-provider/provider-{i}',
+        'onboarded_date': now - timedelta(days=i % 365),
+        'last_data_fetch': now - timedelta(hours=i % 48),
+        'status': 'Active',
+        'notes': None
+    } for i in range(count)]
+
+
+def make_history_rows(count):
+    now = datetime(2025, 3, 1, 12, 0, 0)
+    return [{
+        'fetch_id': str(uuid.uuid4()),
+        'provider_id': str(uuid.uuid4()),
+        'group_id': f'group-{i % 50}',
+        'fetch_time': now - timedelta(minutes=i),
+        'status': random.choice(['Success', 'Partial', 'Failed']),
+        's3_location': f's3://myheathlakeimportbucket/HealthLakeOutput/Patient_{i}.ndjson',
+        'error_details': None
+    } for i in range(count)]
+
+
+def three_pass(key, rows):
+    return json.dumps({'count': len(rows), key: json.loads(json.dumps(rows, default=str))})
+
+
+def single_pass(key, rows):
+    return json_utils.to_json({'count': len(rows), key: rows})
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    backend = 'orjson' if json_utils.orjson is not None else 'stdlib json'
+    print(f"to_json backend: {backend}")
+    print(f"{'dataset':<22}{'rows':>9}{'3-pass ms':>12}{'1-pass ms':>12}{'speedup':>10}{'bytes':>12}")
+
+    for count in args.rows:
+        for key, rows in (('providers', make_provider_rows(count)),
+                          ('data_fetch_history', make_history_rows(count))):
+            old_time, _ = best_of(lambda: three_pass(key, rows), args.repeat)
+            new_time, size = best_of(lambda: single_pass(key, rows), args.repeat)
+            print(f"{key:<22}{count:>9}{old_time * 1000:>12.1f}{new_time * 1000:>12.1f}"
+                  f"{old_time / new_time:>9.1f}x{size:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Import-time budget check for the Lambda handlers.
+
+Imports every module in Lambda_Functions that defines lambda_handler in a fresh
+interpreter with `python -X importtime`, takes the median cumulative import
+time over --repeat runs and compares it with the handler's budget. It also
+fails if a handler pulls in boto3, botocore or pymysql at import time; those
+belong behind bootstrap.get_client / bootstrap.connect_db so that they are only
+loaded by the code paths that use them.
+
+Exits non-zero when any handler is over budget or imports a deferred module,
+so it can run in CI next to the other checks.
+
+Usage:
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-ms 80 --repeat 9 --top 5
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Lambda_Functions'))
+
+# Default per-handler budget for the cumulative import time of the module
+DEFAULT_BUDGET_MS = 60.0
+
+# Handlers that legitimately need more than the default
+BUDGETS_MS = {}
+
+# Modules that must only be imported on first use, never while loading a handler
+DEFERRED_MODULES = ('boto3', 'botocore', 'pymysql')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='budget for handlers without an entry in BUDGETS_MS')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per handler; the median is used')
+    parser.add_argument('--top', type=int, default=3, help='heaviest imports to list for each handler')
+    parser.add_argument('--handlers', help='comma-separated subset of handler modules')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    return parser.parse_args()
+
+
+def discover_handlers():
+    handlers = []
+    for filename in sorted(os.listdir(LAMBDA_DIR)):
+        if not filename.endswith('.py'):
+            continue
+        with open(os.path.join(LAMBDA_DIR, filename)) as f:
+            if 'def lambda_handler(' in f.read():
+                handlers.append(filename[:-3])
+    return handlers
+
+
+def measure_import(module):
+    """Imports module in a new interpreter and returns (cumulative_us, {imported module: cumulative_us})."""
+    env = dict(os.environ)
+    # Handlers must import without their runtime configuration
+    for name in ('HOST', 'USER_NAME', 'PASSWORD', 'DB_NAME'):
+        env.pop(name, None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=LAMBDA_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    imported = {}
+    total = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        imported[name] = cumulative
+        if name == module and len(indent) <= 1:
+            total = cumulative
+    if total is None:
+        raise RuntimeError(f'No importtime entry for {module}')
+    return total, imported
+
+
+def heaviest_direct_imports(imported, module, count):
+    """Largest cumulative entries excluding the handler itself and its submodule noise."""
+    candidates = [(name, us) for name, us in imported.items() if name != module and '.' not in name]
+    return sorted(candidates, key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    args = parse_args()
+    handlers = args.handlers.split(',') if args.handlers else discover_handlers()
+
+    # Compile everything once so the first measured run does not pay for .pyc generation
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', LAMBDA_DIR], check=False)
+
+    failures = []
+    results = []
+    print(f"{'handler':<48} {'median ms':>10} {'budget':>8}  heaviest imports")
+    for module in handlers:
+        samples = []
+        imported = {}
+        for _ in range(args.repeat):
+            total, imported = measure_import(module)
+            samples.append(total / 1000)
+        median_ms = statistics.median(samples)
+        budget_ms = BUDGETS_MS.get(module, args.budget_ms)
+        deferred = sorted(name for name in imported if name.split('.')[0] in DEFERRED_MODULES
+                          and '.' not in name)
+        heaviest = heaviest_direct_imports(imported, module, args.top)
+
+        status = []
+        if median_ms > budget_ms:
+            status.append('OVER BUDGET')
+        if deferred:
+            status.append(f"imports {', '.join(deferred)} at load")
+        if status:
+            failures.append((module, status))
+
+        print(f"{module:<48} {median_ms:>10.1f} {budget_ms:>8.0f}  "
+              + ', '.join(f'{name} {us / 1000:.1f}' for name, us in heaviest)
+              + (f"  <- {'; '.join(status)}" if status else ''))
+        results.append({
+            'handler': module,
+            'median_ms': round(median_ms, 2),
+            'samples_ms': [round(sample, 2) for sample in samples],
+            'budget_ms': budget_ms,
+            'deferred_imports': deferred,
+            'heaviest_imports_ms': {name: round(us / 1000, 2) for name, us in heaviest}
+        })
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print(f"\n{len(failures)} handler(s) failed the import-time check:")
+        for module, status in failures:
+            print(f"  {module}: {'; '.join(status)}")
+        sys.exit(1)
+    print(f"\nAll {len(handlers)} handlers are within their import-time budget.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Minimal local stand-in for the AWS APIs the export functions call through boto3:
+
+    Lambda          Invoke (RequestResponse) dispatched to in-process Python callables
+    Secrets Manager GetSecretValue / CreateSecret kept in memory
+    S3              PutObject / GetObject / HeadObject and multipart uploads, stored on
+                    disk or only counted
+
+start_local_aws() runs it on a background thread and points boto3 at it through
+AWS_ENDPOINT_URL, so the handlers run unmodified.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote, parse_qs
+
+
+class LocalAWSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, s3_dir=None):
+        super().__init__(address, LocalAWSHandler)
+        self.functions = {}
+        self.secrets = {}
+        self.s3_dir = s3_dir
+        self.objects = {}
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.stats = {'invocations': 0, 's3_puts': 0, 's3_bytes': 0}
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def register_function(self, name, handler):
+        """Registers handler(event, context) to serve Lambda Invoke calls for name."""
+        self.functions[name] = handler
+
+    def put_secret(self, name, value):
+        self.secrets[name] = value if isinstance(value, str) else json.dumps(value)
+
+
+class _Context:
+    """The subset of the Lambda context object the handlers read."""
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+
+
+class LocalAWSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return self.read_chunked()
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def read_chunked(self):
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+            if size == 0:
+                # Skip trailers (e.g. x-amz-checksum-crc32) up to the blank line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return bytes(body)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+
+    def respond(self, status, body=b'', content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    # Lambda and Secrets Manager are both POST APIs
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.read_body()
+
+        if path.startswith('/2015-03-31/functions/') and path.endswith('/invocations'):
+            return self.invoke(unquote(path.split('/')[3]), body)
+
+        query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        if 'uploads' in query or 'uploadId' in query:
+            return self.multipart(query)
+
+        target = self.headers.get('X-Amz-Target', '')
+        if target.startswith('secretsmanager.'):
+            return self.secrets_manager(target.split('.', 1)[1], json.loads(body or b'{}'))
+
+        self.respond(404, {'message': f'Unsupported request {self.command} {path}'})
+
+    def invoke(self, name, body):
+        handler = self.server.functions.get(name.split(':')[-1])
+        if handler is None:
+            return self.respond(404, {'Type': 'User', 'Message': f'Function not found: {name}'},
+                                headers={'x-amzn-ErrorType': 'ResourceNotFoundException'})
+
+        with self.server.lock:
+            self.server.stats['invocations'] += 1
+        event = json.loads(body) if body else {}
+        try:
+            result = handler(event, _Context(name))
+        except Exception as e:
+            # Same shape Lambda returns for an unhandled function error
+            return self.respond(200, {'errorMessage': str(e), 'errorType': type(e).__name__},
+                                headers={'X-Amz-Function-Error': 'Unhandled'})
+        self.respond(200, json.dumps(result, default=str).encode('utf-8'))
+
+    def secrets_manager(self, action, request):
+        name = request.get('SecretId') or request.get('Name')
+        arn = f'arn:aws:secretsmanager:us-west-1:000000000000:secret:{name}'
+        if action == 'GetSecretValue':
+            if name not in self.server.secrets:
+                return self.respond(400, {'__type': 'ResourceNotFoundException',
+                                          'message': 'Secrets Manager can\'t find the specified secret.'},
+                                    content_type='application/x-amz-json-1.1')
+            return self.respond(200, {'ARN': arn, 'Name': name, 'SecretString': self.server.secrets[name],
+                                      'VersionId': str(uuid.uuid4()), 'CreatedDate': time.time()},
+                                content_type='application/x-amz-json-1.1')
+        if action == 'CreateSecret':
+            self.server.put_secret(name, request.get('SecretString', ''))
+            return self.respond(200, {'ARN': arn, 'Name': name, 'VersionId': str(uuid.uuid4())},
+                                content_type='application/x-amz-json-1.1')
+        self.respond(400, {'__type': 'InvalidRequestException', 'message': f'Unsupported action {action}'},
+                     content_type='application/x-amz-json-1.1')
+
+    def s3_key(self):
+        # Path-style addressing: /<bucket>/<key>
+        bucket, _, key = unquote(urlparse(self.path).path).lstrip('/').partition('/')
+        return bucket, key
+
+    def multipart(self, query):
+        bucket, key = self.s3_key()
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            self.server.uploads[upload_id] = {}
+            return self.respond(200, (
+                '<InitiateMultipartUploadResult>'
+                f'<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>'
+                '</InitiateMultipartUploadResult>').encode('utf-8'), 'application/xml')
+
+        # Complete: parts are joined in part number order
+        parts = self.server.uploads.pop(query['uploadId'][0])
+        self.store_object(bucket, key, b''.join(parts[number] for number in sorted(parts)))
+        self.respond(200, f'<CompleteMultipartUploadResult><Key>{key}</Key></CompleteMultipartUploadResult>'
+                     .encode('utf-8'), 'application/xml')
+
+    def do_DELETE(self):
+        query = parse_qs(urlparse(self.path).query)
+        self.server.uploads.pop(query.get('uploadId', [''])[0], None)
+        self.respond(204, content_type='application/xml')
+
+    def do_PUT(self):
+        bucket, key = self.s3_key()
+        body = self.read_body()
+        query = parse_qs(urlparse(self.path).query)
+        if 'uploadId' in query:
+            self.server.uploads[query['uploadId'][0]][int(query['partNumber'][0])] = body
+            return self.respond(200, content_type='application/xml',
+                                headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+
+        etag = self.store_object(bucket, key, body)
+        self.respond(200, content_type='application/xml', headers={'ETag': f'"{etag}"'})
+
+    def store_object(self, bucket, key, body):
+        etag = hashlib.md5(body).hexdigest()
+        with self.server.lock:
+            self.server.stats['s3_puts'] += 1
+            self.server.stats['s3_bytes'] += len(body)
+            self.server.objects[(bucket, key)] = {'size': len(body), 'etag': etag}
+        if self.server.s3_dir:
+            path = os.path.join(self.server.s3_dir, bucket, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(body)
+        return etag
+
+    def do_GET(self):
+        bucket, key = self.s3_key()
+        info = self.server.objects.get((bucket, key))
+        if info is None or not self.server.s3_dir:
+            return self.respond(404, b'<Error><Code>NoSuchKey</Code></Error>', 'application/xml')
+        with open(os.path.join(self.server.s3_dir, bucket, key), 'rb') as f:
+            body = f.read()
+        self.respond(200, body, 'application/octet-stream', headers={'ETag': f'"{info["etag"]}"'})
+
+    def do_HEAD(self):
+        bucket, key = self.s3_key()
+        info = self.server.objects.get((bucket, key))
+        if info is None:
+            return self.respond(404, content_type='application/xml')
+        self.send_response(200)
+        self.send_header('Content-Length', str(info['size']))
+        self.send_header('ETag', f'"{info["etag"]}"')
+        self.end_headers()
+
+
+def start_local_aws(s3_dir=None):
+    """
+    Starts the stand-in on a background thread and configures boto3 (through
+    environment variables) to send every AWS call to it.
+    """
+    server = LocalAWSServer(('127.0.0.1', 0), s3_dir=s3_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        'AWS_ENDPOINT_URL': server.endpoint_url,
+        'AWS_ACCESS_KEY_ID': 'local',
+        'AWS_SECRET_ACCESS_KEY': 'local',
+        'AWS_DEFAULT_REGION': 'us-west-1',
+        # No aws-chunked checksum trailers on uploads keeps the stand-in simple
+        'AWS_REQUEST_CHECKSUM_CALCULATION': 'when_required',
+    })
+    return server
@@ -0,0 +1,131 @@
+"""
+File-backed stand-in for export_jobs.ExportJobStore.
+
+Keeps the same job and file records the export_jobs / export_job_files tables
+hold in one JSON file, rewritten atomically after every change, so
+export_orchestrator can run, crash and resume without a database. Export
+leases behave like the export_leases table.
+"""
+import os
+import json
+import time
+import threading
+
+import export_jobs
+from ids import new_id
+
+
+class LocalJobStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            self._save({'jobs': {}, 'leases': {}})
+
+    def _load(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _save(self, data):
+        # Write-then-rename, so a crash never leaves a half-written file
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def create_job(self, provider_id, resource_types):
+        job_id = new_id()
+        lease_key = f'{provider_id}|{resource_types}'
+        with self.lock:
+            data = self._load()
+            lease = data['leases'].get(lease_key)
+            if lease and lease['expires_at'] > time.time():
+                return lease['job_id'], False
+
+            for job in data['jobs'].values():
+                if (job['provider_id'], job['resource_types']) == (provider_id, resource_types) \
+                        and job['state'] not in export_jobs.FINISHED_STATES:
+                    job.update(state='failed', last_error='Export lease expired')
+            data['leases'][lease_key] = {'job_id': job_id, 'expires_at': time.time() + export_jobs.EXPORT_LEASE_SECONDS}
+            data['jobs'][job_id] = {
+                'job_id': job_id,
+                'provider_id': provider_id,
+                'resource_types': resource_types,
+                'state': 'kickoff',
+                'export_url': None,
+                's3_prefix': f'HealthLakeOutput/{provider_id}/{job_id}/',
+                'files_total': None,
+                'files_done': 0,
+                'bytes_downloaded': 0,
+                'attempts': 0,
+                'last_error': None,
+                'fetch_id': None,
+                'files': []
+            }
+            self._save(data)
+        return job_id, True
+
+    def _check_live(self, data, job_id):
+        """Same guard as ExportJobStore: the job must be running and hold its lease."""
+        job = data['jobs'].get(job_id)
+        held = any(lease['job_id'] == job_id for lease in data['leases'].values())
+        if not held or job is None or job['state'] in export_jobs.FINISHED_STATES:
+            raise export_jobs.LeaseLostError(job_id)
+
+    def _renew(self, data, job_id, release=False):
+        for key, lease in list(data['leases'].items()):
+            if lease['job_id'] == job_id:
+                if release:
+                    del data['leases'][key]
+                else:
+                    lease['expires_at'] = time.time() + export_jobs.EXPORT_LEASE_SECONDS
+
+    def renew_lease(self, job_id):
+        with self.lock:
+            data = self._load()
+            self._check_live(data, job_id)
+            self._renew(data, job_id)
+            self._save(data)
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self._load()['jobs'].get(job_id)
+
+    def update_job(self, job_id, **fields):
+        unknown = set(fields) - export_jobs.UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Cannot update export job fields: {', '.join(sorted(unknown))}")
+        with self.lock:
+            data = self._load()
+            self._check_live(data, job_id)
+            data['jobs'][job_id].update(fields)
+            self._renew(data, job_id, release=fields.get('state') in export_jobs.FINISHED_STATES)
+            self._save(data)
+
+    def add_files(self, job_id, files):
+        with self.lock:
+            data = self._load()
+            self._check_live(data, job_id)
+            job = data['jobs'][job_id]
+            known = {item['file_index'] for item in job['files']}
+            job['files'] += [{
+                'file_index': index, 'resource_type': item.get('type'), 'url': item['url'],
+                'state': 'pending', 's3_key': None, 'bytes': None
+            } for index, item in enumerate(files) if index not in known]
+            job.update(files_total=len(files), state='downloading', attempts=0, last_error=None)
+            self._renew(data, job_id)
+            self._save(data)
+
+    def complete_file(self, job_id, file_index, s3_key, size):
+        with self.lock:
+            data = self._load()
+            self._check_live(data, job_id)
+            job = data['jobs'][job_id]
+            item = job['files'][file_index]
+            if item['state'] == 'pending':
+                item.update(state='done', s3_key=s3_key, bytes=size)
+                job['files_done'] += 1
+                job['bytes_downloaded'] += size
+                job.update(attempts=0, last_error=None)
+            self._renew(data, job_id)
+            self._save(data)
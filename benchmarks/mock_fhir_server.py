@@ -0,0 +1,255 @@
+"""
+Local stand-in for an EHR's Bulk FHIR API (Athena / Cerner style).
+
+Implements just enough of the SMART backend-services and Bulk Data flows for
+the export functions to run end to end without a live sandbox:
+
+    POST /oauth2/v1/token                client_credentials -> access token
+    GET  <any path>/$export              kick-off -> 202 + Content-Location
+    GET  /status/<job>                   202 + Retry-After until ready, then 200 manifest
+    GET  /files/<job>/<n>                307 redirect to a pre-signed style download URL
+    GET  /download/<job>/<n>?sig=...     gzip-encoded NDJSON
+
+File count, file size, polling rounds, token lifetime and per-request latency
+are configurable. Tokens stop being accepted once their lifetime is over.
+
+Usage:
+    python benchmarks/mock_fhir_server.py --port 8081 --files 4 --file-size-mb 8 --latency-ms 20
+"""
+import io
+import gzip
+import json
+import time
+import uuid
+import base64
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+RESOURCE_TYPES = ['Patient', 'Observation', 'Encounter', 'Location', 'Practitioner']
+
+
+def build_ndjson_file(resource_type, size_bytes):
+    """Generates synthetic FHIR resources as NDJSON until size_bytes, gzip-compressed."""
+    raw = io.BytesIO()
+    index = 0
+    while raw.tell() < size_bytes:
+        resource = {
+            'resourceType': resource_type,
+            'id': str(uuid.UUID(int=index)),
+            'meta': {'lastUpdated': '2025-03-01T12:00:00Z'},
+            'status': 'final',
+            'subject': {'reference': f'Patient/{index % 5000}'},
+            'code': {'coding': [{'system': 'http://loinc.org', 'code': f'{1000 + index % 900}-{index % 10}'}]},
+            'text': {'status': 'generated', 'div': f'<div>Synthetic {resource_type} {index}</div>'}
+        }
+        raw.write(json.dumps(resource, separators=(',', ':')).encode('utf-8'))
+        raw.write(b'\n')
+        index += 1
+    return gzip.compress(raw.getvalue(), compresslevel=6)
+
+
+class MockBulkFhirServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, files=4, file_size_bytes=1024 * 1024, latency_ms=0,
+                 polls_before_ready=2, retry_after=1, token_lifetime=300):
+        super().__init__(address, MockBulkFhirHandler)
+        self.files = files
+        self.latency_ms = latency_ms
+        self.polls_before_ready = polls_before_ready
+        self.retry_after = retry_after
+        self.token_lifetime = token_lifetime
+        self.jobs = {}
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.stats = {'token': 0, 'kickoff': 0, 'status': 0, 'files': 0, 'bytes_served': 0}
+        # Files are identical per resource type, so build each body once up front
+        self.file_bodies = {
+            resource_type: build_ndjson_file(resource_type, file_size_bytes)
+            for resource_type in RESOURCE_TYPES
+        }
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+
+class MockBulkFhirHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def authorized(self):
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return False
+        expires_at = self.server.tokens.get(header[len('Bearer '):])
+        return expires_at is not None and time.monotonic() < expires_at
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def simulate_latency(self):
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+
+    def do_POST(self):
+        self.simulate_latency()
+        # http.client sends absolute URLs as-is when the caller passes one
+        path = urlparse(self.path).path
+        self.read_body()
+
+        if path.endswith('/token'):
+            if not self.headers.get('Authorization', '').startswith('Basic '):
+                return self.send_json(401, {'error': 'invalid_client'})
+            token = base64.urlsafe_b64encode(uuid.uuid4().bytes).decode('ascii').rstrip('=')
+            with self.server.lock:
+                self.server.tokens[token] = time.monotonic() + self.server.token_lifetime
+            self.server.count('token')
+            return self.send_json(200, {
+                'access_token': token,
+                'token_type': 'bearer',
+                'expires_in': self.server.token_lifetime,
+                'scope': 'system/*.read'
+            })
+
+        self.send_json(404, {'error': f'Unknown path {path}'})
+
+    def do_GET(self):
+        self.simulate_latency()
+        parsed = urlparse(self.path)
+        path = parsed.path
+        parts = path.strip('/').split('/')
+
+        if path.endswith('/$export'):
+            return self.kick_off(parsed)
+        if parts[0] == 'status' and len(parts) == 2:
+            return self.poll(parts[1])
+        if parts[0] == 'files' and len(parts) == 3:
+            return self.redirect_file(parts[1], int(parts[2]))
+        if parts[0] == 'download' and len(parts) == 3:
+            return self.download(parts[1], int(parts[2]))
+        self.send_json(404, {'error': f'Unknown path {path}'})
+
+    def kick_off(self, parsed):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'invalid_token'})
+        if self.headers.get('Prefer') != 'respond-async':
+            return self.send_json(400, {'error': 'Prefer: respond-async is required'})
+
+        job_id = uuid.uuid4().hex
+        query_types = [value for key, _, value in
+                       (item.partition('=') for item in parsed.query.split('&')) if key == '_type']
+        types = query_types[0].split(',') if query_types else RESOURCE_TYPES
+        with self.server.lock:
+            self.server.jobs[job_id] = {'polls': 0, 'types': types}
+        self.server.count('kickoff')
+        self.send_empty(202, {'Content-Location': f'{self.server.base_url}/status/{job_id}'})
+
+    def poll(self, job_id):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'invalid_token'})
+        job = self.server.jobs.get(job_id)
+        if job is None:
+            return self.send_json(404, {'error': 'Unknown export job'})
+
+        self.server.count('status')
+        with self.server.lock:
+            job['polls'] += 1
+            polls = job['polls']
+        if polls <= self.server.polls_before_ready:
+            progress = int(100 * polls / (self.server.polls_before_ready + 1))
+            return self.send_empty(202, {'Retry-After': str(self.server.retry_after),
+                                         'X-Progress': f'{progress}% complete'})
+
+        output = [{
+            'type': job['types'][n % len(job['types'])],
+            'url': f'{self.server.base_url}/files/{job_id}/{n}'
+        } for n in range(self.server.files)]
+        self.send_json(200, {
+            'transactionTime': '2025-03-01T12:00:00Z',
+            'request': f'{self.server.base_url}/$export',
+            'requiresAccessToken': True,
+            'output': output,
+            'error': []
+        })
+
+    def redirect_file(self, job_id, index):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'invalid_token'})
+        self.send_empty(307, {'Location': f'{self.server.base_url}/download/{job_id}/{index}?sig={uuid.uuid4().hex}'})
+
+    def download(self, job_id, index):
+        job = self.server.jobs.get(job_id)
+        if job is None or index >= self.server.files:
+            return self.send_json(404, {'error': 'Unknown file'})
+
+        body = self.server.file_bodies.get(job['types'][index % len(job['types'])],
+                                           self.server.file_bodies['Patient'])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/fhir+ndjson')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count('files')
+        self.server.count('bytes_served', len(body))
+
+
+def start_server(port=0, **options):
+    """Starts the mock server on a background thread and returns it."""
+    server = MockBulkFhirServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--files', type=int, default=4, help='output files per export')
+    parser.add_argument('--file-size-mb', type=float, default=1.0, help='uncompressed size of each file')
+    parser.add_argument('--latency-ms', type=int, default=0, help='delay added to every request')
+    parser.add_argument('--polls', type=int, default=2, help='202 responses before the export completes')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 202 responses')
+    parser.add_argument('--token-lifetime', type=float, default=300, help='seconds an access token is accepted')
+    args = parser.parse_args()
+
+    server = MockBulkFhirServer(('127.0.0.1', args.port), files=args.files,
+                                file_size_bytes=int(args.file_size_mb * 1024 * 1024),
+                                latency_ms=args.latency_ms, polls_before_ready=args.polls,
+                                retry_after=args.retry_after, token_lifetime=args.token_lifetime)
+    print(f"Mock Bulk FHIR server listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
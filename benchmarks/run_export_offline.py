@@ -0,0 +1,167 @@
+"""
+Runs export_orchestrator end to end without network access or a database,
+crashes it part-way through the downloads, and resumes it.
+
+  - mock_fhir_server.py (background thread) plays the EHR
+  - local_aws.py plays Lambda Invoke, Secrets Manager and S3; the real
+    initiate_bulk_fhir_export, get_bulk_fhir_export_status and
+    get_authorization_token handlers are registered with it
+  - get_healthcare_provider and complete_data_fetch are answered in memory
+  - local_job_store.py keeps the job in a JSON file instead of MySQL
+
+A second request for the same export is made while the job runs; it must
+attach to the running job. The crash is injected right after a file has been
+recorded as stored. The run then starts over the way a new container would
+(no cached token, store re-read from disk) and checks that the export was
+kicked off once, every file was downloaded exactly once and the fetch was
+recorded once.
+
+Usage:
+    python benchmarks/run_export_offline.py --files 6 --crash-after-files 3
+    python benchmarks/run_export_offline.py --state-file /tmp/jobs.json --crash-after-files 0
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'Lambda_Functions'))
+sys.path.insert(0, BENCH_DIR)
+
+SECRET_NAME = 'healthcare-provider/offline-provider'
+
+
+class SimulatedCrash(BaseException):
+    """Stops the run like a killed process: not caught by the orchestrator's step retries."""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=6, help='output files per export')
+    parser.add_argument('--file-size-mb', type=float, default=1.0, help='uncompressed size of each file')
+    parser.add_argument('--polls', type=int, default=2, help='202 responses before the export completes')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds the mock EHR sends')
+    parser.add_argument('--crash-after-files', type=int,
+                        help='crash after this many files are stored (default: half); negative to never crash')
+    parser.add_argument('--state-file', help='job store file (default: a temporary file)')
+    parser.add_argument('--s3-dir', help='keep uploaded objects in this directory')
+    return parser.parse_args()
+
+
+def register_stand_ins(aws, base_url, provider_id):
+    import get_authorization_token
+    import get_bulk_fhir_export_status
+    import initiate_bulk_fhir_export
+
+    provider = {
+        'provider_id': provider_id,
+        'provider_name': 'Offline Provider',
+        'secret_name': SECRET_NAME,
+        'tenant_id': None,
+        'bulk_fhir_url': '/fhir/r4/Group/offline/$export',
+        'authorization_url': f'{base_url}/oauth2/v1/token',
+        'connection_url': base_url,
+        'is_tenant_id_required': False,
+        'status': 'Active'
+    }
+    aws.put_secret(SECRET_NAME, {'client_id': 'offline-client', 'client_secret': 'offline-secret'})
+    recorded_fetches = {}
+
+    def get_healthcare_provider(event, context):
+        return {'statusCode': 200, 'body': json.dumps({'provider': provider})}
+
+    def complete_data_fetch(event, context):
+        # Same contract as the real function: a repeated fetch_id is a 409
+        if event['fetch_id'] in recorded_fetches:
+            return {'statusCode': 409, 'body': json.dumps({'error': 'This fetch has already been recorded'})}
+        recorded_fetches[event['fetch_id']] = event
+        return {'statusCode': 201, 'body': json.dumps({'data_fetch': event})}
+
+    aws.register_function('get_healthcare_provider', get_healthcare_provider)
+    aws.register_function('get_authorization_token', get_authorization_token.lambda_handler)
+    aws.register_function('initiate_bulk_fhir_export', initiate_bulk_fhir_export.lambda_handler)
+    aws.register_function('get_bulk_fhir_export_status', get_bulk_fhir_export_status.lambda_handler)
+    aws.register_function('complete_data_fetch', complete_data_fetch)
+    return recorded_fetches
+
+
+def crash_after(store, files):
+    """Makes store.complete_file raise SimulatedCrash once `files` files have been recorded."""
+    complete_file = store.complete_file
+    stored = []
+
+    def complete_file_then_crash(*args, **kwargs):
+        complete_file(*args, **kwargs)
+        stored.append(args[1])
+        if len(stored) >= files:
+            raise SimulatedCrash(f'crashed after storing {len(stored)} files')
+
+    store.complete_file = complete_file_then_crash
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    os.environ.setdefault('METRICS_ENABLED', 'false')
+
+    from ids import new_id
+    from local_aws import start_local_aws
+    from local_job_store import LocalJobStore
+    from mock_fhir_server import start_server
+    import export_orchestrator
+    import token_provider
+
+    ehr = start_server(files=args.files, file_size_bytes=int(args.file_size_mb * 1024 * 1024),
+                       polls_before_ready=args.polls, retry_after=args.retry_after)
+    aws = start_local_aws(s3_dir=args.s3_dir)
+    provider_id = new_id()
+    recorded_fetches = register_stand_ins(aws, ehr.base_url, provider_id)
+
+    state_file = args.state_file or os.path.join(tempfile.mkdtemp(prefix='export-jobs-'), 'jobs.json')
+    crash_files = args.files // 2 if args.crash_after_files is None else args.crash_after_files
+    print(f"Mock EHR at {ehr.base_url}, local AWS at {aws.endpoint_url}, job store {state_file}")
+
+    start = time.perf_counter()
+    store = LocalJobStore(state_file)
+    job_id, _ = export_orchestrator.start_job(provider_id, store=store)
+    # A second trigger for the same provider and types, written differently
+    duplicate_id, duplicate_created = export_orchestrator.start_job(
+        provider_id, 'Location,Location', store=LocalJobStore(state_file))
+    if crash_files >= 0:
+        crash_after(store, crash_files)
+    try:
+        export_orchestrator.run_job(job_id, store)
+        print("first run: finished without crashing")
+    except SimulatedCrash as e:
+        job = LocalJobStore(state_file).get_job(job_id)
+        print(f"first run: {e} (state {job['state']}, {job['files_done']}/{job['files_total']} files)")
+
+        # A fresh container: no cached token, state only from the store
+        token_provider.clear_token_providers()
+        job, _ = export_orchestrator.run_job(job_id, LocalJobStore(state_file))
+        print(f"resumed run: state {job['state']}, {job['files_done']}/{job['files_total']} files")
+
+    job = LocalJobStore(state_file).get_job(job_id)
+    elapsed = time.perf_counter() - start
+    checks = {
+        'job complete': job['state'] == 'complete',
+        'duplicate request attached': duplicate_id == job_id and not duplicate_created,
+        'lease released': not LocalJobStore(state_file)._load()['leases'],
+        'export kicked off once': ehr.stats['kickoff'] == 1,
+        'each file downloaded once': ehr.stats['files'] == args.files,
+        'each file stored once': aws.stats['s3_puts'] == args.files,
+        'fetch recorded once': len(recorded_fetches) == 1
+    }
+    print(f"{elapsed:.2f} s, {job['bytes_downloaded'] / (1024 * 1024):.2f} MB downloaded, "
+          f"EHR requests: {ehr.stats}")
+    for name, passed in checks.items():
+        print(f"  {'ok  ' if passed else 'FAIL'} {name}")
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Handlers and their shared modules are flat files in Lambda_Functions, the
+# way Lambda loads them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Lambda_Functions'))
+
+os.environ.setdefault('METRICS_ENABLED', 'false')
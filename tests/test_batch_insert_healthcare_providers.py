@@ -0,0 +1,77 @@
+import json
+import base64
+import pytest
+import router
+from batch_insert_healthcare_providers import parse_providers, validate_provider
+from ids import to_bin
+
+VALID = {
+    'provider_name': 'Clinic A',
+    'provider_type': 'Clinic',
+    'contact_email': 'a@example.com',
+    'contact_phone': '555-0100'
+}
+
+
+def test_json_list_and_wrapped_list():
+    assert parse_providers({'body': json.dumps([VALID])}) == [VALID]
+    assert parse_providers({'body': json.dumps({'providers': [VALID]})}) == [VALID]
+    assert parse_providers([VALID]) == [VALID]
+
+
+def test_csv_body_with_empty_cells_as_none():
+    event = {
+        'headers': {'Content-Type': 'text/csv; charset=utf-8'},
+        'body': 'provider_name,provider_type,notes\nClinic A, Clinic ,\n'
+    }
+    assert parse_providers(event) == [{'provider_name': 'Clinic A', 'provider_type': 'Clinic', 'notes': None}]
+
+
+def test_ndjson_body_skips_blank_lines():
+    event = {
+        'headers': {'content-type': 'application/x-ndjson'},
+        'body': '{"provider_name": "A"}\n\n{"provider_name": "B"}\n'
+    }
+    assert parse_providers(event) == [{'provider_name': 'A'}, {'provider_name': 'B'}]
+
+
+def test_base64_encoded_body():
+    event = {
+        'headers': {'Content-Type': 'text/csv'},
+        'body': base64.b64encode(b'provider_name\nA\n').decode('ascii'),
+        'isBase64Encoded': True
+    }
+    assert parse_providers(event) == [{'provider_name': 'A'}]
+
+
+def test_format_and_data_fields():
+    body = {'format': 'ndjson', 'data': '{"provider_name": "A"}'}
+    assert parse_providers({'body': body}) == [{'provider_name': 'A'}]
+
+
+def test_anything_else_is_rejected():
+    with pytest.raises(ValueError):
+        parse_providers({'body': json.dumps({'provider_name': 'A'})})
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/json', json.dumps([VALID])),
+    ('text/csv', 'provider_name,provider_type,contact_email,contact_phone\nClinic A,Clinic,a@example.com,555-0100\n'),
+    ('application/x-ndjson', json.dumps(VALID) + '\n')
+])
+def test_every_body_form_survives_the_router(content_type, body):
+    event = {'headers': {'Content-Type': content_type}, 'body': body}
+    routed = router._handler_event(event, '/providers/batch', {})
+    assert parse_providers(routed) == [VALID]
+
+
+def test_validate_provider():
+    ehr_id = '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+    assert validate_provider(dict(VALID, ehr_id=ehr_id), {to_bin(ehr_id)}) == []
+    assert validate_provider('not a row', set()) == ['Provider must be an object']
+
+    errors = validate_provider({'provider_type': 'Spa', 'client_id': 'x', 'ehr_id': ehr_id}, set())
+    assert 'Missing required field: provider_name' in errors
+    assert 'Invalid provider_type: Spa' in errors
+    assert f'Unknown ehr_id: {ehr_id}' in errors
+    assert 'client_id and client_secret must be provided together' in errors
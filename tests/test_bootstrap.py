@@ -0,0 +1,126 @@
+import time
+import pymysql
+import pytest
+import bootstrap
+
+
+class StatusCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query):
+        self.conn.queries.append(query)
+        if query == 'SHOW REPLICA STATUS' and self.conn.old_server:
+            raise pymysql.err.ProgrammingError(1064, 'You have an error in your SQL syntax')
+
+    def fetchone(self):
+        return self.conn.status
+
+
+class FakeConnection:
+    def __init__(self, host, status=None, old_server=False):
+        self.host = host
+        self.status = status
+        self.old_server = old_server
+        self.queries = []
+        self.closed = False
+
+    def cursor(self):
+        return StatusCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def hosts(monkeypatch):
+    """Connections opened so far; set hosts.status / hosts.reader_down to shape the reader."""
+    class Hosts(list):
+        status = {'Seconds_Behind_Source': 0}
+        reader_down = False
+        old_server = False
+
+    opened = Hosts()
+    now = [1000.0]
+
+    def open_connection(with_database, host):
+        if host == 'reader' and opened.reader_down:
+            raise pymysql.err.OperationalError(2003, "Can't connect to MySQL server")
+        conn = FakeConnection(host, opened.status, opened.old_server)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setenv('HOST', 'writer')
+    monkeypatch.setattr(bootstrap, 'READ_HOST', 'reader')
+    monkeypatch.setattr(bootstrap, 'READ_MAX_LAG_SECONDS', 5)
+    monkeypatch.setattr(bootstrap, 'READ_LAG_CHECK_SECONDS', 10)
+    monkeypatch.setattr(bootstrap, '_reader_checked_at', None)
+    monkeypatch.setattr(bootstrap, '_reader_healthy', False)
+    monkeypatch.setattr(bootstrap, '_reuse_connection', False)
+    monkeypatch.setattr(bootstrap, '_open_connection', open_connection)
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    opened.now = now
+    return opened
+
+
+def test_reads_go_to_a_current_reader(hosts):
+    assert bootstrap.connect_db(read_only=True).host == 'reader'
+    assert bootstrap.connect_db().host == 'writer'
+
+
+def test_lagging_reader_sends_reads_to_the_writer_until_the_next_check(hosts):
+    hosts.status = {'Seconds_Behind_Source': 30}
+    conn = bootstrap.connect_db(read_only=True)
+    assert conn.host == 'writer'
+    assert hosts[0].host == 'reader' and hosts[0].closed
+
+    # Within READ_LAG_CHECK_SECONDS the reader is not even connected to
+    assert bootstrap.connect_db(read_only=True).host == 'writer'
+    assert [conn.host for conn in hosts] == ['reader', 'writer', 'writer']
+
+    hosts.status = {'Seconds_Behind_Source': 1}
+    hosts.now[0] += 11
+    assert bootstrap.connect_db(read_only=True).host == 'reader'
+
+
+def test_healthy_reader_is_not_rechecked_within_the_interval(hosts):
+    bootstrap.connect_db(read_only=True)
+    hosts.now[0] += 5
+    conn = bootstrap.connect_db(read_only=True)
+    assert conn.host == 'reader'
+    assert conn.queries == []
+
+
+def test_stopped_replication_counts_as_lagging(hosts):
+    hosts.status = {'Seconds_Behind_Source': None}
+    assert bootstrap.connect_db(read_only=True).host == 'writer'
+
+
+def test_unreachable_reader_falls_back_to_the_writer(hosts):
+    hosts.reader_down = True
+    assert bootstrap.connect_db(read_only=True).host == 'writer'
+
+
+def test_reader_without_replica_status_counts_as_current(hosts):
+    # Aurora replicas share the writer's storage and report no replica status
+    hosts.status = None
+    assert bootstrap.connect_db(read_only=True).host == 'reader'
+
+
+def test_older_servers_are_asked_for_slave_status(hosts):
+    hosts.old_server = True
+    hosts.status = {'Seconds_Behind_Master': 2}
+    conn = bootstrap.connect_db(read_only=True)
+    assert conn.host == 'reader'
+    assert conn.queries == ['SHOW REPLICA STATUS', 'SHOW SLAVE STATUS']
+
+
+def test_without_read_host_everything_uses_the_writer(hosts, monkeypatch):
+    monkeypatch.setattr(bootstrap, 'READ_HOST', None)
+    assert bootstrap.connect_db(read_only=True).host == 'writer'
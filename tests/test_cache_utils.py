@@ -0,0 +1,123 @@
+import time
+import pytest
+import bootstrap
+import get_healthcare_provider
+from cache_utils import LRUCache, get_table_versions, provider_cache
+
+
+class FakeCursor:
+    """Answers table_versions lookups and the provider join from fixed data."""
+
+    def __init__(self, versions, provider):
+        self.versions = versions
+        self.provider = provider
+        self.queries = []
+
+    def execute(self, query, params=()):
+        self.queries.append(query)
+        if 'table_versions' in query:
+            self._rows = [{'table_name': name, 'version': version} for name, version in self.versions.items()]
+        else:
+            self._rows = [self.provider] if self.provider else []
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+def test_get_returns_none_on_miss():
+    assert LRUCache().get('missing') is None
+
+
+def test_entry_is_fresh_until_ttl_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = LRUCache(ttl_seconds=10)
+    cache.put('p1', 'value', version=(1, 2))
+
+    assert cache.get('p1') == ('value', (1, 2), True)
+    now[0] = 111.0
+    assert cache.get('p1') == ('value', (1, 2), False)
+
+    cache.refresh('p1')
+    assert cache.get('p1') == ('value', (1, 2), True)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert len(cache) == 2
+
+
+def test_get_table_versions_reports_missing_tables_as_zero():
+    cursor = FakeCursor({'healthcare_providers': 4}, None)
+    assert get_table_versions(cursor, ('healthcare_providers', 'ehr_systems')) == (4, 0)
+
+
+@pytest.fixture
+def provider_db(monkeypatch):
+    provider_cache.clear()
+    cursor = FakeCursor({'healthcare_providers': 1, 'ehr_systems': 1},
+                        {'provider_id': 'p1', 'provider_name': 'Fresh', 'version': 2})
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda **kwargs: FakeConnection(cursor))
+    yield cursor
+    provider_cache.clear()
+
+
+def expire(key):
+    value, version, _ = provider_cache._entries[key]
+    provider_cache._entries[key] = (value, version, 0)
+
+
+def test_expired_entry_with_unchanged_versions_is_revalidated(provider_db):
+    provider_cache.put('p1', {'provider_id': 'p1', 'provider_name': 'Cached', 'version': 1}, (1, 1))
+    expire('p1')
+
+    response = get_healthcare_provider.lambda_handler({'provider_id': 'p1'}, None)
+
+    assert '"Cached"' in response['body']
+    assert len(provider_db.queries) == 1
+    assert provider_cache.get('p1')[2] is True
+
+
+def test_expired_entry_is_reread_after_a_table_changes(provider_db):
+    provider_cache.put('p1', {'provider_id': 'p1', 'provider_name': 'Cached', 'version': 1}, (0, 1))
+    expire('p1')
+
+    response = get_healthcare_provider.lambda_handler({'provider_id': 'p1'}, None)
+
+    assert '"Fresh"' in response['body']
+    assert provider_cache.get('p1')[1] == (1, 1)
+
+
+def test_fresh_entry_is_served_without_a_connection(monkeypatch):
+    provider_cache.clear()
+    provider_cache.put('p1', {'provider_id': 'p1', 'provider_name': 'Cached', 'version': 1}, (1, 1))
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda **kwargs: pytest.fail('database was queried'))
+
+    response = get_healthcare_provider.lambda_handler({'provider_id': 'p1'}, None)
+
+    assert response['statusCode'] == 200
+    provider_cache.clear()
@@ -0,0 +1,131 @@
+import json
+from datetime import datetime
+import pytest
+import pymysql
+import bootstrap
+import complete_data_fetch
+from cache_utils import provider_cache
+from ids import to_bin
+
+PROVIDER_ID = '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, query, args=None):
+        query = ' '.join(query.split())
+        self.conn.executed.append((query, args))
+        if query.startswith('UPDATE healthcare_providers'):
+            self.rowcount = int(self.conn.provider_exists)
+        if query.startswith('INSERT INTO data_fetch_history'):
+            if args[0] in self.conn.fetch_ids:
+                raise pymysql.err.IntegrityError(1062, "Duplicate entry for key 'PRIMARY'")
+            self.conn.fetch_ids.add(args[0])
+
+    def executemany(self, query, args):
+        self.conn.executed.append((' '.join(query.split()), args))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, provider_exists=True):
+        self.provider_exists = provider_exists
+        self.fetch_ids = set()
+        self.executed = []
+        self.committed = False
+        self.rolled_back = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: conn)
+    return conn
+
+
+def provider_update(conn):
+    return next(args for query, args in conn.executed if query.startswith('UPDATE healthcare_providers'))
+
+
+def test_fetch_time_is_parsed_before_it_reaches_the_provider_update(conn):
+    response = complete_data_fetch.lambda_handler(
+        {'provider_id': PROVIDER_ID, 'fetch_time': '2024-01-31T12:00:00+01:00'}, None)
+
+    assert response['statusCode'] == 201
+    # Compared as a time, never as the text the caller sent
+    assert provider_update(conn)[2] == datetime(2024, 1, 31, 11)
+    assert json.loads(response['body'])['data_fetch']['fetch_time'] == '2024-01-31 11:00:00'
+
+
+def test_malformed_fetch_time_is_rejected_before_connecting(monkeypatch):
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: pytest.fail('connected'))
+
+    response = complete_data_fetch.lambda_handler({'provider_id': PROVIDER_ID, 'fetch_time': 'yesterday'}, None)
+
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['details'] == ['Invalid fetch_time: yesterday']
+
+
+def statements(conn):
+    return [query.split(' (')[0].split(' SET')[0] for query, args in conn.executed]
+
+
+def test_fetch_and_provider_update_commit_together(conn):
+    provider_cache.put(PROVIDER_ID, {'provider_id': PROVIDER_ID}, 1)
+
+    response = complete_data_fetch.lambda_handler({'provider_id': PROVIDER_ID, 'status': 'Failed'}, None)
+
+    assert response['statusCode'] == 201
+    assert statements(conn) == [
+        'UPDATE healthcare_providers',
+        'INSERT INTO data_fetch_history',
+        'INSERT INTO provider_fetch_summary',
+        'INSERT INTO provider_fetch_daily',
+        'INSERT INTO table_versions'
+    ]
+    assert conn.committed and not conn.rolled_back
+    # A failed fetch marks the provider Error and leaves last_data_fetch alone
+    assert provider_update(conn)[:2] == ('Error', 'Failed')
+    assert provider_cache.get(PROVIDER_ID) is None
+
+
+def test_unknown_provider_is_rolled_back_without_a_history_row(conn):
+    conn.provider_exists = False
+
+    response = complete_data_fetch.lambda_handler({'provider_id': PROVIDER_ID}, None)
+
+    assert response['statusCode'] == 404
+    assert statements(conn) == ['UPDATE healthcare_providers']
+    assert conn.rolled_back and not conn.committed
+
+
+def test_retried_completion_with_the_same_fetch_id_is_a_409(conn):
+    fetch_id = '01a15295-d2a7-770a-8bed-e7dbc5aa7e99'
+    event = {'provider_id': PROVIDER_ID, 'fetch_id': fetch_id}
+    assert complete_data_fetch.lambda_handler(event, None)['statusCode'] == 201
+
+    conn.committed = False
+    response = complete_data_fetch.lambda_handler(event, None)
+
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['fetch_id'] == fetch_id
+    # The provider update of the retry is undone with it
+    assert conn.rolled_back and not conn.committed
+    assert conn.fetch_ids == {to_bin(fetch_id)}
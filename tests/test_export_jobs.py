@@ -0,0 +1,180 @@
+import pytest
+import bootstrap
+from export_jobs import EXPORT_LEASE_SECONDS, ExportJobStore, LIVE_JOB, LeaseLostError
+from ids import from_bin, new_id, to_bin
+
+
+class ScriptedCursor:
+    """Records every statement and answers fetchone() from a fixed list, in order."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 1
+
+    def execute(self, query, args=None):
+        self.conn.executed.append((' '.join(query.split()), args))
+
+    def fetchone(self):
+        return self.conn.results.pop(0)
+
+    def close(self):
+        pass
+
+
+class ScriptedConnection:
+    def __init__(self, results):
+        self.results = list(results)
+        self.executed = []
+        self.committed = False
+        self.rolled_back = False
+
+    def cursor(self):
+        return ScriptedCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    connections = []
+
+    def connect_with(*results):
+        conn = ScriptedConnection(results)
+        connections.append(conn)
+        monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: conn)
+        return conn
+    return connect_with
+
+
+def test_update_of_a_live_job_is_guarded_and_renews_the_lease(connect):
+    job_id = new_id()
+    conn = connect({'job_id': to_bin(job_id)}, {'state': 'downloading'})
+
+    ExportJobStore().update_job(job_id, attempts=1, last_error='timeout')
+
+    queries = [query for query, args in conn.executed]
+    assert queries[0].startswith('SELECT job_id FROM export_leases WHERE job_id = %s FOR UPDATE')
+    assert queries[2] == f'UPDATE export_jobs SET attempts = %s, last_error = %s WHERE {LIVE_JOB}'
+    assert queries[3].startswith('UPDATE export_leases SET expires_at')
+    assert conn.committed
+
+
+def test_finishing_a_job_releases_its_lease(connect):
+    job_id = new_id()
+    conn = connect({'job_id': to_bin(job_id)}, {'state': 'completing'})
+
+    ExportJobStore().update_job(job_id, state='complete')
+
+    assert conn.executed[-1] == ('DELETE FROM export_leases WHERE job_id = %s', (to_bin(job_id),))
+
+
+@pytest.mark.parametrize('lease, job', [
+    (None, {'state': 'downloading'}),   # another job took the lease over
+    ({'job_id': b'x'}, None),           # create_job already marked the job failed
+])
+def test_writes_of_a_job_without_its_lease_change_nothing(connect, lease, job):
+    job_id = new_id()
+    store = ExportJobStore()
+
+    for write in (lambda: store.update_job(job_id, state='completing'),
+                  lambda: store.renew_lease(job_id),
+                  lambda: store.add_files(job_id, [{'type': 'Location', 'url': 'https://ehr/1'}]),
+                  lambda: store.complete_file(job_id, 0, 'key', 10)):
+        conn = connect(lease, job)
+        with pytest.raises(LeaseLostError):
+            write()
+        assert not any(query.startswith(('UPDATE', 'INSERT', 'DELETE')) for query, args in conn.executed)
+        assert conn.rolled_back and not conn.committed
+
+
+class LeaseDatabase:
+    """
+    In-memory export_leases and export_jobs rows, answering the statements
+    create_job sends the way MySQL would.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.leases = {}
+        self.jobs = {}
+        self.results = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, args=None):
+        query = ' '.join(query.split())
+        if query.startswith('INSERT INTO export_leases'):
+            provider_id, resource_types, job_id, seconds = args
+            lease = self.leases.get((provider_id, resource_types))
+            if lease is None or lease['expires_at'] < self.now:
+                self.leases[(provider_id, resource_types)] = {'job_id': job_id, 'expires_at': self.now + seconds}
+        elif query.startswith('SELECT job_id FROM export_leases WHERE provider_id'):
+            # Keys come back as id strings, as with the registered BINARY(16) conversion
+            self.results = [{'job_id': from_bin(self.leases[tuple(args)]['job_id'])}]
+        elif query.startswith("UPDATE export_jobs SET state = 'failed'"):
+            for job in self.jobs.values():
+                if (job['provider_id'], job['resource_types']) == tuple(args) and \
+                        job['state'] not in ('complete', 'failed'):
+                    job.update(state='failed', last_error='Export lease expired')
+        elif query.startswith('INSERT INTO export_jobs'):
+            job_id, provider_id, resource_types, s3_prefix = args
+            self.jobs[job_id] = {'provider_id': provider_id, 'resource_types': resource_types, 'state': 'kickoff'}
+        else:
+            raise AssertionError(f'Unexpected statement: {query}')
+
+    def fetchone(self):
+        return self.results.pop(0)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = LeaseDatabase()
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: database)
+    return database
+
+
+def test_second_request_for_a_running_export_attaches_to_it(database):
+    store = ExportJobStore()
+    provider_id = new_id()
+
+    job_id, created = store.create_job(provider_id, 'Location')
+    attached_id, attached_created = store.create_job(provider_id, 'Location')
+
+    assert created and not attached_created
+    assert attached_id == job_id
+    assert list(database.jobs) == [to_bin(job_id)]
+    # Other resource types are a different export
+    assert store.create_job(provider_id, 'Location,Patient')[1]
+
+
+def test_expired_lease_is_taken_over_and_the_old_job_failed(database):
+    store = ExportJobStore()
+    provider_id = new_id()
+    old_id, _ = store.create_job(provider_id, 'Location')
+
+    database.now += EXPORT_LEASE_SECONDS + 1
+    new_job_id, created = store.create_job(provider_id, 'Location')
+
+    assert created and new_job_id != old_id
+    assert database.jobs[to_bin(old_id)]['state'] == 'failed'
+    assert database.jobs[to_bin(old_id)]['last_error'] == 'Export lease expired'
+    assert database.jobs[to_bin(new_job_id)]['state'] == 'kickoff'
+    assert from_bin(database.leases[(to_bin(provider_id), 'Location')]['job_id']) == new_job_id
@@ -0,0 +1,88 @@
+import time
+import export_orchestrator
+from export_jobs import LeaseLostError
+from ids import new_id
+
+
+class FakeStore:
+    """Keeps one job in memory; writes raise LeaseLostError once the lease is gone."""
+
+    def __init__(self, job):
+        self.job = job
+        self.leased = True
+        self.renewals = 0
+
+    def get_job(self, job_id):
+        return dict(self.job)
+
+    def update_job(self, job_id, **fields):
+        if not self.leased:
+            raise LeaseLostError(job_id)
+        self.job.update(fields)
+
+    def renew_lease(self, job_id):
+        if not self.leased:
+            raise LeaseLostError(job_id)
+        self.renewals += 1
+
+    def complete_file(self, job_id, file_index, s3_key, size):
+        if not self.leased:
+            raise LeaseLostError(job_id)
+        self.job['files'][file_index]['state'] = 'done'
+
+
+def make_job(**fields):
+    job = {
+        'job_id': new_id(), 'provider_id': new_id(), 'state': 'downloading', 'attempts': 0,
+        'export_url': 'https://ehr/status', 's3_prefix': 'HealthLakeOutput/p/j/', 'files_total': 1,
+        'files_done': 0, 'last_error': None, 'fetch_id': None,
+        'files': [{'file_index': 0, 'resource_type': 'Location', 'url': 'https://ehr/file/0', 'state': 'pending'}]
+    }
+    job.update(fields)
+    return job
+
+
+def test_run_job_stops_when_the_lease_is_lost(monkeypatch):
+    store = FakeStore(make_job(files=[]))
+    store.leased = False
+    invoked = []
+    monkeypatch.setattr(export_orchestrator, 'invoke', lambda *args: invoked.append(args))
+
+    job, wait = export_orchestrator.run_job(store.job['job_id'], store)
+
+    # Neither retried as a failed step nor recorded as a failed fetch
+    assert job['state'] == 'downloading'
+    assert job['attempts'] == 0
+    assert wait == 0
+    assert invoked == []
+
+
+def test_lease_is_renewed_during_a_long_download(monkeypatch):
+    store = FakeStore(make_job())
+    monkeypatch.setattr(export_orchestrator, 'EXPORT_LEASE_SECONDS', 0.03)
+
+    def slow_download(url, resource_type, tokens, key=None):
+        time.sleep(0.1)
+        return {'key': key, 'bytes': 10}
+
+    monkeypatch.setattr(export_orchestrator, 'process_fhir_export', slow_download)
+    export_orchestrator.download_next(store, store.get_job(store.job['job_id']))
+
+    assert store.renewals >= 2
+    assert store.job['files'][0]['state'] == 'done'
+
+
+def test_download_from_a_job_that_lost_its_lease_is_not_recorded(monkeypatch):
+    store = FakeStore(make_job())
+    monkeypatch.setattr(export_orchestrator, 'EXPORT_LEASE_SECONDS', 0.03)
+
+    def download_then_lose_lease(url, resource_type, tokens, key=None):
+        store.leased = False
+        time.sleep(0.05)
+        return {'key': key, 'bytes': 10}
+
+    monkeypatch.setattr(export_orchestrator, 'process_fhir_export', download_then_lose_lease)
+    job, wait = export_orchestrator.run_job(store.job['job_id'], store)
+
+    assert store.job['files'][0]['state'] == 'pending'
+    assert job['attempts'] == 0
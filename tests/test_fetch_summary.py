@@ -0,0 +1,78 @@
+from datetime import date, datetime
+import fetch_summary
+from fetch_summary import UPSERT_DAILY, UPSERT_SUMMARY, prune_daily, record_fetches
+from ids import to_bin
+
+PROVIDER_ID = '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+
+
+class RecordingCursor:
+    def __init__(self, rowcounts=()):
+        self.rowcounts = list(rowcounts)
+        self.rowcount = 0
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+        self.rowcount = self.rowcounts.pop(0)
+
+    def executemany(self, query, args):
+        self.executed.append((query, args))
+
+
+class CountingConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_each_fetch_adds_one_summary_and_one_daily_upsert():
+    cursor = RecordingCursor()
+    record_fetches(cursor, [
+        {'provider_id': PROVIDER_ID, 'fetch_time': datetime(2024, 1, 31, 23, 59), 'status': 'Success'},
+        {'provider_id': PROVIDER_ID.upper(), 'fetch_time': '2024-02-01 00:01:00', 'status': 'Failed'},
+    ])
+
+    (summary_query, summary), (daily_query, daily) = cursor.executed
+    assert (summary_query, daily_query) == (UPSERT_SUMMARY, UPSERT_DAILY)
+    provider = to_bin(PROVIDER_ID)
+    assert summary == [
+        (provider, 1, 1, 0, 0, datetime(2024, 1, 31, 23, 59), 'Success', datetime(2024, 1, 31, 23, 59), None),
+        (provider, 1, 0, 0, 1, '2024-02-01 00:01:00', 'Failed', None, '2024-02-01 00:01:00'),
+    ]
+    assert daily == [(provider, date(2024, 1, 31), 1, 0, 0), (provider, '2024-02-01', 0, 0, 1)]
+
+
+def test_partial_fetch_counts_as_neither_success_nor_failure():
+    cursor = RecordingCursor()
+    record_fetches(cursor, [{'provider_id': PROVIDER_ID, 'fetch_time': datetime(2024, 1, 1), 'status': 'Partial'}])
+    summary = cursor.executed[0][1][0]
+    assert summary[2:5] == (0, 1, 0)
+    assert summary[7:] == (None, None)
+
+
+def test_summary_upsert_only_moves_last_fetch_forward():
+    # An out-of-order fetch must not replace the newer last_status or times
+    assert 'VALUES(last_fetch_time) >= last_fetch_time' in UPSERT_SUMMARY
+    assert 'GREATEST(COALESCE(last_fetch_time' in UPSERT_SUMMARY
+    # last_status is assigned while last_fetch_time still holds the old value
+    assert UPSERT_SUMMARY.index('last_status = IF') < UPSERT_SUMMARY.index('last_fetch_time = GREATEST')
+
+
+def test_prune_deletes_in_committed_batches_until_a_short_one(monkeypatch):
+    monkeypatch.setattr(fetch_summary, 'PRUNE_BATCH_SIZE', 100)
+    cursor = RecordingCursor(rowcounts=[100, 100, 7])
+    conn = CountingConnection()
+
+    assert prune_daily(cursor, conn, date(2024, 1, 1)) == 207
+    assert conn.commits == 3
+    assert all(args == (date(2024, 1, 1), 100) for query, args in cursor.executed)
+
+
+def test_prune_with_nothing_to_delete_runs_once():
+    cursor = RecordingCursor(rowcounts=[0])
+    conn = CountingConnection()
+    assert prune_daily(cursor, conn, date(2024, 1, 1)) == 0
+    assert conn.commits == 1
@@ -0,0 +1,155 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+import pytest
+import archive_data_fetch_history
+import bootstrap
+import history_archive
+from archive_data_fetch_history import archive_cutoff, next_month
+from history_archive import parse_fetch_time, read_archive, write_archive
+import ids
+from ids import new_id
+
+
+def test_parse_fetch_time_accepts_dates_and_datetimes():
+    assert parse_fetch_time('2024-01-31') == datetime(2024, 1, 31)
+    assert parse_fetch_time('2024-01-31T12:00:00') == datetime(2024, 1, 31, 12)
+    assert parse_fetch_time(' 2024-01-31 12:00:00 ') == datetime(2024, 1, 31, 12)
+
+
+def test_parse_fetch_time_converts_offsets_to_utc():
+    assert parse_fetch_time('2024-01-31T12:00:00+02:00') == datetime(2024, 1, 31, 10)
+
+
+def test_parse_fetch_time_rejects_other_text():
+    with pytest.raises(ValueError):
+        parse_fetch_time('last tuesday')
+
+
+def test_archive_cutoff_is_the_start_of_a_month():
+    assert archive_cutoff(365, today=date(2025, 3, 15)) == date(2024, 3, 1)
+    assert archive_cutoff(30, today=date(2025, 3, 1)) == date(2025, 1, 1)
+
+
+def test_next_month_rolls_over_the_year():
+    assert next_month(date(2024, 1, 1)) == date(2024, 2, 1)
+    assert next_month(date(2024, 12, 1)) == date(2025, 1, 1)
+
+
+def test_archives_round_trip_and_filter(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_archive, 'ARCHIVE_OUTPUT', str(tmp_path))
+    monkeypatch.setattr(history_archive, 'ARCHIVE_ALLOW_LOCAL', True)
+    rows = [
+        {'fetch_id': 'a', 'provider_id': 'p1', 'status': 'success', 'fetch_time': datetime(2024, 1, 1, 9)},
+        {'fetch_id': 'b', 'provider_id': 'p2', 'status': 'failed', 'fetch_time': datetime(2024, 1, 2, 9)},
+        {'fetch_id': 'c', 'provider_id': 'p1', 'status': 'failed', 'fetch_time': datetime(2024, 1, 3, 9)},
+    ]
+    location, size = write_archive('data_fetch_history/2024-01/a.ndjson.gz', rows)
+
+    assert size > 0
+    archived = read_archive(location)
+    assert [row['fetch_time'] for row in archived] == ['2024-01-01 09:00:00', '2024-01-02 09:00:00',
+                                                       '2024-01-03 09:00:00']
+
+    since = parse_fetch_time('2024-01-02')
+    until = parse_fetch_time('2024-01-03 09:00:00')
+    matches = [row['fetch_id'] for row in archived if history_archive._matches(row, {}, since, until)]
+    assert matches == ['b']
+    assert [row['fetch_id'] for row in archived
+            if history_archive._matches(row, {'provider_id': 'p1'}, None, None)] == ['a', 'c']
+
+
+@pytest.mark.parametrize('output', ['', '/tmp/archive'])
+def test_archives_are_not_written_to_local_storage_by_default(output, monkeypatch):
+    monkeypatch.setattr(history_archive, 'ARCHIVE_OUTPUT', output)
+    monkeypatch.setattr(history_archive, 'ARCHIVE_ALLOW_LOCAL', False)
+    with pytest.raises(RuntimeError):
+        write_archive('data_fetch_history/2024-01/a.ndjson.gz', [])
+
+
+def test_s3_archive_output_is_accepted(monkeypatch):
+    monkeypatch.setattr(history_archive, 'ARCHIVE_OUTPUT', 's3://archive-bucket/history')
+    monkeypatch.setattr(history_archive, 'ARCHIVE_ALLOW_LOCAL', False)
+    assert history_archive.archive_output_error() is None
+
+
+def test_archiving_refuses_to_start_without_durable_output(monkeypatch):
+    monkeypatch.setattr(history_archive, 'ARCHIVE_OUTPUT', '')
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: pytest.fail('connected'))
+
+    response = archive_data_fetch_history.lambda_handler({}, None)
+
+    assert response['statusCode'] == 500
+    assert 'ARCHIVE_OUTPUT' in json.loads(response['body'])['details']
+
+
+def test_filters_compare_ids_canonically_and_status_case_insensitively():
+    provider_id = '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+    row = {'provider_id': provider_id, 'status': 'Failed', 'fetch_time': '2024-01-02 09:00:00'}
+    assert history_archive._matches(row, {'provider_id': provider_id.upper(), 'status': 'failed'}, None, None)
+    assert not history_archive._matches(row, {'status': 'success'}, None, None)
+
+
+class ArchiveIndexCursor:
+    """Answers the archive index query with the archives overlapping its bounds."""
+
+    def __init__(self, archives):
+        self.archives = archives
+        self.queries = []
+
+    def execute(self, query, params):
+        self.queries.append(params)
+        self.params = params
+
+    def fetchall(self):
+        since, until = (list(self.params) + [None, None])[:2]
+        return [{'location': location} for location, (first, last) in self.archives.items()
+                if (since is None or last >= since) and (until is None or first < until)]
+
+
+def write_month(month, rows):
+    location, _ = write_archive(f'data_fetch_history/2024-{month:02d}/{rows[0]["fetch_id"]}.ndjson.gz', rows)
+    return location, (rows[0]['fetch_time'], rows[-1]['fetch_time'])
+
+
+@pytest.fixture
+def local_archives(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_archive, 'ARCHIVE_OUTPUT', str(tmp_path))
+    monkeypatch.setattr(history_archive, 'ARCHIVE_ALLOW_LOCAL', True)
+
+
+def test_fetch_id_lookup_reads_only_the_archive_near_its_creation_time(local_archives, monkeypatch):
+    import time
+    created = datetime(2024, 3, 10, 12)
+    monkeypatch.setattr(time, 'time_ns', lambda: int(created.replace(tzinfo=timezone.utc).timestamp() * 1e9))
+    monkeypatch.setattr(ids, '_last_ms', 0)
+    fetch_id = new_id()
+    archives = dict([
+        write_month(1, [{'fetch_id': new_id(), 'provider_id': 'p', 'fetch_time': datetime(2024, 1, 5)}]),
+        write_month(3, [{'fetch_id': fetch_id, 'provider_id': 'p', 'fetch_time': datetime(2024, 3, 10, 12, 0, 5)}]),
+    ])
+    cursor = ArchiveIndexCursor(archives)
+
+    rows = history_archive.read_archived_history(cursor, {'fetch_id': fetch_id.upper()})
+
+    assert [row['fetch_id'] for row in rows] == [fetch_id]
+    assert len(cursor.queries) == 1
+    assert cursor.queries[0] == [created - timedelta(days=1), created + timedelta(days=1)]
+
+
+def test_fetch_id_far_from_its_creation_time_is_still_found(local_archives):
+    fetch_id = new_id()
+    archives = dict([
+        write_month(1, [{'fetch_id': fetch_id, 'provider_id': 'p', 'fetch_time': datetime(2024, 1, 5)}]),
+    ])
+    cursor = ArchiveIndexCursor(archives)
+
+    rows = history_archive.read_archived_history(cursor, {'fetch_id': fetch_id})
+
+    assert [row['fetch_id'] for row in rows] == [fetch_id]
+    assert len(cursor.queries) == 2
+    assert cursor.queries[1] == []
+
+
+def test_fetch_id_window_needs_a_time_ordered_id():
+    assert history_archive.fetch_id_window('9b2c8a4e-0d8f-4c1e-9a53-1f7a0e6b2d11') is None
+    assert history_archive.fetch_id_window('not-an-id') is None
@@ -0,0 +1,70 @@
+import pytest
+from get_healthcare_provider import build_provider_response
+from http_utils import (
+    etag_matches, get_header, make_etag, not_modified_response, parse_if_match, prefers_minimal, version_etag
+)
+
+
+def test_get_header_is_case_insensitive():
+    event = {'headers': {'if-none-match': '"abc"'}}
+    assert get_header(event, 'If-None-Match') == '"abc"'
+    assert get_header({}, 'If-None-Match') is None
+    assert get_header({'headers': None}, 'If-None-Match') is None
+
+
+def test_make_etag_depends_on_every_part():
+    etag = make_etag('healthcare_providers', (3,), None)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag('healthcare_providers', (3,), None)
+    assert etag != make_etag('healthcare_providers', (4,), None)
+    assert etag != make_etag('healthcare_providers', (3,), 'p1')
+
+
+def test_etag_matches_single_list_weak_and_wildcard():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"x", "a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('*', '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches('', '"a"')
+
+
+def test_not_modified_response_has_no_body():
+    response = not_modified_response('"a"')
+    assert response['statusCode'] == 304
+    assert response['headers']['ETag'] == '"a"'
+    assert response['body'] == ''
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('3', 3),
+    ('"3"', 3),
+    ('W/"3"', 3),
+    (' "12" ', 12),
+    ('*', None),
+    (None, None),
+    ('', None)
+])
+def test_parse_if_match(header, expected):
+    assert parse_if_match(header) == expected
+
+
+def test_parse_if_match_rejects_other_etags():
+    with pytest.raises(ValueError):
+        parse_if_match('"a1b2c3"')
+
+
+def test_version_etag_round_trips_through_if_match():
+    assert parse_if_match(version_etag(7)) == 7
+
+
+def test_provider_reads_carry_the_version_etag():
+    assert build_provider_response({'provider_id': 'p1', 'version': 4})['headers']['ETag'] == '"4"'
+    assert 'ETag' not in build_provider_response({'provider_id': 'p1'})['headers']
+
+
+def test_prefers_minimal():
+    assert prefers_minimal({'headers': {'Prefer': 'return = minimal'}})
+    assert prefers_minimal({'queryStringParameters': {'return': 'minimal'}})
+    assert not prefers_minimal({'headers': {'Prefer': 'return=representation'}})
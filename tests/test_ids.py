@@ -0,0 +1,63 @@
+import time
+import uuid
+import ids
+from ids import id_timestamp, new_id
+
+
+def test_new_ids_are_version_7_and_unique():
+    values = [new_id() for _ in range(1000)]
+    assert len(set(values)) == len(values)
+    for value in values[:10]:
+        parsed = uuid.UUID(value)
+        assert parsed.version == 7
+        assert parsed.variant == uuid.RFC_4122
+
+
+def test_new_ids_sort_in_creation_order():
+    values = [new_id() for _ in range(5000)]
+    assert values == sorted(values)
+
+
+def test_ids_keep_counting_within_one_millisecond(monkeypatch):
+    monkeypatch.setattr(time, 'time_ns', lambda: 1_700_000_000_000 * 1_000_000)
+    monkeypatch.setattr(ids, '_last_ms', 0)
+    values = [new_id() for _ in range(5000)]
+
+    # The 12-bit counter overflows into the next millisecond rather than repeating
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_ids_stay_ordered_when_the_clock_moves_back(monkeypatch):
+    now = [1_700_000_000_500]
+    monkeypatch.setattr(time, 'time_ns', lambda: now[0] * 1_000_000)
+    first = new_id()
+    now[0] -= 100
+    assert new_id() > first
+
+
+def test_id_timestamp_reads_the_creation_time():
+    before = time.time()
+    value = new_id()
+    assert before - 0.001 <= id_timestamp(value) <= time.time() + 0.001
+
+
+def test_to_bin_matches_uuid_to_bin_and_round_trips():
+    value = '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+    assert ids.to_bin(value) == bytes.fromhex(value.replace('-', ''))
+    assert ids.from_bin(ids.to_bin(value)) == value
+
+
+def test_to_bin_normalizes_spelling():
+    assert ids.from_bin(ids.to_bin('01A15295-D2A7-770A-8BED-E7DBC5AA7E52')) == '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+
+
+def test_to_bin_passes_through_none_bytes_and_malformed_ids():
+    assert ids.to_bin(None) is None
+    assert ids.to_bin(b'\x00' * 16) == b'\x00' * 16
+    assert ids.to_bin('not-an-id') == b'not-an-id'
+
+
+def test_from_bin_leaves_other_values_alone():
+    assert ids.from_bin('already a string') == 'already a string'
+    assert ids.from_bin(b'short') == b'short'
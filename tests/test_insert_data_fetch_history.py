@@ -0,0 +1,54 @@
+import json
+import pytest
+import bootstrap
+import insert_data_fetch_history
+
+PROVIDER_ID = '01a15295-d2a7-770a-8bed-e7dbc5aa7e52'
+
+
+class FakeCursor:
+    """Accepts every write and answers the provider lookup with one provider."""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+
+    def executemany(self, query, args):
+        self.executed.append((query, args))
+
+    def fetchall(self):
+        # Ids come back canonical, the way the BINARY(16) conversion returns them
+        return [{'provider_id': PROVIDER_ID, 'provider_name': 'Mercy West', 'provider_type': 'Hospital'}]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursor_instance = FakeCursor()
+
+    def cursor(self):
+        return self.cursor_instance
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('spelling', [PROVIDER_ID, PROVIDER_ID.upper()])
+def test_single_record_response_includes_the_provider_in_any_id_spelling(spelling, monkeypatch):
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: FakeConnection())
+
+    response = insert_data_fetch_history.lambda_handler({'provider_id': spelling, 'status': 'Success'}, None)
+
+    assert response['statusCode'] == 201
+    body = json.loads(response['body'])
+    assert body['data']['provider'] == {'provider_name': 'Mercy West', 'provider_type': 'Hospital'}
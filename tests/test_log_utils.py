@@ -0,0 +1,35 @@
+import json
+from log_utils import StructuredLogger
+
+
+def records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_sample_every_writes_the_first_and_every_nth_occurrence(capsys):
+    logger = StructuredLogger('test', level='INFO')
+    for index in range(25):
+        logger.info("File stored", file_index=index, sample_every=10)
+
+    written = records(capsys)
+    assert [record['file_index'] for record in written] == [0, 9, 19]
+    assert [record['occurrences'] for record in written] == [1, 10, 20]
+    assert 'sample_every' not in written[0]
+
+
+def test_unsampled_messages_are_always_written(capsys):
+    logger = StructuredLogger('test', level='INFO')
+    for _ in range(3):
+        logger.info("Export started")
+    assert len(records(capsys)) == 3
+
+
+def test_sensitive_fields_are_redacted_and_callables_evaluated(capsys):
+    logger = StructuredLogger('test', level='INFO')
+    logger.info("Token fetched", access_token='secret', payload={'client_secret': 'x'}, files=lambda: 3)
+    logger.debug("Not written", payload=lambda: 1 / 0)
+
+    record, = records(capsys)
+    assert record['access_token'] == '***REDACTED***'
+    assert record['payload'] == {'client_secret': '***REDACTED***'}
+    assert record['files'] == 3
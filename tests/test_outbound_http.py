@@ -0,0 +1,184 @@
+import time
+import pytest
+import outbound_http
+from outbound_http import CircuitOpenError, HostState
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(outbound_http, 'OUTBOUND_MAX_CONCURRENCY', 8)
+    monkeypatch.setattr(outbound_http, 'CIRCUIT_FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(outbound_http, 'CIRCUIT_ERROR_RATE', 0.5)
+    monkeypatch.setattr(outbound_http, 'CIRCUIT_OPEN_SECONDS', 30)
+    return now
+
+
+def call(state, ok, throttled=False):
+    state.acquire()
+    state.release(ok, 10, throttled)
+
+
+def test_consecutive_failures_open_the_circuit(clock):
+    state = HostState('ehr.example.com')
+    for _ in range(2):
+        call(state, False)
+    state.acquire()
+    state.release(False, 10, False)
+
+    with pytest.raises(CircuitOpenError) as raised:
+        state.acquire()
+    assert raised.value.retry_in == pytest.approx(30)
+
+
+def test_error_rate_opens_the_circuit(clock):
+    state = HostState('ehr.example.com')
+    # Never three failures in a row, but half of the last ten failed
+    for ok in [True, False, True, False, True, False, True, False, True, False]:
+        call(state, ok)
+    with pytest.raises(CircuitOpenError):
+        state.acquire()
+
+
+def test_half_open_probe_closes_the_circuit_on_success(clock):
+    state = HostState('ehr.example.com')
+    for _ in range(3):
+        call(state, False)
+
+    clock[0] += 31
+    state.acquire()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        state.acquire()
+    state.release(True, 10, False)
+
+    call(state, True)
+    assert state.opened_at is None
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    state = HostState('ehr.example.com')
+    for _ in range(3):
+        call(state, False)
+
+    clock[0] += 31
+    call(state, False)
+    with pytest.raises(CircuitOpenError) as raised:
+        state.acquire()
+    assert raised.value.retry_in == pytest.approx(30)
+
+
+def test_throttling_halves_the_limit_and_success_grows_it_back(clock):
+    state = HostState('ehr.example.com')
+    call(state, True, throttled=True)
+    assert state.limit == 4
+    call(state, True, throttled=True)
+    call(state, True, throttled=True)
+    call(state, True, throttled=True)
+    assert state.limit == 1
+
+    call(state, True)
+    assert state.limit == 2
+    for _ in range(100):
+        call(state, True)
+    assert state.limit == 8
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.msg = {'Content-Type': 'application/json'}
+
+    def read(self):
+        return b'{}'
+
+
+class FakeConnection:
+    def __init__(self, status):
+        self.status = status
+        self.closed = False
+
+    def request(self, method, path, body=None, headers=None):
+        pass
+
+    def getresponse(self):
+        return FakeResponse(self.status)
+
+    def close(self):
+        self.closed = True
+
+
+def test_request_counts_server_errors_and_frees_the_slot(clock, monkeypatch):
+    connections = []
+
+    def open_connection(target, timeout=None):
+        connections.append(FakeConnection(503))
+        return connections[-1]
+
+    monkeypatch.setattr(outbound_http, 'open_connection', open_connection)
+    monkeypatch.setattr(outbound_http, '_hosts', {})
+
+    response = outbound_http.request('GET', 'https://ehr.example.com/fhir', '/$export')
+
+    assert response.status == 503
+    assert response.read() == b'{}'
+    assert response.getheader('Content-Type') == 'application/json'
+    state = outbound_http.host_state('https://ehr.example.com/fhir')
+    assert state.in_flight == 0
+    assert state.consecutive_failures == 1
+    assert state.limit == 4
+    assert connections[0].closed
+
+
+def test_open_circuit_rejects_without_connecting(clock, monkeypatch):
+    monkeypatch.setattr(outbound_http, '_hosts', {})
+    monkeypatch.setattr(outbound_http, 'open_connection', lambda *args, **kwargs: pytest.fail('connected'))
+    state = outbound_http.host_state('ehr.example.com')
+    state.opened_at = clock[0]
+
+    with pytest.raises(CircuitOpenError):
+        outbound_http.request('GET', 'ehr.example.com', '/token')
+
+
+def test_slow_responses_count_as_failures(clock, monkeypatch):
+    monkeypatch.setattr(outbound_http, 'OUTBOUND_TIMEOUT_SECONDS', 10)
+    monkeypatch.setattr(outbound_http, 'CIRCUIT_SLOW_FRACTION', 0.8)
+    state = HostState('ehr.example.com')
+    for _ in range(3):
+        state.acquire()
+        state.release(True, 9000, False)
+
+    with pytest.raises(CircuitOpenError):
+        state.acquire()
+
+
+def test_fast_responses_reset_the_failure_count(clock, monkeypatch):
+    monkeypatch.setattr(outbound_http, 'OUTBOUND_TIMEOUT_SECONDS', 10)
+    state = HostState('ehr.example.com')
+    state.acquire()
+    state.release(True, 9000, False)
+    state.acquire()
+    state.release(True, 7000, False)
+    assert state.consecutive_failures == 0
+
+
+def test_latency_is_measured_to_the_response_headers(clock, monkeypatch):
+    class SlowBodyResponse(FakeResponse):
+        def read(self):
+            # A large body that takes longer than the timeout to stream
+            clock[0] += 60
+            return b'{}'
+
+    class SlowBodyConnection(FakeConnection):
+        def getresponse(self):
+            return SlowBodyResponse(self.status)
+
+    monkeypatch.setattr(outbound_http, '_hosts', {})
+    monkeypatch.setattr(outbound_http, 'open_connection', lambda *args, **kwargs: SlowBodyConnection(200))
+
+    outbound_http.request('GET', 'ehr.example.com', '/file')
+
+    state = outbound_http.host_state('ehr.example.com')
+    assert state.consecutive_failures == 0
+    assert state.latency_ms == 0
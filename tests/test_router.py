@@ -0,0 +1,64 @@
+import json
+import base64
+import router
+
+
+def test_literal_segments_win_over_path_parameters():
+    assert router.match_route('GET', '/providers/search')[0][0] == 'search_healthcare_providers'
+    assert router.match_route('GET', '/data-fetch-history/stats')[0][0] == 'get_data_fetch_stats'
+
+    route, _ = router.match_route('GET', '/providers/abc')
+    assert route == ('get_healthcare_provider', '/providers/{provider_id}', {'provider_id': 'abc'})
+
+
+def test_unknown_method_and_unknown_path_are_told_apart():
+    assert router.match_route('DELETE', '/providers') == (None, True)
+    assert router.match_route('GET', '/nothing/here') == (None, False)
+
+
+def test_trailing_slash_is_ignored():
+    assert router.match_route('GET', '/ehr-systems/')[0][0] == 'get_ehr_systems'
+
+
+def test_unmatched_requests_get_404_and_405():
+    assert router.lambda_handler({'httpMethod': 'GET', 'path': '/nothing'}, None)['statusCode'] == 404
+    assert router.lambda_handler({'httpMethod': 'DELETE', 'path': '/providers'}, None)['statusCode'] == 405
+
+
+def test_stage_prefix_is_dropped():
+    event = {'httpMethod': 'GET', 'path': '/prod/providers', 'requestContext': {'stage': 'prod'}}
+    assert router._request_line(event) == ('GET', '/providers')
+
+
+def test_http_api_events_are_read():
+    event = {'rawPath': '/providers', 'requestContext': {'http': {'method': 'post'}}}
+    assert router._request_line(event) == ('POST', '/providers')
+
+
+def test_path_parameters_are_merged_into_query_and_object_body():
+    event = {'body': json.dumps({'provider_name': 'A'}), 'queryStringParameters': {'x': '1'}}
+    routed = router._handler_event(event, '/providers/{provider_id}', {'provider_id': 'p1'})
+
+    assert routed['queryStringParameters'] == {'x': '1', 'provider_id': 'p1'}
+    assert routed['body'] == {'provider_name': 'A', 'provider_id': 'p1'}
+    assert routed['pathParameters'] == {'provider_id': 'p1'}
+
+
+def test_requests_without_a_body_get_the_parameters_as_body():
+    routed = router._handler_event({'queryStringParameters': {'x': '1'}}, '/providers/{provider_id}',
+                                   {'provider_id': 'p1'})
+    assert routed['body'] == {'x': '1', 'provider_id': 'p1'}
+
+
+def test_list_csv_and_ndjson_bodies_are_passed_through():
+    for body in (json.dumps([{'provider_name': 'A'}]), 'provider_name\nA\n', '{"provider_name": "A"}\n{"provider_name": "B"}\n'):
+        routed = router._handler_event({'body': body}, '/providers/batch', {})
+        assert routed['body'] == body
+
+
+def test_base64_bodies_are_decoded():
+    event = {'body': base64.b64encode(b'provider_name\nA\n').decode('ascii'), 'isBase64Encoded': True}
+    routed = router._handler_event(event, '/providers/batch', {})
+
+    assert routed['body'] == 'provider_name\nA\n'
+    assert routed['isBase64Encoded'] is False
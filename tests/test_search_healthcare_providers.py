@@ -0,0 +1,25 @@
+from search_healthcare_providers import build_search, like_prefix, search_terms
+
+
+def test_search_terms_drop_short_words_stopwords_and_operators():
+    assert search_terms('St. Mary of Boston') == ['mary', 'boston']
+    assert search_terms('+mercy -west*') == ['mercy', 'west']
+    assert search_terms('a to') == []
+
+
+def test_like_prefix_escapes_wildcards():
+    assert like_prefix('St') == 'St%'
+    assert like_prefix('100%_care\\') == '100\\%\\_care\\\\%'
+
+
+def test_build_search_requires_every_term_as_a_prefix():
+    sql, params = build_search('st mary bos', 20)
+    assert 'MATCH (provider_name, address, contact_email)' in sql
+    assert params == ('+mary* +bos*', '+mary* +bos*', 'st mary bos%', 20)
+
+
+def test_build_search_falls_back_to_a_name_prefix():
+    sql, params = build_search('St', 5)
+    assert 'MATCH' not in sql
+    assert 'provider_name LIKE %s' in sql
+    assert params == ('St%', 5)
@@ -0,0 +1,171 @@
+import csv
+import json
+from datetime import datetime
+import pytest
+import table_export
+from table_export import export_query, get_export_format
+
+
+class FakeCursor:
+    def __init__(self, conn, columns=None, rows=None):
+        self.conn = conn
+        self.description = [(column,) for column in columns or []]
+        self.rows = list(rows or [])
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, params=None):
+        self.conn.executed.append((query, params))
+        if query.startswith('SET SESSION net_write_timeout'):
+            self.conn.net_write_timeout = params[0]
+
+    def fetchone(self):
+        return {'net_write_timeout': self.conn.net_write_timeout}
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.executed = []
+        self.cursors = []
+        self.net_write_timeout = 60
+
+    def cursor(self, cursor_class=None):
+        if cursor_class is None:
+            return FakeCursor(self)
+        self.cursors.append(FakeCursor(self, self.columns, self.rows))
+        return self.cursors[-1]
+
+
+ROWS = [
+    {'provider_id': '01a15295-d2a7-770a-8bed-e7dbc5aa7e52', 'provider_name': 'Mercy, West',
+     'created_at': datetime(2024, 1, 31, 12, 0)},
+    {'provider_id': '01a15295-d2a7-770a-8bed-e7dbc5aa7e53', 'provider_name': 'St. Mary',
+     'created_at': datetime(2024, 2, 1, 8, 30)},
+]
+COLUMNS = ['provider_id', 'provider_name', 'created_at']
+
+
+@pytest.fixture(autouse=True)
+def output(tmp_path, monkeypatch):
+    monkeypatch.setattr(table_export, 'EXPORT_OUTPUT', str(tmp_path))
+    monkeypatch.setattr(table_export, 'EXPORT_ALLOW_LOCAL', True)
+    # Several fetches per export
+    monkeypatch.setattr(table_export, 'EXPORT_FETCH_ROWS', 1)
+    return tmp_path
+
+
+def test_ndjson_export_writes_one_object_per_line(output):
+    conn = FakeConnection(COLUMNS, ROWS)
+    pointer = export_query(conn, "SELECT * FROM healthcare_providers", (), 'ndjson', 'healthcare_providers')
+
+    assert pointer['format'] == 'ndjson'
+    assert pointer['content_type'] == 'application/x-ndjson'
+    assert pointer['rows'] == 2
+    assert pointer['location'].startswith(str(output / 'healthcare_providers'))
+    assert pointer['location'].endswith('.ndjson')
+    with open(pointer['location'], 'rb') as f:
+        data = f.read()
+    assert pointer['bytes'] == len(data)
+    lines = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+    assert [line['provider_name'] for line in lines] == ['Mercy, West', 'St. Mary']
+    assert lines[0]['created_at'] == '2024-01-31 12:00:00'
+    assert conn.cursors[0].closed
+    # The shared connection gets its own timeout back
+    assert ('SET SESSION net_write_timeout = %s', (600,)) in conn.executed
+    assert conn.net_write_timeout == 60
+
+
+def test_csv_export_writes_a_header_and_quotes_values(output):
+    conn = FakeConnection(COLUMNS, ROWS)
+    pointer = export_query(conn, "SELECT * FROM healthcare_providers", (), 'csv', 'healthcare_providers')
+
+    assert pointer['content_type'] == 'text/csv'
+    assert pointer['rows'] == 2
+    with open(pointer['location'], newline='', encoding='utf-8') as f:
+        records = list(csv.reader(f))
+    assert records[0] == COLUMNS
+    assert records[1][1] == 'Mercy, West'
+    assert len(records) == 3
+
+
+def test_empty_csv_export_still_has_a_header(output):
+    pointer = export_query(FakeConnection(COLUMNS, []), "SELECT 1", (), 'csv', 'healthcare_providers')
+
+    assert pointer['rows'] == 0
+    with open(pointer['location'], encoding='utf-8') as f:
+        assert f.read().strip() == ','.join(COLUMNS)
+    assert pointer['bytes'] > 0
+
+
+def test_empty_ndjson_export_is_an_empty_file(output):
+    pointer = export_query(FakeConnection(COLUMNS, []), "SELECT 1", (), 'ndjson', 'healthcare_providers')
+    assert pointer['rows'] == 0
+    assert pointer['bytes'] == 0
+
+
+def test_failed_export_removes_the_partial_file(output):
+    conn = FakeConnection(COLUMNS, ROWS)
+    cursor_class = conn.cursor
+
+    def failing_cursor(cls=None):
+        cursor = cursor_class(cls)
+        if cls is not None:
+            def fetchmany(size):
+                raise RuntimeError('connection lost')
+            cursor.fetchmany = fetchmany
+        return cursor
+
+    conn.cursor = failing_cursor
+    with pytest.raises(RuntimeError):
+        export_query(conn, "SELECT 1", (), 'ndjson', 'healthcare_providers')
+    assert not list((output / 'healthcare_providers').iterdir())
+    assert conn.net_write_timeout == 60
+
+
+@pytest.mark.parametrize('configured', ['', '/tmp/exports'])
+def test_exports_need_an_s3_location_unless_local_output_is_allowed(configured, monkeypatch):
+    monkeypatch.setattr(table_export, 'EXPORT_OUTPUT', configured)
+    monkeypatch.setattr(table_export, 'EXPORT_ALLOW_LOCAL', False)
+    assert table_export.export_output_error()
+
+    conn = FakeConnection(COLUMNS, ROWS)
+    with pytest.raises(RuntimeError):
+        export_query(conn, "SELECT 1", (), 'csv', 'healthcare_providers')
+    assert conn.cursors == []
+    assert conn.net_write_timeout == 60
+
+    monkeypatch.setattr(table_export, 'EXPORT_OUTPUT', 's3://exports-bucket/dumps')
+    assert table_export.export_output_error() is None
+
+
+def test_export_request_answers_500_before_connecting(monkeypatch):
+    import bootstrap
+    import get_healthcare_providers
+    monkeypatch.setattr(table_export, 'EXPORT_OUTPUT', '')
+    monkeypatch.setattr(bootstrap, 'connect_db', lambda *args, **kwargs: pytest.fail('connected'))
+
+    response = get_healthcare_providers.lambda_handler({'queryStringParameters': {'export': 'csv'}}, None)
+
+    assert response['statusCode'] == 500
+    assert 'EXPORT_OUTPUT' in json.loads(response['body'])['details']
+
+
+def test_get_export_format_reads_the_query_string_or_direct_event():
+    assert get_export_format({'queryStringParameters': {'export': 'csv'}}) == 'csv'
+    assert get_export_format({'export': 'ndjson'}) == 'ndjson'
+    assert get_export_format({'queryStringParameters': None}) is None
+    assert get_export_format('not an event') is None
@@ -0,0 +1,103 @@
+import time
+import threading
+from token_provider import TokenProvider
+
+
+class Fetcher:
+    """Hands out t1, t2, ... with a fixed lifetime, optionally slowly."""
+
+    def __init__(self, expires_in=300, delay=0):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return f't{self.calls}', self.expires_in
+
+
+def test_get_fetches_once_and_reuses_the_token():
+    fetch = Fetcher()
+    tokens = TokenProvider(fetch)
+    assert tokens.get() == 't1'
+    assert tokens.get() == 't1'
+    assert fetch.calls == 1
+
+
+def test_expired_token_is_fetched_again_on_get(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    fetch = Fetcher(expires_in=60)
+    tokens = TokenProvider(fetch)
+
+    assert tokens.get() == 't1'
+    now[0] += 61
+    assert tokens.get() == 't2'
+
+
+def test_missing_expires_in_uses_the_default_lifetime(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    tokens = TokenProvider(lambda: ('t', None))
+    tokens.get()
+    assert tokens._lifetime == 300
+
+
+def test_refresh_replaces_only_the_stale_token():
+    fetch = Fetcher()
+    tokens = TokenProvider(fetch)
+    stale = tokens.get()
+
+    assert tokens.refresh(stale) == 't2'
+    # A second worker that saw the same 401 gets the new token without a fetch
+    assert tokens.refresh(stale) == 't2'
+    assert fetch.calls == 2
+
+
+def test_no_background_refresh_without_a_holder():
+    tokens = TokenProvider(Fetcher())
+    tokens.get()
+    assert tokens._timer is None
+
+
+def test_hold_schedules_and_release_cancels_the_refresh():
+    tokens = TokenProvider(Fetcher())
+    tokens.get()
+    with tokens.hold():
+        with tokens.hold():
+            assert tokens._timer is not None
+        # Still held by the outer block
+        assert tokens._timer is not None
+    assert tokens._timer is None
+
+
+def test_background_refresh_renews_before_expiry_without_blocking_get():
+    fetch = Fetcher(expires_in=2, delay=0.5)
+    tokens = TokenProvider(fetch, refresh_margin=1)
+    tokens.get()
+
+    with tokens.hold():
+        # The renewal starts after 1 s and takes 0.5 s
+        time.sleep(1.2)
+        started = time.monotonic()
+        assert tokens.get() == 't1'
+        assert time.monotonic() - started < 0.2
+
+        time.sleep(0.6)
+        assert tokens.get() == 't2'
+    tokens.close()
+
+
+def test_concurrent_gets_fetch_once():
+    fetch = Fetcher(delay=0.05)
+    tokens = TokenProvider(fetch)
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(tokens.get())) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert results == ['t1'] * 8
+    assert fetch.calls == 1